@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ferremas_core.settings')
+# Bajo ASGI el pago en Webpay usa las vistas async (ver tienda/urls.py)
+os.environ.setdefault('WEBPAY_ASYNC', '1')
 
 application = get_asgi_application()
@@ -25,20 +25,26 @@ INSTALLED_APPS = [
 
 # 4. Middlewares
 MIDDLEWARE = [
+    'tienda.middleware.RendimientoMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'tienda.middleware.RenovacionSesionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
+if DEBUG:
+    # Avisa de consultas N+1 en el log mientras se desarrolla
+    MIDDLEWARE.insert(1, 'tienda.middleware.ConsultasRepetidasMiddleware')
 
 # 5. Configuración de URLs y templates
 ROOT_URLCONF = 'ferremas_core.urls'
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates que además mide el tiempo de render para RendimientoMiddleware
+        'BACKEND': 'tienda.rendimiento.PlantillasMedidas',
         'DIRS': [BASE_DIR / 'tienda/templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -58,6 +64,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Escrituras concurrentes: tomar el bloqueo al iniciar la transacción y esperar
+        # en vez de fallar con "database is locked"
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
+        # Base de tests en archivo: la de memoria compartida no admite escrituras concurrentes
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -82,6 +93,17 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 10
 }
 
+# Productos por página en el catálogo HTML (paginación keyset)
+CATALOGO_TAMANO_PAGINA = 24
+
+# Sincronización incremental: se omiten cambios más recientes que este margen
+# (segundos) para no saltarse transacciones que todavía no confirman.
+SINCRONIZACION_MARGEN = 2
+
+# Motor de búsqueda de productos. Si no se define, se elige según la base de
+# datos: FTS5 en SQLite y tsvector + GIN en PostgreSQL.
+# BUSQUEDA_BACKEND = 'tienda.busqueda.PostgresBackend'
+
 # 8. Archivos estáticos y multimedia
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / "static"]
@@ -90,10 +112,25 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 # 9. Configuración de email (Para pruebas en desarrollo)
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", "Ferremas <no-responder@ferremas.cl>")
+# Avisos de mensajes de contacto; si se deja vacío se envían a los usuarios staff
+CONTACTO_DESTINATARIOS = [e for e in os.getenv("CONTACTO_DESTINATARIOS", "").split(",") if e]
 
 # 10. Configuración de sesiones
+# cached_db lee la sesión desde el cache y solo escribe en la base de datos al
+# guardarla; 'django.contrib.sessions.backends.cache' evita la tabla por completo
+# (requiere un cache compartido y persistente, p. ej. Redis).
+SESSION_ENGINE = os.getenv("SESSION_ENGINE", "django.contrib.sessions.backends.cached_db")
 SESSION_COOKIE_AGE = 86400  # 1 día en segundos
-SESSION_SAVE_EVERY_REQUEST = True
+# La sesión se guarda solo cuando cambia; el carrito ya no vive en ella.
+# Un visitante anónimo no tiene sesión hasta que agrega algo al carrito.
+SESSION_SAVE_EVERY_REQUEST = False
+# RenovacionSesionMiddleware extiende la expiración solo si le queda menos que esto
+SESSION_RENOVAR_UMBRAL = SESSION_COOKIE_AGE // 2
+# Almacén del carrito: 'tienda.carrito.AlmacenBD' (tabla LineaCarrito) o
+# 'tienda.carrito.AlmacenCache' (cache compartido, sin escrituras en la base de datos)
+CARRITO_ALMACEN = 'tienda.carrito.AlmacenBD'
+CARRITO_CACHE_TIMEOUT = 30 * 86400
 
 # 11. Configuración de Webpay Plus (Modo TEST)
 # Cargar variables desde `.env`
@@ -103,5 +140,57 @@ TRANSBANK_WEBPAY = {
     'API_KEY': os.getenv("WEBPAY_API_KEY"),
     'ENVIRONMENT': os.getenv("WEBPAY_ENVIRONMENT", "TEST"),
 }
+# Cliente de Webpay: sesión HTTP compartida con pool de conexiones y timeouts estrictos.
+# Para desarrollo o benchmarks sin red: WEBPAY_PASARELA=tienda.pasarela.PasarelaFalsa
+WEBPAY_PASARELA = os.getenv("WEBPAY_PASARELA", "tienda.pasarela.PasarelaWebpay")
+WEBPAY_FALSA_LATENCIA = float(os.getenv("WEBPAY_FALSA_LATENCIA", "0.2"))  # segundos
+WEBPAY_TIMEOUT_CONEXION = 3.05  # segundos
+WEBPAY_TIMEOUT_LECTURA = 15
+WEBPAY_POOL_CONEXIONES = 20
+# Vistas de pago async; asgi.py lo activa al servir con un servidor ASGI (uvicorn, daphne)
+WEBPAY_ASYNC = os.getenv("WEBPAY_ASYNC") == "1"
+# Un reintento de la URL de retorno espera hasta estos segundos a que termine
+# la confirmación en curso del mismo token; pasado el vencimiento se da por abandonada
+WEBPAY_CONFIRMACION_ESPERA = 10
+WEBPAY_CONFIRMACION_VENCIMIENTO = 60
+# Minutos que el stock queda apartado mientras el comprador paga en Webpay
+# (debe superar el tiempo máximo que Webpay da para completar el pago)
+RESERVA_STOCK_MINUTOS = 15
+
+# 12. Cache: memoria local en desarrollo y tests. En producción usar un cache
+# compartido entre procesos para que la invalidación del catálogo llegue a todos:
+# CACHES = {
+#     'default': {
+#         'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+#         'LOCATION': os.getenv('REDIS_URL', 'redis://127.0.0.1:6379'),
+#     }
+# }
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+CATALOGO_CACHE_TIMEOUT = 900  # 15 minutos; las señales invalidan antes si hay cambios
+
+# 13. Tipos de cambio. Con credenciales del Banco Central se usa su API de series;
+# sin ellas, tasas fijas desde un archivo local.
+if os.getenv("BCENTRAL_USUARIO"):
+    DIVISAS_PROVEEDOR = 'tienda.divisas.ProveedorBancoCentral'
+    DIVISAS_OPCIONES = {'usuario': os.getenv("BCENTRAL_USUARIO"), 'clave': os.getenv("BCENTRAL_CLAVE")}
+else:
+    DIVISAS_PROVEEDOR = 'tienda.divisas.ProveedorArchivo'
+    DIVISAS_OPCIONES = {'ruta': BASE_DIR / 'tienda' / 'datos' / 'tasas_cambio.json'}
+DIVISAS_TTL = 3600  # Pasada una hora se actualiza en segundo plano
+DIVISAS_MAX_ANTIGUEDAD = 2 * 86400  # Tasa vencida que se sigue sirviendo si la fuente no responde
 
+# 14. Tareas en segundo plano (tienda.tareas), ejecutadas con `manage.py procesar_tareas`
+TAREAS_SINCRONAS = os.getenv("TAREAS_SINCRONAS") == "1"  # Ejecuta al confirmar, sin trabajador (desarrollo)
+TAREAS_TIEMPO_MAXIMO = 300  # Segundos antes de considerar abandonada una tarea en curso
+TAREAS_RETENCION_DIAS = 7  # Las tareas terminadas se borran después de estos días
 
+# 15. Métricas de rendimiento (tienda.middleware.RendimientoMiddleware, expuestas en /metricas/)
+RENDIMIENTO_VENTANA = 1000  # Requests recientes por vista usados para p50/p95/p99
+RENDIMIENTO_PRESUPUESTO_CONSULTAS = 30  # Más consultas que esto en un request genera una advertencia en el log
+RENDIMIENTO_PRESUPUESTOS = {}  # Límites por vista, p. ej. {'ver_carrito': 10}
+RENDIMIENTO_SERVER_TIMING = True
+CONSULTAS_REPETIDAS_UMBRAL = 5  # Veces que puede repetirse una misma consulta en un request antes de considerarla N+1
@@ -1,12 +1,39 @@
 from django.contrib import admin
-from .models import Categoria, Producto, Cliente, MensajeContacto
+from .models import Categoria, Producto, Cliente, MensajeContacto, Pedido, LineaPedido, Tarea
+from .busqueda import obtener_backend
 
 class ProductoAdmin(admin.ModelAdmin):
     list_display = ('codigo', 'nombre', 'marca', 'precio', 'stock')
     search_fields = ('codigo', 'nombre', 'marca')
     list_filter = ('categoria', 'marca')
 
+    def get_search_results(self, request, queryset, search_term):
+        # Usa el índice de texto completo en vez de LIKE sobre cada campo
+        if not search_term:
+            return queryset, False
+        return obtener_backend().filtrar(queryset, search_term), False
+
+class LineaPedidoInline(admin.TabularInline):
+    model = LineaPedido
+    extra = 0
+    readonly_fields = ('producto', 'codigo', 'nombre', 'precio_unitario', 'cantidad', 'subtotal')
+
+class PedidoAdmin(admin.ModelAdmin):
+    list_display = ('buy_order', 'usuario', 'total', 'estado', 'fecha')
+    list_filter = ('estado',)
+    search_fields = ('buy_order',)
+    date_hierarchy = 'fecha'
+    list_select_related = ('usuario',)
+    inlines = [LineaPedidoInline]
+
+class TareaAdmin(admin.ModelAdmin):
+    list_display = ('id', 'nombre', 'estado', 'intentos', 'ejecutar_desde', 'duracion', 'trabajador')
+    list_filter = ('estado', 'nombre')
+    readonly_fields = ('argumentos', 'ultimo_error', 'trabajador', 'duracion', 'creado', 'terminada')
+
 admin.site.register(Categoria)
 admin.site.register(Producto, ProductoAdmin)
 admin.site.register(Cliente)
-admin.site.register(MensajeContacto)
\ No newline at end of file
+admin.site.register(MensajeContacto)
+admin.site.register(Pedido, PedidoAdmin)
+admin.site.register(Tarea, TareaAdmin)
\ No newline at end of file
@@ -1,7 +1,13 @@
+from decimal import Decimal, InvalidOperation
+
 from rest_framework import generics, status
 from rest_framework.response import Response
 from .models import Producto, MensajeContacto
-from .serializers import ProductoSerializer, ContactoSerializer
+from .serializers import ProductoSerializer, ContactoSerializer, ConversionLoteSerializer
+from .busqueda import buscar_productos
+from .divisas import TasaNoDisponible, obtener_servicio
+from .notificaciones import notificar_contacto
+from .sincronizacion import ACTUALIZADO, cambios_desde
 import random
 
 # Vista para listar productos
@@ -9,6 +15,33 @@ class ProductoListAPIView(generics.ListAPIView):
     queryset = Producto.objects.all()
     serializer_class = ProductoSerializer
 
+# Búsqueda de texto completo, ordenada por relevancia
+class ProductoBusquedaAPIView(generics.ListAPIView):
+    serializer_class = ProductoSerializer
+
+    def get_queryset(self):
+        return buscar_productos(self.request.query_params.get('q', ''))
+
+# Sincronización incremental: solo lo creado, actualizado o eliminado desde el cursor
+class ProductoCambiosAPIView(generics.GenericAPIView):
+    serializer_class = ProductoSerializer
+    limite_maximo = 500
+
+    def get(self, request):
+        try:
+            limite = min(int(request.query_params.get('limite', 100)), self.limite_maximo)
+        except ValueError:
+            limite = 100
+        cambios, siguiente, hay_mas = cambios_desde(request.query_params.get('desde'), max(limite, 1))
+
+        resultados = []
+        for tipo, fecha, objeto in cambios:
+            if tipo == ACTUALIZADO:
+                resultados.append({'tipo': 'actualizado', 'fecha': fecha, 'producto': self.get_serializer(objeto).data})
+            else:
+                resultados.append({'tipo': 'eliminado', 'fecha': fecha, 'id': objeto.producto_id, 'codigo': objeto.codigo})
+        return Response({'cambios': resultados, 'siguiente': siguiente, 'hay_mas': hay_mas})
+
 # Vista para enviar mensajes de contacto
 class ContactoCreateAPIView(generics.CreateAPIView):
     queryset = MensajeContacto.objects.all()
@@ -18,18 +51,76 @@ class ContactoCreateAPIView(generics.CreateAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         self.perform_create(serializer)
+        notificar_contacto.encolar(serializer.instance.pk)
         return Response(
             {"mensaje": "Gracias por tu mensaje. Te responderemos pronto."},
             status=status.HTTP_201_CREATED
         )
 
-# Vista para conversión de moneda (simulada)
+# Conversión de un monto en CLP con el tipo de cambio vigente
 class MonedaAPIView(generics.GenericAPIView):
     def get(self, request):
-        clp = float(request.query_params.get('clp', 0))
-        tasa_usd = 950  # Tasa simulada: 1 USD = 950 CLP
-        valor_usd = clp / tasa_usd
-        return Response({"valor_usd": round(valor_usd, 2)})
+        moneda = request.query_params.get('moneda', 'USD').upper()
+        try:
+            clp = Decimal(request.query_params.get('clp', '0'))
+            if not clp.is_finite():
+                raise InvalidOperation
+        except InvalidOperation:
+            return Response({"error": "Monto en CLP inválido"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            servicio = obtener_servicio()
+            tasa = servicio.tasa(moneda)
+            valor = servicio.desde_clp(clp, moneda)
+        except TasaNoDisponible as e:
+            return Response({"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        datos = {"moneda": moneda, "tasa": tasa, "valor": valor}
+        if moneda == 'USD':
+            datos["valor_usd"] = valor  # Nombre original de la respuesta, se mantiene por compatibilidad
+        return Response(datos)
+
+# Conversión masiva: listas de precios o carritos completos en una sola llamada
+class MonedaLoteAPIView(generics.GenericAPIView):
+    serializer_class = ConversionLoteSerializer
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        datos = serializer.validated_data
+        moneda = datos['moneda']
+
+        try:
+            servicio = obtener_servicio()
+            tasa = servicio.tasa(moneda)
+            if 'montos' in datos:
+                convertidos = servicio.convertir_lista(datos['montos'], moneda)
+                return Response({
+                    'moneda': moneda,
+                    'tasa': str(tasa),
+                    'montos': [
+                        {'clp': str(clp), 'valor': str(valor)}
+                        for clp, valor in zip(datos['montos'], convertidos)
+                    ],
+                })
+
+            # Una sola consulta para todos los precios, en el orden pedido
+            precios = {
+                pk: (codigo, precio) for pk, codigo, precio in
+                Producto.objects.filter(pk__in=datos['productos']).values_list('id', 'codigo', 'precio')
+            }
+            encontrados = [pk for pk in dict.fromkeys(datos['productos']) if pk in precios]
+            convertidos = servicio.convertir_lista([precios[pk][1] for pk in encontrados], moneda)
+        except TasaNoDisponible as e:
+            return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        return Response({
+            'moneda': moneda,
+            'tasa': str(tasa),
+            'productos': [
+                {'id': pk, 'codigo': precios[pk][0], 'precio_clp': str(precios[pk][1]), 'precio': str(valor)}
+                for pk, valor in zip(encontrados, convertidos)
+            ],
+            'no_encontrados': [pk for pk in dict.fromkeys(datos['productos']) if pk not in precios],
+        })
 
 # Vista para Webpay simulado
 class WebpayAPIView(generics.GenericAPIView):
@@ -0,0 +1,219 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Producto
+
+# Campos indexados para la búsqueda de texto completo
+CAMPOS_BUSQUEDA = ('nombre', 'marca', 'modelo', 'codigo', 'descripcion')
+
+
+def tokenizar(texto):
+    """Separa el texto en palabras; descarta operadores para evitar inyección en la consulta"""
+    return re.findall(r'\w+', (texto or '').lower())
+
+
+def _subconsulta(queryset):
+    """SQL y parámetros de los ids del queryset, para acotar la búsqueda dentro del motor"""
+    return queryset.order_by().values('id').query.sql_with_params()
+
+
+class BusquedaBackend:
+    """Interfaz de los motores de búsqueda de productos"""
+
+    def instalar(self, connection):
+        """Crea las estructuras del índice (se ejecuta desde la migración)"""
+
+    def desinstalar(self, connection):
+        """Elimina las estructuras del índice"""
+
+    def reconstruir(self):
+        """Vuelve a indexar todo el catálogo"""
+
+    def indexar(self, producto):
+        """Actualiza un producto en el índice"""
+
+    def indexar_lote(self, productos):
+        """Actualiza varios productos (cargas masivas que no disparan señales)"""
+        for producto in productos:
+            self.indexar(producto)
+
+    def eliminar(self, producto_id):
+        """Quita un producto del índice"""
+
+    def buscar(self, texto, limite=200, desde=0, queryset=None):
+        """Devuelve los ids de productos ordenados por relevancia, a partir de la posición `desde`.
+
+        Con `queryset` (filtros del catálogo) se busca solo entre esos productos, antes
+        de aplicar el límite: un filtro no deja fuera coincidencias que estén más abajo.
+        """
+        raise NotImplementedError
+
+    def filtrar(self, queryset, texto):
+        """El queryset acotado a las coincidencias, sin límite ni orden (admin)"""
+        raise NotImplementedError
+
+
+class ContieneBackend(BusquedaBackend):
+    """Respaldo sin índice (icontains) para motores sin búsqueda de texto completo"""
+
+    def buscar(self, texto, limite=200, desde=0, queryset=None):
+        productos = self.filtrar(Producto.objects.all() if queryset is None else queryset, texto)
+        return list(productos.order_by('id').values_list('id', flat=True)[desde:desde + limite])
+
+    def filtrar(self, queryset, texto):
+        for token in tokenizar(texto):
+            condicion = Q()
+            for campo in CAMPOS_BUSQUEDA:
+                condicion |= Q(**{f'{campo}__icontains': token})
+            queryset = queryset.filter(condicion)
+        return queryset
+
+
+class SQLiteFTS5Backend(BusquedaBackend):
+    """Índice FTS5 de SQLite (desarrollo y tests), mantenido por señales"""
+    tabla = 'tienda_producto_fts'
+    # Pesos bm25 en el orden de CAMPOS_BUSQUEDA
+    pesos = (10.0, 5.0, 3.0, 8.0, 1.0)
+
+    def instalar(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.tabla} USING fts5("
+                f"{', '.join(CAMPOS_BUSQUEDA)}, tokenize='unicode61 remove_diacritics 2')"
+            )
+            cursor.execute(f"DELETE FROM {self.tabla}")
+            cursor.execute(
+                f"INSERT INTO {self.tabla} (rowid, {', '.join(CAMPOS_BUSQUEDA)}) "
+                f"SELECT id, {', '.join(CAMPOS_BUSQUEDA)} FROM tienda_producto"
+            )
+
+    def desinstalar(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {self.tabla}")
+
+    def reconstruir(self):
+        self.instalar(connection)
+
+    def indexar(self, producto):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.tabla} WHERE rowid = %s", [producto.pk])
+            cursor.execute(
+                f"INSERT INTO {self.tabla} (rowid, {', '.join(CAMPOS_BUSQUEDA)}) "
+                f"VALUES (%s, {', '.join(['%s'] * len(CAMPOS_BUSQUEDA))})",
+                [producto.pk] + [getattr(producto, campo) for campo in CAMPOS_BUSQUEDA]
+            )
+
+    def indexar_lote(self, productos):
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {self.tabla} WHERE rowid = %s", [[p.pk] for p in productos])
+            cursor.executemany(
+                f"INSERT INTO {self.tabla} (rowid, {', '.join(CAMPOS_BUSQUEDA)}) "
+                f"VALUES (%s, {', '.join(['%s'] * len(CAMPOS_BUSQUEDA))})",
+                [[p.pk] + [getattr(p, campo) for campo in CAMPOS_BUSQUEDA] for p in productos]
+            )
+
+    def eliminar(self, producto_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.tabla} WHERE rowid = %s", [producto_id])
+
+    def consulta(self, texto):
+        # Cada palabra como prefijo entre comillas: "tala"* "bosch"*
+        return ' '.join(f'"{token}"*' for token in tokenizar(texto))
+
+    def buscar(self, texto, limite=200, desde=0, queryset=None):
+        consulta = self.consulta(texto)
+        if not consulta:
+            return []
+        condicion, params = f"{self.tabla} MATCH %s", [consulta]
+        if queryset is not None:
+            sql, params_filtro = _subconsulta(queryset)
+            condicion += f" AND rowid IN ({sql})"
+            params += params_filtro
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {self.tabla} WHERE {condicion} "
+                f"ORDER BY bm25({self.tabla}, {', '.join(map(str, self.pesos))}), rowid LIMIT %s OFFSET %s",
+                [*params, limite, desde]
+            )
+            return [fila[0] for fila in cursor.fetchall()]
+
+    def filtrar(self, queryset, texto):
+        consulta = self.consulta(texto)
+        if not consulta:
+            return queryset.none()
+        return queryset.filter(id__in=RawSQL(f"SELECT rowid FROM {self.tabla} WHERE {self.tabla} MATCH %s", [consulta]))
+
+
+class PostgresBackend(BusquedaBackend):
+    """tsvector con índice GIN sobre una expresión; PostgreSQL lo mantiene solo"""
+    indice = 'producto_busqueda_gin'
+    vector = (
+        "setweight(to_tsvector('spanish', nombre || ' ' || codigo || ' ' || marca), 'A') || "
+        "setweight(to_tsvector('spanish', modelo), 'B') || "
+        "setweight(to_tsvector('spanish', descripcion), 'D')"
+    )
+
+    def instalar(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.indice} ON tienda_producto USING GIN (({self.vector}))"
+            )
+
+    def desinstalar(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP INDEX IF EXISTS {self.indice}")
+
+    def consulta(self, texto):
+        return ' & '.join(f'{token}:*' for token in tokenizar(texto))
+
+    def buscar(self, texto, limite=200, desde=0, queryset=None):
+        consulta = self.consulta(texto)
+        if not consulta:
+            return []
+        condicion, params = f"({self.vector}) @@ q", [consulta]
+        if queryset is not None:
+            sql, params_filtro = _subconsulta(queryset)
+            condicion += f" AND id IN ({sql})"
+            params += params_filtro
+        with connection.cursor() as cursor:
+            # La condición repite la expresión exacta del índice para que PostgreSQL lo use
+            cursor.execute(
+                f"SELECT id FROM tienda_producto, to_tsquery('spanish', %s) AS q "
+                f"WHERE {condicion} ORDER BY ts_rank(({self.vector}), q) DESC, id LIMIT %s OFFSET %s",
+                [*params, limite, desde]
+            )
+            return [fila[0] for fila in cursor.fetchall()]
+
+    def filtrar(self, queryset, texto):
+        consulta = self.consulta(texto)
+        if not consulta:
+            return queryset.none()
+        return queryset.filter(id__in=RawSQL(
+            f"SELECT id FROM tienda_producto WHERE ({self.vector}) @@ to_tsquery('spanish', %s)", [consulta]
+        ))
+
+
+BACKENDS_POR_MOTOR = {
+    'sqlite': SQLiteFTS5Backend,
+    'postgresql': PostgresBackend,
+}
+
+
+def obtener_backend(connection=connection):
+    """Backend configurado en BUSQUEDA_BACKEND o, si no, el adecuado al motor de la base de datos"""
+    ruta = getattr(settings, 'BUSQUEDA_BACKEND', None)
+    if ruta:
+        return import_string(ruta)()
+    return BACKENDS_POR_MOTOR.get(connection.vendor, ContieneBackend)()
+
+
+def buscar_productos(texto, queryset=None, limite=200, desde=0):
+    """Productos que coinciden con el texto, ordenados por relevancia; con `queryset`, solo entre esos"""
+    ids = obtener_backend().buscar(texto, limite, desde=desde, queryset=queryset)
+    productos = Producto.objects.in_bulk(ids)
+    return [productos[pk] for pk in ids if pk in productos]
@@ -0,0 +1,453 @@
+import time
+import uuid
+from contextlib import contextmanager
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import LineaCarrito, Producto
+
+# El carrito vive fuera de la sesión, en un almacén configurable (CARRITO_ALMACEN).
+# La sesión de un visitante anónimo solo guarda el identificador de su carrito y se
+# escribe una vez, al agregar el primer producto; los clientes autenticados usan su
+# id de usuario, así el carrito los sigue entre dispositivos.
+
+CLAVE_SESION = 'carrito_id'
+SESION_LEGADA = 'carrito'  # Carritos guardados completos en la sesión antes del almacén
+
+
+class CarritoOcupado(Exception):
+    """Otro request mantiene el candado del carrito más allá de la espera permitida"""
+
+
+class AlmacenCarrito:
+    """Cantidades por producto de cada carrito, identificado por una clave de texto"""
+
+    def contenido(self, clave):
+        """{'<producto_id>': cantidad}"""
+        raise NotImplementedError
+
+    def agregar(self, clave, producto_id, cantidad=1):
+        raise NotImplementedError
+
+    def fijar(self, clave, producto_id, cantidad):
+        raise NotImplementedError
+
+    def quitar(self, clave, producto_id):
+        raise NotImplementedError
+
+    def vaciar(self, clave):
+        raise NotImplementedError
+
+    def unidades(self, clave):
+        """Total de unidades del carrito, para el contador del navbar"""
+        return sum(self.contenido(clave).values())
+
+    def fusionar(self, origen, destino):
+        """Suma el carrito `origen` al carrito `destino` y vacía el origen"""
+        for producto_id, cantidad in self.contenido(origen).items():
+            self.agregar(destino, producto_id, cantidad)
+        self.vaciar(origen)
+
+    def aplicar(self, clave, operaciones):
+        """Aplica en orden una lista de (operación, producto_id, cantidad) ya validada"""
+        for operacion, producto_id, cantidad in operaciones:
+            if operacion == 'agregar':
+                self.agregar(clave, producto_id, cantidad)
+            elif operacion == 'fijar':
+                self.fijar(clave, producto_id, cantidad)
+            else:
+                self.quitar(clave, producto_id)
+
+
+class AlmacenBD(AlmacenCarrito):
+    """Una fila por línea en LineaCarrito; cada cambio es una sola sentencia atómica"""
+
+    timeout_unidades = 300  # El contador se guarda en el cache; cada cambio lo invalida
+
+    def unidades(self, clave):
+        # El contador se muestra en todas las páginas: sin esto cada una consultaría LineaCarrito
+        unidades = cache.get(f'carrito:{clave}:unidades')
+        if unidades is None:
+            unidades = super().unidades(clave)
+            cache.set(f'carrito:{clave}:unidades', unidades, self.timeout_unidades)
+        return unidades
+
+    def _cambio(self, clave):
+        cache.delete(f'carrito:{clave}:unidades')
+
+    def contenido(self, clave):
+        return {
+            str(producto_id): cantidad for producto_id, cantidad in
+            LineaCarrito.objects.filter(clave=clave).values_list('producto_id', 'cantidad')
+        }
+
+    def agregar(self, clave, producto_id, cantidad=1):
+        # UPDATE cantidad = cantidad + n sin leer antes: dos pestañas agregando a la vez no se pisan
+        if not self._incrementar(clave, producto_id, cantidad):
+            try:
+                with transaction.atomic():
+                    LineaCarrito.objects.create(clave=clave, producto_id=producto_id, cantidad=cantidad)
+            except IntegrityError:
+                # Otro request creó la línea entre el UPDATE y el INSERT
+                self._incrementar(clave, producto_id, cantidad)
+        self._cambio(clave)
+
+    def _incrementar(self, clave, producto_id, cantidad):
+        return LineaCarrito.objects.filter(clave=clave, producto_id=producto_id).update(
+            cantidad=F('cantidad') + cantidad, actualizado=timezone.now()
+        )
+
+    def fijar(self, clave, producto_id, cantidad):
+        if cantidad <= 0:
+            return self.quitar(clave, producto_id)
+        # Upsert en una sola sentencia (INSERT ... ON CONFLICT DO UPDATE)
+        LineaCarrito.objects.bulk_create(
+            [LineaCarrito(clave=clave, producto_id=producto_id, cantidad=cantidad)],
+            update_conflicts=True,
+            unique_fields=['clave', 'producto'],
+            update_fields=['cantidad', 'actualizado'],
+        )
+        self._cambio(clave)
+
+    def quitar(self, clave, producto_id):
+        LineaCarrito.objects.filter(clave=clave, producto_id=producto_id).delete()
+        self._cambio(clave)
+
+    def vaciar(self, clave):
+        LineaCarrito.objects.filter(clave=clave).delete()
+        self._cambio(clave)
+
+    def fusionar(self, origen, destino):
+        with transaction.atomic():
+            super().fusionar(origen, destino)
+
+    def aplicar(self, clave, operaciones):
+        # El lote se reduce a un efecto neto por producto y se escribe con una
+        # sentencia por tipo de cambio, sin importar cuántas operaciones traiga
+        fijos, sumas = {}, {}
+        for operacion, producto_id, cantidad in operaciones:
+            if operacion == 'agregar':
+                if producto_id in fijos:
+                    fijos[producto_id] += cantidad
+                else:
+                    sumas[producto_id] = sumas.get(producto_id, 0) + cantidad
+            else:
+                sumas.pop(producto_id, None)
+                fijos[producto_id] = cantidad if operacion == 'fijar' else 0
+
+        ahora = timezone.now()
+        with transaction.atomic():
+            quitar = [producto_id for producto_id, cantidad in fijos.items() if cantidad <= 0]
+            if quitar:
+                LineaCarrito.objects.filter(clave=clave, producto_id__in=quitar).delete()
+            fijar = [
+                LineaCarrito(clave=clave, producto_id=producto_id, cantidad=cantidad, actualizado=ahora)
+                for producto_id, cantidad in fijos.items() if cantidad > 0
+            ]
+            if fijar:
+                LineaCarrito.objects.bulk_create(
+                    fijar, update_conflicts=True, unique_fields=['clave', 'producto'],
+                    update_fields=['cantidad', 'actualizado'],
+                )
+            if sumas:
+                # Primero se asegura que existan las líneas y luego se incrementan en la base,
+                # igual que agregar(): un request concurrente no pisa la suma
+                LineaCarrito.objects.bulk_create(
+                    [LineaCarrito(clave=clave, producto_id=producto_id, cantidad=0) for producto_id in sumas],
+                    ignore_conflicts=True,
+                )
+                LineaCarrito.objects.filter(clave=clave, producto_id__in=sumas).update(
+                    cantidad=F('cantidad') + Case(
+                        *[When(producto_id=producto_id, then=Value(cantidad)) for producto_id, cantidad in sumas.items()]
+                    ),
+                    actualizado=ahora,
+                )
+        self._cambio(clave)
+
+
+class AlmacenCache(AlmacenCarrito):
+    """Carrito completo bajo una clave del cache compartido (Redis en producción).
+
+    Sin escrituras en la base de datos, pero un cache que se reinicia o desaloja
+    claves pierde carritos: conviene solo si eso es aceptable.
+    """
+
+    espera_candado = 2  # Segundos que se espera el candado antes de desistir
+    duracion_candado = 5  # Segundos tras los que el cache expira un candado olvidado
+    margen_candado = 1  # Pasado duracion - margen el candado ya no se considera propio
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout or getattr(settings, 'CARRITO_CACHE_TIMEOUT', 30 * 86400)
+
+    def contenido(self, clave):
+        return cache.get(f'carrito:{clave}') or {}
+
+    @contextmanager
+    def _modificar(self, clave):
+        # Lectura-modificación-escritura bajo un candado (cache.add es atómico). Mientras no
+        # se acerque su expiración el candado sigue siendo propio y se borra sin leerlo antes;
+        # si el request se demoró más, otro pudo tomarlo: no se escribe ni se libera
+        candado = f'carrito:{clave}:candado'
+        limite = time.monotonic() + self.espera_candado
+        while not cache.add(candado, 1, timeout=self.duracion_candado):
+            if time.monotonic() >= limite:
+                raise CarritoOcupado(clave)  # Sin candado no se modifica: se perdería la otra escritura
+            time.sleep(0.01)
+        vigencia = time.monotonic() + self.duracion_candado - self.margen_candado
+        try:
+            carrito = self.contenido(clave)
+            yield carrito
+            if time.monotonic() >= vigencia:
+                raise CarritoOcupado(clave)
+            if carrito:
+                cache.set(f'carrito:{clave}', carrito, self.timeout)
+            else:
+                cache.delete(f'carrito:{clave}')
+        finally:
+            if time.monotonic() < vigencia:
+                cache.delete(candado)
+
+    def agregar(self, clave, producto_id, cantidad=1):
+        with self._modificar(clave) as carrito:
+            carrito[str(producto_id)] = carrito.get(str(producto_id), 0) + cantidad
+
+    def fijar(self, clave, producto_id, cantidad):
+        with self._modificar(clave) as carrito:
+            if cantidad > 0:
+                carrito[str(producto_id)] = cantidad
+            else:
+                carrito.pop(str(producto_id), None)
+
+    def quitar(self, clave, producto_id):
+        self.fijar(clave, producto_id, 0)
+
+    def aplicar(self, clave, operaciones):
+        # Un solo ciclo lectura-modificación-escritura para todo el lote
+        with self._modificar(clave) as carrito:
+            _simular(carrito, operaciones)
+
+    def vaciar(self, clave):
+        with self._modificar(clave) as carrito:
+            carrito.clear()
+
+
+@lru_cache(maxsize=None)
+def obtener_almacen():
+    """Almacén configurado, creado una sola vez por proceso"""
+    return import_string(getattr(settings, 'CARRITO_ALMACEN', 'tienda.carrito.AlmacenBD'))()
+
+
+class Carrito:
+    """Carrito del request actual: resuelve su clave y lee el almacén una sola vez por request"""
+
+    def __init__(self, request, almacen=None):
+        self.request = request
+        self.almacen = almacen or obtener_almacen()
+        self._contenido = None
+
+    def clave(self, crear=False):
+        if self.request.user.is_authenticated:
+            return f'usuario:{self.request.user.pk}'
+        identificador = self.request.session.get(CLAVE_SESION)
+        if identificador is None and crear:
+            # Única escritura de la sesión por el carrito: se guarda solo el identificador
+            identificador = self.request.session[CLAVE_SESION] = uuid.uuid4().hex
+        return f'visitante:{identificador}' if identificador else None
+
+    def contenido(self):
+        if SESION_LEGADA in self.request.session:
+            self._migrar_sesion()
+        if self._contenido is None:
+            clave = self.clave()
+            self._contenido = self.almacen.contenido(clave) if clave else {}
+        return self._contenido
+
+    def unidades(self):
+        if self._contenido is not None or SESION_LEGADA in self.request.session:
+            return sum(self.contenido().values())
+        clave = self.clave()
+        return self.almacen.unidades(clave) if clave else 0
+
+    def _migrar_sesion(self):
+        legado = self.request.session.pop(SESION_LEGADA)
+        existentes = Producto.objects.filter(pk__in=[int(pid) for pid in legado]).values_list('pk', flat=True)
+        for producto_id in existentes:
+            self.almacen.agregar(self.clave(crear=True), producto_id, legado[str(producto_id)])
+        self._contenido = None
+
+    def agregar(self, producto_id, cantidad=1):
+        self.almacen.agregar(self.clave(crear=True), producto_id, cantidad)
+        self._contenido = None
+
+    def fijar(self, producto_id, cantidad):
+        self.almacen.fijar(self.clave(crear=True), producto_id, cantidad)
+        self._contenido = None
+
+    def quitar(self, producto_id):
+        clave = self.clave()
+        if clave:
+            self.almacen.quitar(clave, producto_id)
+        self._contenido = None
+
+    def vaciar(self):
+        clave = self.clave()
+        if clave:
+            self.almacen.vaciar(clave)
+        self._contenido = None
+
+    def aplicar(self, operaciones):
+        self.almacen.aplicar(self.clave(crear=True), operaciones)
+        self._contenido = None
+
+
+def carrito_actual(request):
+    if not hasattr(request, '_carrito'):
+        request._carrito = Carrito(request)
+    return request._carrito
+
+
+def fusionar_carrito(request, usuario):
+    """Al iniciar sesión, el carrito anónimo se suma al que el cliente ya tenía guardado"""
+    identificador = request.session.pop(CLAVE_SESION, None)
+    if identificador:
+        obtener_almacen().fusionar(f'visitante:{identificador}', f'usuario:{usuario.pk}')
+    request.__dict__.pop('_carrito', None)
+
+
+OPERACIONES = ('agregar', 'fijar', 'quitar')
+MAX_OPERACIONES = 200
+
+
+def _simular(carrito, operaciones):
+    """Aplica las operaciones sobre un dict {'<producto_id>': cantidad}"""
+    for operacion, producto_id, cantidad in operaciones:
+        clave = str(producto_id)
+        if operacion == 'agregar':
+            carrito[clave] = carrito.get(clave, 0) + cantidad
+        elif operacion == 'fijar' and cantidad > 0:
+            carrito[clave] = cantidad
+        else:
+            carrito.pop(clave, None)
+    return carrito
+
+
+def validar_operaciones(datos, carrito, productos):
+    """Convierte el lote recibido en [(operación, producto_id, cantidad)] y revisa stock.
+
+    `productos` es el resultado de un solo in_bulk con todos los ids involucrados.
+    Devuelve `(operaciones, errores)`; con errores el lote no debe aplicarse.
+    """
+    operaciones, errores = [], []
+    for indice, dato in enumerate(datos):
+        operacion = dato.get('op') if isinstance(dato, dict) else None
+        producto_id = dato.get('producto') if isinstance(dato, dict) else None
+        cantidad = dato.get('cantidad', 1 if operacion == 'agregar' else 0) if isinstance(dato, dict) else None
+        if operacion not in OPERACIONES:
+            errores.append({'indice': indice, 'error': f'Operación inválida; usa {", ".join(OPERACIONES)}'})
+        elif type(producto_id) is not int or producto_id not in productos:
+            errores.append({'indice': indice, 'error': f'Producto inexistente: {producto_id}'})
+        elif type(cantidad) is not int or cantidad < (1 if operacion == 'agregar' else 0):
+            errores.append({'indice': indice, 'error': 'Cantidad inválida'})
+        else:
+            operaciones.append((operacion, producto_id, cantidad if operacion != 'quitar' else 0))
+
+    # Solo se revisan los productos del lote: una línea que ya estaba no bloquea el resto
+    resultado = _simular(dict(carrito), operaciones)
+    for producto_id in dict.fromkeys(producto_id for _, producto_id, _ in operaciones):
+        producto, cantidad = productos[producto_id], resultado.get(str(producto_id), 0)
+        if cantidad > producto.stock:
+            errores.append({'producto': producto.id, 'error': f'Stock insuficiente para {producto.nombre} (disponible: {producto.stock})'})
+    return operaciones, errores
+
+
+def aplicar_lote(request, datos):
+    """Valida todo el lote con una consulta a Producto, lo aplica y devuelve `(carrito valorizado, errores)`"""
+    carrito = carrito_actual(request)
+    contenido = carrito.contenido()
+    ids = {int(pid) for pid in contenido}
+    ids.update(d['producto'] for d in datos if isinstance(d, dict) and isinstance(d.get('producto'), int))
+    productos = Producto.objects.in_bulk(ids)
+
+    operaciones, errores = validar_operaciones(datos, contenido, productos)
+    if errores:
+        return None, errores
+    carrito.aplicar(operaciones)
+    return calcular_carrito(carrito.contenido(), productos), []
+
+
+def calcular_carrito(carrito, productos=None):
+    """Calcula líneas, subtotales y total del carrito con una sola consulta a Producto.
+
+    Con `productos` ya cargados ({id: Producto}) solo se consultan los que falten.
+    """
+    productos = dict(productos or {})
+    faltantes = [int(producto_id) for producto_id in carrito if int(producto_id) not in productos]
+    if faltantes:
+        productos.update(Producto.objects.in_bulk(faltantes))
+    items = []
+    total = 0
+
+    for producto_id, cantidad in carrito.items():
+        producto = productos.get(int(producto_id))
+        if producto is None:  # El producto fue eliminado del catálogo
+            continue
+        subtotal = producto.precio * cantidad
+        items.append({
+            'producto': producto,
+            'producto_id': producto.id,
+            'nombre': producto.nombre,
+            'precio': producto.precio,
+            'cantidad': cantidad,
+            'subtotal': subtotal
+        })
+        total += subtotal
+
+    return {'items': items, 'total': total, 'count': sum(carrito.values())}
+
+
+def obtener_carrito(request):
+    """Devuelve el carrito valorizado del request, calculado una sola vez por request"""
+    carrito = carrito_actual(request).contenido()
+    firma = tuple(sorted(carrito.items()))
+
+    # Se recalcula solo si el carrito cambió durante el request
+    cache = getattr(request, '_carrito_calculado', None)
+    if cache is None or cache[0] != firma:
+        cache = (firma, calcular_carrito(carrito))
+        request._carrito_calculado = cache
+    return cache[1]
+
+
+def items_json(items):
+    """Versión serializable de las líneas del carrito (sin la instancia de Producto)"""
+    return [{k: v for k, v in item.items() if k != 'producto'} for item in items]
+
+
+class CarritoResumen:
+    """Resumen perezoso del carrito para las plantillas.
+
+    `count` usa el contador del almacén (nunca Producto ni, en AlmacenBD, LineaCarrito
+    mientras esté en el cache); `items` y `total` solo consultan los productos si una
+    plantilla los usa, y se reutilizan en el resto del request.
+    """
+
+    def __init__(self, request):
+        self.request = request
+
+    @property
+    def count(self):
+        return carrito_actual(self.request).unidades()
+
+    @property
+    def items(self):
+        return obtener_carrito(self.request)['items']
+
+    @property
+    def total(self):
+        return obtener_carrito(self.request)['total']
@@ -0,0 +1,175 @@
+import base64
+import hashlib
+import json
+import time
+from decimal import Decimal, InvalidOperation
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+from .busqueda import buscar_productos
+from .models import Producto
+
+# Órdenes permitidos en el catálogo. Todos terminan en `id` para que el
+# cursor sea único, y cada uno está respaldado por un índice de Producto.
+ORDENES = {
+    'recientes': ('-creado', 'id'),
+    'precio_asc': ('precio', 'id'),
+    'precio_desc': ('-precio', '-id'),
+    'nombre': ('nombre', 'marca', 'id'),
+}
+ORDEN_POR_DEFECTO = 'recientes'
+# Más allá, OFFSET en el índice de texto se encarece y los resultados ya no son relevantes
+MAX_DESPLAZAMIENTO_BUSQUEDA = 1000
+
+
+def filtrar_productos(params):
+    """Aplica los filtros del catálogo (categoría, marca y rango de precio)"""
+    productos = Producto.objects.all()
+
+    categoria = params.get('categoria')
+    if categoria and categoria.isdigit():
+        productos = productos.filter(categoria_id=int(categoria))
+
+    marca = params.get('marca', '').strip()
+    if marca:
+        productos = productos.filter(marca=marca)
+
+    for parametro, lookup in (('precio_min', 'precio__gte'), ('precio_max', 'precio__lte')):
+        valor = _decimal(params.get(parametro))
+        if valor is not None:
+            productos = productos.filter(**{lookup: valor})
+
+    return productos
+
+
+def paginar_keyset(queryset, orden, cursor=None, tamano=24):
+    """Pagina por búsqueda (seek) en vez de OFFSET: la página 500 cuesta lo mismo que la 1.
+
+    Devuelve `(productos, siguiente_cursor)`; el cursor es None en la última página.
+    """
+    campos = ORDENES.get(orden, ORDENES[ORDEN_POR_DEFECTO])
+    queryset = queryset.order_by(*campos)
+
+    valores = _valores_cursor(campos, decodificar_cursor(cursor))
+    if valores is not None:
+        queryset = queryset.filter(_condicion_seek(campos, valores))
+
+    productos = list(queryset[:tamano + 1])
+    siguiente = None
+    if len(productos) > tamano:
+        productos = productos[:tamano]
+        siguiente = codificar_cursor(productos[-1], campos)
+    return productos, siguiente
+
+
+def paginar_busqueda(texto, queryset, cursor=None, tamano=24):
+    """Resultados de búsqueda por relevancia, paginados por posición en el ranking.
+
+    El cursor guarda la posición siguiente; un cursor de otro listado vuelve a la primera página.
+    """
+    valores = decodificar_cursor(cursor)
+    desde = valores[0] if valores and len(valores) == 1 and isinstance(valores[0], int) else 0
+    desde = min(max(desde, 0), MAX_DESPLAZAMIENTO_BUSQUEDA)
+    productos = buscar_productos(texto, queryset, limite=tamano + 1, desde=desde)
+    siguiente = None
+    if len(productos) > tamano and desde + tamano <= MAX_DESPLAZAMIENTO_BUSQUEDA:
+        siguiente = codificar_valores([desde + tamano])
+    return productos[:tamano], siguiente
+
+
+def _valores_cursor(campos, valores):
+    """Convierte los valores del cursor al tipo de cada campo; None si no corresponden al orden"""
+    if valores is None or len(valores) != len(campos):
+        return None
+    convertidos = []
+    for campo, valor in zip(campos, valores):
+        if valor is None:
+            return None
+        try:
+            convertidos.append(Producto._meta.get_field(campo.lstrip('-')).to_python(valor))
+        except (ValidationError, ValueError, TypeError):  # Cursor manipulado: se vuelve a la primera página
+            return None
+    return convertidos
+
+
+def _condicion_seek(campos, valores):
+    """Construye la condición lexicográfica `(a, b, c) > (x, y, z)` respetando cada dirección"""
+    condicion = Q()
+    iguales = Q()
+    for campo, valor in zip(campos, valores):
+        nombre = campo.lstrip('-')
+        lookup = 'lt' if campo.startswith('-') else 'gt'
+        condicion |= iguales & Q(**{f'{nombre}__{lookup}': valor})
+        iguales &= Q(**{nombre: valor})
+    return condicion
+
+
+def codificar_cursor(producto, campos):
+    return codificar_valores([str(getattr(producto, campo.lstrip('-'))) for campo in campos])
+
+
+def codificar_valores(valores):
+    return base64.urlsafe_b64encode(json.dumps(valores).encode()).decode()
+
+
+def decodificar_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):  # Cursor manipulado o corrupto: se vuelve a la primera página
+        return None
+    return valores if isinstance(valores, list) else None
+
+
+def _decimal(valor):
+    try:
+        return Decimal(valor) if valor not in (None, '') else None
+    except InvalidOperation:
+        return None
+
+
+# Cache del catálogo. Todas las claves incluyen la versión del catálogo, que las
+# señales de Producto y Categoria incrementan: al cambiar la versión, las
+# entradas anteriores dejan de leerse y expiran solas.
+CLAVE_VERSION = 'catalogo:version'
+
+
+def version_catalogo():
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        # Se parte de la hora actual para no reutilizar versiones de antes de un reinicio del cache
+        cache.add(CLAVE_VERSION, int(time.time()), timeout=None)
+        version = cache.get(CLAVE_VERSION)
+    return version
+
+
+def invalidar_catalogo():
+    """Invalida listados y fichas cacheadas del catálogo"""
+    try:
+        cache.incr(CLAVE_VERSION)
+    except ValueError:  # La clave no existe (cache vacío o reiniciado)
+        version_catalogo()
+
+
+def listado_cacheado(nombre, params, calcular):
+    """Devuelve el resultado cacheado de `calcular()` para estos parámetros y la versión actual"""
+    consulta = urlencode(sorted((k, v) for k, v in params.items() if v))
+    clave = f"catalogo:{version_catalogo()}:{nombre}:{hashlib.md5(consulta.encode()).hexdigest()}"
+    resultado = cache.get(clave)
+    if resultado is None:
+        resultado = calcular()
+        cache.set(clave, resultado, getattr(settings, 'CATALOGO_CACHE_TIMEOUT', 900))
+    return resultado
+
+
+def contexto_cache():
+    """Variables para los fragmentos {% cache %} de las fichas de producto"""
+    return {
+        'catalogo_version': version_catalogo(),
+        'catalogo_timeout': getattr(settings, 'CATALOGO_CACHE_TIMEOUT', 900),
+    }
@@ -0,0 +1,174 @@
+import multiprocessing
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+
+import django
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+
+from .importacion import ResultadoImportacion
+from .models import Cliente
+
+# Perfiles Cliente: validación de RUT y alta masiva de clientes desde CSV/XLSX.
+# El perfil se crea junto con el User (registro o importación), no con una señal
+# post_save: una señal no recibe los datos del perfil y no corre con bulk_create.
+
+FORMATO_RUT = re.compile(r'^(\d{1,2})\.(\d{3})\.(\d{3})-([\dkK])$')
+COLUMNAS_USUARIO = ('username', 'email', 'first_name', 'last_name')
+COLUMNAS_CLIENTE = ('rut', 'telefono', 'direccion', 'comuna', 'nacionalidad', 'sexo', 'fecha_nacimiento')
+
+
+def digito_verificador(numero):
+    """Dígito verificador de un RUT (módulo 11)"""
+    suma, factor = 0, 2
+    for digito in reversed(str(numero)):
+        suma += int(digito) * factor
+        factor = 2 if factor == 7 else factor + 1
+    resto = 11 - suma % 11
+    return {11: '0', 10: 'K'}.get(resto, str(resto))
+
+
+def formatear_rut(numero):
+    """12345678 -> '12.345.678-5'"""
+    return f"{numero:,}".replace(',', '.') + f'-{digito_verificador(numero)}'
+
+
+def validar_rut(rut):
+    """Devuelve el RUT normalizado (K mayúscula) o lanza ValidationError si el formato o el dígito no calzan"""
+    coincidencia = FORMATO_RUT.match(rut or '')
+    if not coincidencia:
+        raise ValidationError('Formato de RUT inválido. Usa el formato: 12.345.678-9')
+    numero = int(''.join(coincidencia.groups()[:3]))
+    if digito_verificador(numero) != coincidencia.group(4).upper():
+        raise ValidationError('El dígito verificador del RUT no es válido.')
+    return rut.upper()
+
+
+def _hashear(password):
+    if not password:
+        return make_password(None)  # Contraseña inutilizable: el cliente debe restablecerla
+    try:
+        identify_hasher(password)
+        return password  # Ya viene hasheada (p. ej. exportada de otro sistema Django)
+    except ValueError:
+        return make_password(password)
+
+
+class ImportadorClientes:
+    """Alta masiva de clientes: User y Cliente con bulk_create, por lotes.
+
+    Hashear contraseñas (PBKDF2) domina el tiempo de una importación grande y no
+    libera el GIL, así que con `procesos` > 1 se reparte en un pool de procesos.
+    Los clientes cuyo username o RUT ya existen se informan como error, no se actualizan.
+    """
+
+    def __init__(self, tamano_lote=1000, procesos=1):
+        self.tamano_lote = tamano_lote
+        self.procesos = procesos
+        self.campos_usuario = {nombre: User._meta.get_field(nombre) for nombre in COLUMNAS_USUARIO}
+        self.campos_cliente = {nombre: Cliente._meta.get_field(nombre) for nombre in COLUMNAS_CLIENTE}
+
+    def importar(self, filas):
+        resultado = ResultadoImportacion()
+        inicio = time.perf_counter()
+        pool = None
+        if self.procesos > 1:
+            # 'spawn': procesos limpios que no heredan las conexiones abiertas del padre
+            pool = ProcessPoolExecutor(
+                self.procesos, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup
+            )
+        try:
+            lote = []  # [(fila, User, Cliente, contraseña)]
+            for numero, datos in enumerate(filas, start=2):  # La fila 1 es el encabezado
+                resultado.filas += 1
+                try:
+                    lote.append((numero, *self.construir(datos)))
+                except ValidationError as e:
+                    resultado.errores.append((numero, '; '.join(e.messages)))
+                    continue
+                if len(lote) >= self.tamano_lote:
+                    self.guardar_lote(lote, resultado, pool)
+                    lote = []
+            if lote:
+                self.guardar_lote(lote, resultado, pool)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        resultado.segundos = time.perf_counter() - inicio
+        return resultado
+
+    def construir(self, datos):
+        """Valida una fila con las reglas de User y Cliente; devuelve (User, Cliente, contraseña)"""
+        datos = {k.strip().lower(): v for k, v in datos.items() if k}
+        errores = []
+        valores = {}
+        for nombre, campo in {**self.campos_usuario, **self.campos_cliente}.items():
+            valor = datos.get(nombre, '')
+            if isinstance(valor, datetime):
+                valor = valor.date()  # Una celda de fecha en XLSX llega como datetime
+            elif not isinstance(valor, date):
+                valor = str(valor).strip() if valor is not None else ''
+            try:
+                valores[nombre] = campo.clean(valor, None)
+            except ValidationError as e:
+                errores.append(f'{nombre}: {" ".join(e.messages)}')
+        if 'rut' in valores:
+            try:
+                valores['rut'] = validar_rut(valores['rut'])
+            except ValidationError as e:
+                errores.append(f'rut: {" ".join(e.messages)}')
+        if errores:
+            raise ValidationError(errores)
+
+        usuario = User(**{nombre: valores[nombre] for nombre in COLUMNAS_USUARIO})
+        cliente = Cliente(**{nombre: valores[nombre] for nombre in COLUMNAS_CLIENTE})
+        return usuario, cliente, str(datos.get('password') or '')
+
+    def guardar_lote(self, lote, resultado, pool=None):
+        lote = self.descartar_duplicados(lote, resultado)
+        if not lote:
+            return
+
+        contrasenas = [contrasena for _, _, _, contrasena in lote]
+        if pool is not None:
+            hashes = list(pool.map(_hashear, contrasenas, chunksize=max(len(contrasenas) // (self.procesos * 4), 1)))
+        else:
+            hashes = [_hashear(contrasena) for contrasena in contrasenas]
+        for (_, usuario, _, _), hash_ in zip(lote, hashes):
+            usuario.password = hash_
+
+        try:
+            with transaction.atomic():
+                usuarios = User.objects.bulk_create([usuario for _, usuario, _, _ in lote])
+                for usuario, (_, _, cliente, _) in zip(usuarios, lote):
+                    cliente.usuario_id = usuario.pk
+                Cliente.objects.bulk_create([cliente for _, _, cliente, _ in lote])
+        except DatabaseError as e:
+            # Un lote fallido no detiene la importación: se informa en cada una de sus filas
+            resultado.errores.extend((numero, f'error al guardar el lote: {e}') for numero, _, _, _ in lote)
+            return
+        resultado.importadas += len(lote)
+
+    def descartar_duplicados(self, lote, resultado):
+        """Quita las filas cuyo username o RUT ya existe (en la base o antes en el lote): dos consultas por lote"""
+        usernames = set(User.objects.filter(
+            username__in=[usuario.username for _, usuario, _, _ in lote]
+        ).values_list('username', flat=True))
+        ruts = set(Cliente.objects.filter(rut__in=[cliente.rut for _, _, cliente, _ in lote]).values_list('rut', flat=True))
+
+        validas = []
+        for fila in lote:
+            numero, usuario, cliente, _ = fila
+            if usuario.username in usernames:
+                resultado.errores.append((numero, f'username: "{usuario.username}" ya existe'))
+            elif cliente.rut in ruts:
+                resultado.errores.append((numero, f'rut: {cliente.rut} ya está registrado'))
+            else:
+                usernames.add(usuario.username)
+                ruts.add(cliente.rut)
+                validas.append(fila)
+        return validas
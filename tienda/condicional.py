@@ -0,0 +1,74 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+
+from .models import Categoria, Producto, ProductoEliminado
+
+# GET condicional (ETag / Last-Modified) para la API REST. Los validadores salen
+# de una consulta agregada barata, así un 304 no serializa ni un solo producto.
+
+
+def _etag(request, *partes):
+    # El formato negociado (json, html navegable) y el día también forman parte de la
+    # representación: `disponible` depende de la fecha actual.
+    formato = getattr(getattr(request, 'accepted_renderer', None), 'format', '')
+    base = '|'.join(str(p) for p in (*partes, formato, timezone.localdate()))
+    return f'"{hashlib.md5(base.encode()).hexdigest()}"'
+
+
+def _estado_productos(request):
+    """Último cambio (actualización o eliminación) y count de Producto, calculados una vez por request"""
+    if not hasattr(request, '_estado_productos'):
+        estado = Producto.objects.aggregate(ultimo=Max('actualizado'), total=Count('id'))
+        # Una eliminación no deja rastro en Producto: la fecha sale de su lápida
+        eliminado = ProductoEliminado.objects.aggregate(ultimo=Max('eliminado'))['ultimo']
+        if eliminado and (estado['ultimo'] is None or eliminado > estado['ultimo']):
+            estado['ultimo'] = eliminado
+        request._estado_productos = estado
+    return request._estado_productos
+
+
+def _etag_productos(request, *args, **kwargs):
+    estado = _estado_productos(request)
+    return _etag(request, 'productos', estado['total'], estado['ultimo'])
+
+
+def _modificado_productos(request, *args, **kwargs):
+    return _estado_productos(request)['ultimo']
+
+
+def _actualizado_producto(request, pk):
+    if not hasattr(request, '_actualizado_producto'):
+        request._actualizado_producto = (
+            Producto.objects.filter(pk=pk).values_list('actualizado', flat=True).first()
+        )
+    return request._actualizado_producto
+
+
+def _etag_producto(request, pk, **kwargs):
+    actualizado = _actualizado_producto(request, pk)
+    # Sin ETag si no existe: la vista responde 404
+    return _etag(request, 'producto', pk, actualizado) if actualizado else None
+
+
+def _modificado_producto(request, pk, **kwargs):
+    return _actualizado_producto(request, pk)
+
+
+def _etag_categorias(request, *args, **kwargs):
+    # Desde la base, como el de productos: la versión del catálogo vive en el cache de
+    # cada proceso y otro trabajador no se enteraría del cambio. El count cubre las eliminaciones
+    estado = Categoria.objects.aggregate(ultimo=Max('actualizado'), total=Count('id'))
+    return _etag(request, 'categorias', estado['total'], estado['ultimo'])
+
+
+condicional_productos = method_decorator(
+    condition(etag_func=_etag_productos, last_modified_func=_modificado_productos), name='get'
+)
+condicional_producto = method_decorator(
+    condition(etag_func=_etag_producto, last_modified_func=_modificado_producto), name='get'
+)
+condicional_categorias = method_decorator(condition(etag_func=_etag_categorias), name='get')
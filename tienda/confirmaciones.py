@@ -0,0 +1,93 @@
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import ConfirmacionPago
+
+# Confirmación idempotente de pagos. El navegador y Transbank pueden repetir la
+# URL de retorno; solo el primer request que inserta el token llama al commit de
+# Webpay, el resto espera su resultado y lo reutiliza sin salir a la red.
+
+
+class ConfirmacionEnCurso(Exception):
+    def __init__(self, token):
+        self.token = token
+        super().__init__('El pago se está confirmando, vuelve a intentarlo en unos segundos')
+
+
+def reclamar_token(token):
+    """Devuelve `(registro, propio)`; `propio` indica que este request debe llamar a Webpay.
+
+    Si otro request ya lo está confirmando, espera hasta que termine o hasta
+    WEBPAY_CONFIRMACION_ESPERA segundos; si no termina, lanza ConfirmacionEnCurso.
+    """
+    try:
+        with transaction.atomic():
+            # El índice único sobre `token` serializa a los requests concurrentes
+            return ConfirmacionPago.objects.create(token=token), True
+    except IntegrityError:
+        pass
+
+    limite = time.monotonic() + getattr(settings, 'WEBPAY_CONFIRMACION_ESPERA', 10)
+    while True:
+        registro = ConfirmacionPago.objects.filter(token=token).first()
+        if registro is None:
+            # El dueño anterior falló y liberó el token: se vuelve a intentar
+            return reclamar_token(token)
+        if registro.estado == ConfirmacionPago.COMPLETADA:
+            return registro, False
+        if _tomar_abandonado(registro):
+            return registro, True
+        if time.monotonic() >= limite:
+            raise ConfirmacionEnCurso(token)
+        time.sleep(0.1)
+
+
+def _tomar_abandonado(registro):
+    # Un proceso que murió a mitad del commit deja el token en PROCESANDO para siempre
+    vencido = timezone.now() - timedelta(seconds=getattr(settings, 'WEBPAY_CONFIRMACION_VENCIMIENTO', 60))
+    return ConfirmacionPago.objects.filter(
+        pk=registro.pk, estado=ConfirmacionPago.PROCESANDO, actualizado__lt=vencido
+    ).update(actualizado=timezone.now()) == 1
+
+
+def guardar_respuesta(registro, respuesta):
+    ConfirmacionPago.objects.filter(pk=registro.pk).update(
+        estado=ConfirmacionPago.COMPLETADA, respuesta=respuesta, actualizado=timezone.now()
+    )
+
+
+def liberar_token(registro):
+    """El commit falló sin respuesta: se borra el registro para permitir un reintento"""
+    ConfirmacionPago.objects.filter(pk=registro.pk, estado=ConfirmacionPago.PROCESANDO).delete()
+
+
+def confirmar_idempotente(token, confirmar):
+    """Llama a `confirmar(token)` una sola vez por token y devuelve siempre la misma respuesta"""
+    registro, propio = reclamar_token(token)
+    if not propio:
+        return registro.respuesta
+    try:
+        respuesta = confirmar(token)
+    except Exception:
+        liberar_token(registro)
+        raise
+    guardar_respuesta(registro, respuesta)
+    return respuesta
+
+
+async def confirmar_idempotente_async(token, confirmar_async):
+    registro, propio = await sync_to_async(reclamar_token)(token)
+    if not propio:
+        return registro.respuesta
+    try:
+        respuesta = await confirmar_async(token)
+    except Exception:
+        await sync_to_async(liberar_token)(registro)
+        raise
+    await sync_to_async(guardar_respuesta)(registro, respuesta)
+    return respuesta
@@ -0,0 +1,90 @@
+import re
+import traceback
+from collections import Counter
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+
+# Detector de N+1: agrupa las consultas de un request por su forma (la huella,
+# sin valores) y señala las que se repiten más de `umbral` veces, con la línea
+# del proyecto que las emitió. Se usa en los tests y, en desarrollo, como
+# middleware (tienda.middleware.ConsultasRepetidasMiddleware).
+
+_LISTA_IN = re.compile(r'\bIN\s*\((?:\s*%s\s*,?)+\)', re.IGNORECASE)
+_FILAS_VALUES = re.compile(r'(\((?:\s*%s\s*,?)+\))(?:\s*,\s*\((?:\s*%s\s*,?)+\))+')
+_LITERALES = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_ESPACIOS = re.compile(r'\s+')
+
+
+def huella(sql):
+    """Forma de la consulta: sin valores, con las listas IN (...) y los VALUES múltiples colapsados"""
+    sql = _LITERALES.sub('?', sql)
+    sql = _LISTA_IN.sub('IN (...)', sql)
+    sql = _FILAS_VALUES.sub(r'\1, ...', sql)
+    return _ESPACIOS.sub(' ', sql).strip()
+
+
+def _pila_del_proyecto():
+    """Marcos del código propio que llevaron a la consulta, del más externo al más interno"""
+    raiz = str(Path(settings.BASE_DIR).resolve())
+    propio = str(Path(__file__).resolve())
+    return [
+        marco for marco in traceback.extract_stack()[:-2]
+        if marco.filename.startswith(raiz) and marco.filename != propio
+        and 'site-packages' not in marco.filename
+    ]
+
+
+class ConsultasRepetidas(AssertionError):
+    pass
+
+
+class DetectorConsultas:
+    """Cuenta las consultas por huella mientras está activo (`with DetectorConsultas() as d:`)"""
+
+    def __init__(self, umbral=None):
+        self.umbral = umbral if umbral is not None else getattr(settings, 'CONSULTAS_REPETIDAS_UMBRAL', 5)
+        self.conteo = Counter()
+        self.pilas = {}
+        self._pila = None
+
+    def __call__(self, execute, sql, params, many, context):
+        clave = huella(sql)
+        self.conteo[clave] += 1
+        if clave not in self.pilas:
+            self.pilas[clave] = _pila_del_proyecto()  # Solo la primera vez: extraer la pila cuesta
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._pila = ExitStack()
+        for conexion in connections.all():
+            self._pila.enter_context(conexion.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc):
+        self._pila.close()
+
+    @property
+    def total(self):
+        return sum(self.conteo.values())
+
+    def repetidas(self):
+        """[(huella, veces, pila)] de las consultas que superan el umbral, la más repetida primero"""
+        return [
+            (clave, veces, self.pilas[clave])
+            for clave, veces in self.conteo.most_common() if veces > self.umbral
+        ]
+
+    def informe(self):
+        lineas = []
+        for clave, veces, pila in self.repetidas():
+            lineas.append(f'{veces}x {clave[:300]}')
+            for marco in pila[-4:]:
+                lineas.append(f'    {marco.filename}:{marco.lineno} en {marco.name}: {marco.line}')
+        return '\n'.join(lineas)
+
+    def verificar(self):
+        if self.repetidas():
+            raise ConsultasRepetidas(f'Consultas repetidas más de {self.umbral} veces:\n{self.informe()}')
@@ -1,27 +1,5 @@
-from .models import Producto
+from .carrito import CarritoResumen
 
 def carrito(request):
-    carrito_items = []
-    total = 0
-    carrito = request.session.get('carrito', {})
-    
-    for producto_id, cantidad in carrito.items():
-        try:
-            producto = Producto.objects.get(id=producto_id)
-            subtotal = producto.precio * cantidad
-            carrito_items.append({
-                'producto': producto,
-                'cantidad': cantidad,
-                'subtotal': subtotal
-            })
-            total += subtotal
-        except Producto.DoesNotExist:
-            continue
-    
-    return {
-        'carrito_context': {
-            'items': carrito_items,
-            'total': total,
-            'count': sum(carrito.values())
-        }
-    }
\ No newline at end of file
+    # Objeto perezoso: el badge del navbar no consulta Producto
+    return {'carrito_context': CarritoResumen(request)}
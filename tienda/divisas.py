@@ -0,0 +1,189 @@
+import json
+import logging
+import threading
+import time
+from datetime import date, timedelta
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from functools import lru_cache
+from pathlib import Path
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Tipos de cambio en pesos chilenos por unidad de moneda extranjera (1 USD = N CLP).
+# Las tasas se guardan en memoria del proceso y en el cache compartido; una tasa
+# vencida se sigue usando mientras un hilo la actualiza (stale-while-revalidate),
+# así ningún request espera a la fuente externa salvo el primero tras un arranque en frío.
+
+CLAVE_TASAS = 'divisas:tasas'
+CLAVE_ACTUALIZANDO = 'divisas:actualizando'
+DECIMALES = {'CLP': 0}  # El resto de las monedas se redondea a 2 decimales
+
+
+class TasaNoDisponible(Exception):
+    pass
+
+
+class ProveedorTasas:
+    """Fuente de tipos de cambio. `obtener()` devuelve {'USD': Decimal('950.12'), ...}"""
+
+    def obtener(self):
+        raise NotImplementedError
+
+
+class ProveedorArchivo(ProveedorTasas):
+    """Tasas fijas desde un archivo JSON ({"USD": "950.12", ...}); para desarrollo y tests"""
+
+    def __init__(self, ruta=Path(__file__).parent / 'datos' / 'tasas_cambio.json'):
+        self.ruta = ruta
+
+    def obtener(self):
+        with open(self.ruta, encoding='utf-8') as archivo:
+            return {moneda.upper(): Decimal(str(valor)) for moneda, valor in json.load(archivo).items()}
+
+
+class ProveedorBancoCentral(ProveedorTasas):
+    """API de series (SIETE) del Banco Central de Chile; requiere usuario y clave"""
+
+    URL = 'https://si3.bcentral.cl/SieteRestWS/SieteRestWS.ashx'
+    SERIES = {
+        'USD': 'F073.TCO.PRE.Z.D',  # Dólar observado
+        'EUR': 'F072.CLP.EUR.N.O.D',
+        'ARS': 'F072.CLP.ARS.N.O.D',
+    }
+
+    def __init__(self, usuario, clave, series=None, timeout=(3.05, 10)):
+        self.usuario = usuario
+        self.clave = clave
+        self.series = series or self.SERIES
+        self.timeout = timeout
+        self.sesion = requests.Session()
+
+    def obtener(self):
+        # Se pide una ventana de días para cubrir fines de semana y feriados sin publicación
+        desde = (date.today() - timedelta(days=10)).isoformat()
+        return {moneda: self._ultimo_valor(serie, desde) for moneda, serie in self.series.items()}
+
+    def _ultimo_valor(self, serie, desde):
+        respuesta = self.sesion.get(self.URL, params={
+            'user': self.usuario, 'pass': self.clave, 'function': 'GetSeries',
+            'timeseries': serie, 'firstdate': desde,
+        }, timeout=self.timeout)
+        respuesta.raise_for_status()
+        datos = respuesta.json()
+        if datos.get('Codigo') != 0:
+            raise TasaNoDisponible(f"Banco Central: {datos.get('Descripcion')} ({serie})")
+        for observacion in reversed((datos.get('Series') or {}).get('Obs') or []):
+            try:
+                valor = Decimal(observacion['value'])
+            except (InvalidOperation, KeyError):
+                continue
+            if observacion.get('statusCode') == 'OK' and valor.is_finite():
+                return valor
+        raise TasaNoDisponible(f'Banco Central: sin observaciones recientes para {serie}')
+
+
+class ServicioDivisas:
+    def __init__(self, proveedor, ttl=3600, max_antiguedad=2 * 86400):
+        self.proveedor = proveedor
+        self.ttl = ttl  # Segundos que una tasa se considera fresca
+        self.max_antiguedad = max_antiguedad  # Segundos que el cache compartido conserva una tasa vencida
+        self._local = None  # {'tasas': {...}, 'obtenido': timestamp}
+        self._lock = threading.Lock()
+
+    def tasas(self):
+        datos = self._local
+        if datos is None or self._vencido(datos):
+            compartido = cache.get(CLAVE_TASAS)
+            if compartido and (datos is None or compartido['obtenido'] > datos['obtenido']):
+                datos = self._local = compartido
+        if datos is None:
+            return self.actualizar()['tasas']  # Arranque en frío: no hay nada que servir
+        if self._vencido(datos):
+            self.revalidar()
+        return datos['tasas']
+
+    def tasa(self, moneda):
+        moneda = moneda.upper()
+        if moneda == 'CLP':
+            return Decimal(1)
+        try:
+            return self.tasas()[moneda]
+        except KeyError:
+            raise TasaNoDisponible(f'Moneda no soportada: {moneda}')
+
+    def actualizar(self):
+        """Consulta al proveedor y publica las tasas en memoria y en el cache compartido"""
+        try:
+            tasas = self.proveedor.obtener()
+        except (requests.RequestException, OSError, ValueError) as e:
+            raise TasaNoDisponible(str(e)) from e
+        datos = {'tasas': tasas, 'obtenido': time.time()}
+        cache.set(CLAVE_TASAS, datos, self.max_antiguedad)
+        self._local = datos
+        return datos
+
+    def revalidar(self):
+        """Actualiza en un hilo aparte; un solo hilo por proceso y uno solo entre procesos"""
+        if not self._lock.acquire(blocking=False):
+            return None
+        if not cache.add(CLAVE_ACTUALIZANDO, 1, timeout=60):
+            self._lock.release()
+            return None
+        hilo = threading.Thread(target=self._revalidar, daemon=True)
+        hilo.start()
+        return hilo
+
+    def _revalidar(self):
+        try:
+            self.actualizar()
+        except TasaNoDisponible as e:
+            logger.warning('No se pudo actualizar el tipo de cambio, se mantiene el anterior: %s', e)
+        finally:
+            cache.delete(CLAVE_ACTUALIZANDO)
+            self._lock.release()
+
+    def _vencido(self, datos):
+        return time.time() - datos['obtenido'] > self.ttl
+
+    def desde_clp(self, monto, moneda):
+        return self.convertir_lista([monto], moneda)[0]
+
+    def a_clp(self, monto, moneda):
+        return redondear(Decimal(monto) * self.tasa(moneda), 'CLP')
+
+    def convertir_lista(self, montos, moneda):
+        """Convierte muchos montos en CLP con una sola búsqueda de tasa"""
+        tasa = self.tasa(moneda)
+        cuantizador = _cuantizador(moneda)
+        return [(Decimal(monto) / tasa).quantize(cuantizador, ROUND_HALF_UP) for monto in montos]
+
+    def convertir_productos(self, productos, moneda):
+        """Agrega `precio_moneda` a cada producto (modo "precios en USD" del catálogo)"""
+        productos = list(productos)
+        for producto, precio in zip(productos, self.convertir_lista([p.precio for p in productos], moneda)):
+            producto.precio_moneda = precio
+        return productos
+
+
+def _cuantizador(moneda):
+    return Decimal(1).scaleb(-DECIMALES.get(moneda.upper(), 2))
+
+
+def redondear(monto, moneda):
+    return Decimal(monto).quantize(_cuantizador(moneda), ROUND_HALF_UP)
+
+
+@lru_cache(maxsize=None)
+def obtener_servicio():
+    """Servicio de divisas configurado, creado una sola vez por proceso"""
+    proveedor = import_string(getattr(settings, 'DIVISAS_PROVEEDOR', 'tienda.divisas.ProveedorArchivo'))
+    return ServicioDivisas(
+        proveedor(**getattr(settings, 'DIVISAS_OPCIONES', {})),
+        ttl=getattr(settings, 'DIVISAS_TTL', 3600),
+        max_antiguedad=getattr(settings, 'DIVISAS_MAX_ANTIGUEDAD', 2 * 86400),
+    )
@@ -0,0 +1,43 @@
+import csv
+import json
+
+from .models import Producto
+
+# Exportación del catálogo en streaming: las filas se leen por bloques con
+# .iterator() y se emiten una a una, así la memoria no crece con el catálogo.
+COLUMNAS = ('id', 'codigo', 'nombre', 'marca', 'modelo', 'precio', 'stock', 'categoria__nombre', 'descripcion', 'actualizado')
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: devuelve la línea en vez de guardarla"""
+
+    def write(self, valor):
+        return valor
+
+
+def _filas(chunk_size):
+    # values_list evita instanciar modelos; sin ordenamiento para que el motor no ordene todo el catálogo
+    return Producto.objects.order_by().values_list(*COLUMNAS).iterator(chunk_size=chunk_size)
+
+
+def exportar_csv(chunk_size=2000):
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow([columna.replace('__nombre', '') for columna in COLUMNAS])
+    for fila in _filas(chunk_size):
+        yield escritor.writerow(fila)
+
+
+def exportar_ndjson(chunk_size=2000):
+    nombres = [columna.replace('__nombre', '') for columna in COLUMNAS]
+    for fila in _filas(chunk_size):
+        yield json.dumps(dict(zip(nombres, fila)), default=str, ensure_ascii=False) + '\n'
+
+
+def exportar(formato, chunk_size=2000):
+    if formato == 'ndjson':
+        return exportar_ndjson(chunk_size)
+    return exportar_csv(chunk_size)
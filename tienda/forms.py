@@ -1,7 +1,10 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.core.exceptions import ValidationError
-from .models import MensajeContacto, Producto
+from django.db import transaction
+from .clientes import validar_rut
+from .models import Cliente, MensajeContacto, Producto
+from .imagenes import programar_variantes
 from django.contrib.auth.models import User
 import re
 
@@ -97,10 +100,10 @@ class RegistroCompletoForm(UserCreationForm):
                   'fecha_nacimiento', 'celular', 'email', 'direccion', 'comuna', 'password1', 'password2']
 
     def clean_rut(self):
-        """Valida que el RUT tenga un formato válido."""
-        rut = self.cleaned_data.get('rut')
-        if not re.match(r'^\d{1,2}\.\d{3}\.\d{3}-[\dkK]$', rut):
-            raise ValidationError("Formato de RUT inválido. Usa el formato: 12.345.678-9")
+        """Valida formato, dígito verificador y que el RUT no esté registrado."""
+        rut = validar_rut(self.cleaned_data.get('rut'))
+        if Cliente.objects.filter(rut=rut).exists():
+            raise ValidationError("Este RUT ya está registrado.")
         return rut
 
     def clean_celular(self):
@@ -130,6 +133,27 @@ class RegistroCompletoForm(UserCreationForm):
             raise ValidationError("Debe contener al menos una mayúscula.")
         return password
 
+    def save(self, commit=True):
+        """Crea el User y su perfil Cliente en una sola transacción (dos INSERT)."""
+        user = super().save(commit=False)  # Nombre, apellido, email y contraseña ya asignados
+        cliente = Cliente(
+            rut=self.cleaned_data['rut'],
+            telefono=self.cleaned_data['celular'],
+            direccion=self.cleaned_data['direccion'],
+            comuna=self.cleaned_data['comuna'],
+            nacionalidad=self.cleaned_data['nacionalidad'],
+            sexo=self.cleaned_data['sexo'],
+            fecha_nacimiento=self.cleaned_data['fecha_nacimiento'],
+        )
+        if commit:
+            with transaction.atomic():
+                user.save()
+                cliente.usuario = user
+                cliente.save()
+        else:
+            self.cliente = cliente  # Quien guarde el User debe asignar cliente.usuario y guardarlo
+        return user
+
 
 class ContactoForm(forms.ModelForm):
     class Meta:
@@ -159,4 +183,18 @@ class ProductoForm(forms.ModelForm):
             'categoria': forms.Select(attrs={'class': 'form-control'}),
             'imagen': forms.FileInput(attrs={'class': 'form-control'}),
             'descripcion': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
-        }
\ No newline at end of file
+        }
+
+    def save(self, commit=True):
+        imagen_nueva = 'imagen' in self.changed_data
+        anteriores = []
+        if imagen_nueva:
+            # Las anteriores corresponden a la imagen reemplazada: la tarea borra sus archivos
+            anteriores = [
+                nombre for por_ancho in (self.instance.imagen_variantes or {}).values() for nombre in por_ancho.values()
+            ]
+            self.instance.imagen_variantes = {}
+        producto = super().save(commit)
+        if commit and imagen_nueva and (producto.imagen or anteriores):
+            programar_variantes(producto.pk, anteriores)  # Derivados WebP/JPEG en segundo plano
+        return producto
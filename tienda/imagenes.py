@@ -0,0 +1,101 @@
+import io
+import logging
+import posixpath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .catalogo import invalidar_catalogo
+from .models import Producto
+from .tareas import tarea
+
+logger = logging.getLogger(__name__)
+
+# Derivados de Producto.imagen: versiones redimensionadas en WebP y JPEG que se
+# guardan junto al original (productos/taladro.jpg -> productos/taladro__400w.webp)
+# y se ofrecen con srcset, para que el navegador descargue solo el ancho que necesita.
+
+ANCHOS = (160, 400, 800)
+FORMATOS = {
+    # formato: (extensión, opciones de Image.save)
+    'webp': ('webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def nombre_variante(nombre, ancho, formato):
+    base, _ = posixpath.splitext(nombre)
+    return f"{base}__{ancho}w.{FORMATOS[formato][0]}"
+
+
+def anchos_para(ancho_original):
+    """Anchos a generar sin ampliar: los de ANCHOS menores al original, más el original si es más chico que el mayor"""
+    anchos = [ancho for ancho in ANCHOS if ancho < ancho_original]
+    if ancho_original < ANCHOS[-1]:
+        anchos.append(ancho_original)
+    return anchos
+
+
+@tarea(max_intentos=3, espera=60)
+def generar_variantes(producto_id, anteriores=()):
+    """Crea los derivados de la imagen del producto y los registra en `imagen_variantes`.
+
+    `anteriores`: derivados de una imagen ya reemplazada, que se borran al terminar.
+    """
+    producto = Producto.objects.filter(pk=producto_id).only('id', 'imagen', 'imagen_variantes').first()
+    if producto is None or not producto.imagen:
+        for nombre in anteriores:  # Se quitó la imagen: solo queda limpiar
+            default_storage.delete(nombre)
+        return {}
+
+    almacen = producto.imagen.storage
+    with producto.imagen.open('rb') as archivo:
+        original = ImageOps.exif_transpose(Image.open(archivo))
+        original.load()
+
+    anteriores = set(anteriores) | {
+        nombre for por_ancho in (producto.imagen_variantes or {}).values() for nombre in por_ancho.values()
+    }
+    variantes = {formato: {} for formato in FORMATOS}
+    for ancho in anchos_para(original.width):
+        imagen = original.copy()
+        imagen.thumbnail((ancho, ancho * 10), Image.Resampling.LANCZOS)
+        for formato, (_, opciones) in FORMATOS.items():
+            nombre = nombre_variante(producto.imagen.name, ancho, formato)
+            contenido = io.BytesIO()
+            _convertir(imagen, formato).save(contenido, format=formato.upper(), **opciones)
+            if almacen.exists(nombre):
+                almacen.delete(nombre)
+            variantes[formato][str(ancho)] = almacen.save(nombre, ContentFile(contenido.getvalue()))
+
+    vigentes = {nombre for por_ancho in variantes.values() for nombre in por_ancho.values()}
+    # La imagen pudo cambiar mientras se procesaba: solo se registra si sigue siendo la misma
+    # (si cambió, los derivados leídos al comienzo también quedaron obsoletos)
+    if not Producto.objects.filter(pk=producto.pk, imagen=producto.imagen.name).update(
+        imagen_variantes=variantes, actualizado=timezone.now()
+    ):
+        for nombre in vigentes | anteriores:
+            almacen.delete(nombre)
+        return {}
+    for nombre in anteriores - vigentes:
+        almacen.delete(nombre)
+    invalidar_catalogo()  # update() no dispara señales y las fichas cacheadas traen las variantes viejas
+    return variantes
+
+
+def _convertir(imagen, formato):
+    if formato == 'jpeg' and imagen.mode != 'RGB':
+        # JPEG no admite transparencia: se compone sobre fondo blanco
+        fondo = Image.new('RGB', imagen.size, 'white')
+        fondo.paste(imagen, mask=imagen.convert('RGBA').getchannel('A'))
+        return fondo
+    if formato == 'webp' and imagen.mode not in ('RGB', 'RGBA'):
+        return imagen.convert('RGBA')
+    return imagen
+
+
+def programar_variantes(producto_id, anteriores=()):
+    """Encola la generación de derivados para el trabajador de tareas (manage.py procesar_tareas)"""
+    generar_variantes.encolar(producto_id, anteriores=list(anteriores))
@@ -0,0 +1,167 @@
+import csv
+import io
+import time
+from dataclasses import dataclass, field
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+
+from .busqueda import CAMPOS_BUSQUEDA, obtener_backend
+from .catalogo import invalidar_catalogo
+from .models import Categoria, Producto
+
+# Columnas esperadas en las listas de precios de proveedores
+COLUMNAS = ('codigo', 'nombre', 'marca', 'modelo', 'precio', 'stock', 'categoria', 'descripcion')
+
+
+@dataclass
+class ResultadoImportacion:
+    filas: int = 0
+    importadas: int = 0
+    errores: list = field(default_factory=list)  # [(número de fila, mensaje)]
+    segundos: float = 0.0
+
+    @property
+    def filas_por_segundo(self):
+        return self.filas / self.segundos if self.segundos else 0.0
+
+    def como_dict(self, max_errores=100):
+        return {
+            'filas': self.filas,
+            'importadas': self.importadas,
+            'con_error': len(self.errores),
+            'errores': [{'fila': fila, 'error': error} for fila, error in self.errores[:max_errores]],
+            'segundos': round(self.segundos, 2),
+            'filas_por_segundo': round(self.filas_por_segundo, 1),
+        }
+
+
+def leer_csv(archivo):
+    """Filas de un CSV como diccionarios; acepta un archivo binario o de texto"""
+    if isinstance(archivo, (io.BufferedIOBase, io.RawIOBase)) or 'b' in getattr(archivo, 'mode', ''):
+        archivo = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    yield from csv.DictReader(archivo)
+
+
+def leer_xlsx(archivo):
+    """Filas de una planilla XLSX en modo de solo lectura (no carga el libro completo)"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError('Para importar XLSX instala openpyxl (pip install openpyxl)')
+
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    filas = libro.active.iter_rows(values_only=True)
+    encabezado = [str(celda or '').strip().lower() for celda in next(filas, [])]
+    for fila in filas:
+        yield {nombre: ('' if valor is None else valor) for nombre, valor in zip(encabezado, fila)}
+    libro.close()
+
+
+def leer_archivo(archivo, nombre):
+    return leer_xlsx(archivo) if nombre.lower().endswith('.xlsx') else leer_csv(archivo)
+
+
+class ImportadorProductos:
+    """Upsert masivo de productos por `codigo` con bulk_create(update_conflicts=True)"""
+
+    def __init__(self, tamano_lote=1000, crear_categorias=False):
+        self.tamano_lote = tamano_lote
+        self.crear_categorias = crear_categorias
+        # Mapa en memoria nombre -> id: una sola consulta para toda la importación
+        self.categorias = {c.nombre.lower(): c.id for c in Categoria.objects.all()}
+        self.campos = {nombre: Producto._meta.get_field(nombre) for nombre in COLUMNAS if nombre != 'categoria'}
+
+    def importar(self, filas):
+        resultado = ResultadoImportacion()
+        inicio = time.perf_counter()
+        lote = {}  # codigo -> (fila, Producto, columnas con valor); el último gana si se repite en el lote
+
+        for numero, datos in enumerate(filas, start=2):  # La fila 1 es el encabezado
+            resultado.filas += 1
+            try:
+                producto, columnas = self.construir(datos)
+            except ValidationError as e:
+                resultado.errores.append((numero, '; '.join(e.messages)))
+                continue
+            lote[producto.codigo] = (numero, producto, columnas)
+            if len(lote) >= self.tamano_lote:
+                self.guardar_lote(lote, resultado)
+                lote = {}
+
+        if lote:
+            self.guardar_lote(lote, resultado)
+        if resultado.importadas:
+            invalidar_catalogo()  # bulk_create no dispara las señales de Producto
+
+        resultado.segundos = time.perf_counter() - inicio
+        return resultado
+
+    def construir(self, datos):
+        """Valida una fila con las mismas reglas del modelo (regex de código, precio >= 0, etc.).
+
+        Devuelve (Producto, columnas con valor): una celda vacía o una columna ausente
+        toma el valor por defecto al crear, pero no se sobrescribe en un producto existente.
+        """
+        datos = {k.strip().lower(): v for k, v in datos.items() if k}
+        valores = {}
+        columnas = {'categoria'}  # Obligatoria: si falta, la fila no es válida
+        errores = []
+        for nombre, campo in self.campos.items():
+            valor = datos.get(nombre, '')
+            valor = valor.strip() if isinstance(valor, str) else valor
+            if valor is None or valor == '':
+                if campo.has_default():
+                    valor = campo.get_default()
+            else:
+                columnas.add(nombre)
+            if nombre == 'codigo' and isinstance(valor, str):
+                valor = valor.upper()
+            try:
+                valores[nombre] = campo.clean(valor, None)
+            except ValidationError as e:
+                errores.append(f'{nombre}: {" ".join(e.messages)}')
+
+        valores['categoria_id'] = self.resolver_categoria(str(datos.get('categoria', '')).strip(), errores)
+        if errores:
+            raise ValidationError(errores)
+        return Producto(**valores), frozenset(columnas)
+
+    def resolver_categoria(self, nombre, errores):
+        if not nombre:
+            errores.append('categoria: campo obligatorio')
+            return None
+        categoria_id = self.categorias.get(nombre.lower())
+        if categoria_id is None:
+            if not self.crear_categorias:
+                errores.append(f'categoria: "{nombre}" no existe')
+                return None
+            categoria_id = Categoria.objects.get_or_create(nombre=nombre)[0].id
+            self.categorias[nombre.lower()] = categoria_id
+        return categoria_id
+
+    def guardar_lote(self, lote, resultado):
+        # Un bulk_create por combinación de columnas con valor: el upsert solo actualiza
+        # lo que trae el archivo (una lista de precios no pisa el stock ni la descripción)
+        grupos = {}
+        for _, producto, columnas in lote.values():
+            grupos.setdefault(columnas, []).append(producto)
+        guardados = []
+        try:
+            with transaction.atomic():
+                for columnas, productos in grupos.items():
+                    guardados += Producto.objects.bulk_create(
+                        productos,
+                        update_conflicts=True,
+                        unique_fields=['codigo'],
+                        update_fields=sorted(columnas - {'codigo'}) + ['actualizado'],
+                    )
+        except DatabaseError as e:
+            # Un lote fallido no detiene la importación: se informa en cada una de sus filas
+            resultado.errores.extend((numero, f'error al guardar el lote: {e}') for numero, _, _ in lote.values())
+            return
+        resultado.importadas += len(guardados)
+        # Se indexa lo que quedó en la base: las columnas ausentes del archivo conservan
+        # su valor anterior, que los objetos en memoria no tienen
+        ids = [p.pk for p in guardados if p.pk]
+        obtener_backend().indexar_lote(list(Producto.objects.filter(pk__in=ids).only(*CAMPOS_BUSQUEDA)))
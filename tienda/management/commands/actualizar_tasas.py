@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tienda.divisas import TasaNoDisponible, obtener_servicio
+
+
+class Command(BaseCommand):
+    help = 'Consulta el tipo de cambio y lo deja en el cache compartido (ejecutar periódicamente, p. ej. con cron)'
+
+    def handle(self, *args, **options):
+        try:
+            datos = obtener_servicio().actualizar()
+        except TasaNoDisponible as e:
+            raise CommandError(f'No se pudo obtener el tipo de cambio: {e}')
+        for moneda, tasa in sorted(datos['tasas'].items()):
+            self.stdout.write(f'1 {moneda} = {tasa} CLP')
+        self.stdout.write(self.style.SUCCESS('Tipos de cambio actualizados'))
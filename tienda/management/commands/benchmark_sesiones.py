@@ -0,0 +1,71 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from tienda.models import Categoria, Producto
+
+# Configuración anterior: sesiones en la base de datos reescritas en cada request
+ANTES = {
+    'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+    'SESSION_SAVE_EVERY_REQUEST': True,
+    'MIDDLEWARE': [m for m in settings.MIDDLEWARE if m != 'tienda.middleware.RenovacionSesionMiddleware'],
+}
+
+
+class Command(BaseCommand):
+    help = 'Cuenta las escrituras en la base de datos por cada 1000 páginas vistas, antes y después del cambio de sesiones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vistas', type=int, default=1000)
+        parser.add_argument('--vistas-por-visitante', type=int, default=20)
+        parser.add_argument(
+            '--con-carrito', type=float, default=0.2,
+            help='Fracción de visitantes que agrega un producto al carrito (por defecto 0.2)'
+        )
+
+    def handle(self, *args, **options):
+        for nombre, cambios in (('antes', ANTES), ('después', {})):
+            # Todo se revierte al final: el benchmark no deja sesiones ni carritos en la base
+            with transaction.atomic(), override_settings(**cambios):
+                escrituras, sesion = self.medir(options)
+                transaction.set_rollback(True)
+            por_mil = 1000 / options['vistas']
+            self.stdout.write(
+                f"{nombre:>8}: {escrituras * por_mil:7.1f} escrituras / 1000 vistas "
+                f"({sesion * por_mil:.1f} en django_session)"
+            )
+
+    def medir(self, options):
+        producto = Producto.objects.first() or Producto.objects.create(
+            codigo='BENCH-1', nombre='Producto de prueba', marca='Marca', modelo='M1',
+            precio=Decimal('1000'), stock=100,
+            categoria=Categoria.objects.get_or_create(nombre='Benchmark')[0],
+        )
+        paginas = [reverse('inicio'), reverse('productos'), reverse('productos') + '?orden=precio_asc', reverse('ver_carrito')]
+        por_visitante = max(options['vistas_por_visitante'], 1)
+        cada_cuantos_compran = round(1 / options['con_carrito']) if options['con_carrito'] > 0 else None
+
+        escrituras = sesion = 0
+        vistas = 0
+        visitante = 0
+        while vistas < options['vistas']:
+            cliente = Client(HTTP_HOST='localhost')
+            compra = cada_cuantos_compran and visitante % cada_cuantos_compran == 0
+            with CaptureQueriesContext(connection) as consultas:
+                for i in range(min(por_visitante, options['vistas'] - vistas)):
+                    if compra and i == 1:
+                        cliente.post(reverse('agregar_carrito', args=[producto.id]))
+                    cliente.get(paginas[i % len(paginas)])
+                    vistas += 1
+            for consulta in consultas:
+                sql = consulta['sql'].lstrip().upper()
+                if sql.startswith(('INSERT', 'UPDATE', 'DELETE')):
+                    escrituras += 1
+                    sesion += 'DJANGO_SESSION' in sql
+            visitante += 1
+        return escrituras, sesion
@@ -0,0 +1,276 @@
+import json
+import platform
+import re
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from tienda.models import Categoria, Producto
+from tienda.rendimiento import percentil
+from tienda.sinteticos import sembrar_carrito, sembrar_catalogo
+
+CONSULTAS = re.compile(r'desc="(\d+) consultas"')
+
+# Ajustes de producción para medir: sin DEBUG (no guarda cada consulta en memoria)
+# y sin el detector de N+1, que extrae la pila de las consultas nuevas
+AJUSTES = {
+    'DEBUG': False,
+    'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver'],
+    'MIDDLEWARE': [m for m in settings.MIDDLEWARE if m != 'tienda.middleware.ConsultasRepetidasMiddleware'],
+    'RENDIMIENTO_SERVER_TIMING': True,  # El conteo de consultas se lee de este encabezado
+}
+
+
+class ManejadorSilencioso(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark de la tienda y la API sobre un catálogo sintético en una base aparte: '
+        'mide requests/s, latencia p50/p95/p99 y consultas por request, en proceso (Client) '
+        'y contra un servidor WSGI local con clientes concurrentes. Guarda el resultado en JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=1000, help='Tamaño del catálogo (p. ej. 1000, 10000, 100000)')
+        parser.add_argument('--categorias', type=int, default=100)
+        parser.add_argument('--carritos', default='1,10,50', help='Tamaños de carrito a medir, separados por coma')
+        parser.add_argument('--requests', type=int, default=200, help='Requests medidos por endpoint')
+        parser.add_argument('--calentamiento', type=int, default=10, help='Requests previos no medidos por endpoint')
+        parser.add_argument('--modo', choices=['proceso', 'servidor', 'ambos'], default='ambos')
+        parser.add_argument('--concurrencia', type=int, default=8, help='Clientes simultáneos contra el servidor')
+        parser.add_argument('--sin-cache', action='store_true', help='Usa DummyCache: mide el camino sin fragmentos cacheados')
+        parser.add_argument('--semilla', type=int, default=1)
+        parser.add_argument('--salida', help='Archivo JSON de resultados (por defecto benchmarks/<fecha>-<productos>.json)')
+        parser.add_argument('--comparar', help='JSON de una corrida anterior con el que comparar')
+        parser.add_argument('--tolerancia', type=float, default=0.2, help='Aumento de p95 tolerado al comparar (0.2 = 20 %%)')
+        parser.add_argument('--estricto', action='store_true', help='Termina con error si la comparación encuentra regresiones')
+        parser.add_argument('--reutilizar-bd', action='store_true', help='Conserva la base del benchmark entre corridas')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        anterior = self.leer(options['comparar']) if options['comparar'] else None
+        carritos = [int(tamano) for tamano in options['carritos'].split(',') if tamano.strip()]
+
+        # Base dedicada, creada con las migraciones igual que la de los tests
+        nombre_original = connection.settings_dict['NAME']
+        connection.settings_dict['TEST'] = {
+            **connection.settings_dict.get('TEST', {}),
+            'NAME': str(Path(settings.BASE_DIR) / 'benchmark_db.sqlite3') if connection.vendor == 'sqlite'
+            else f'benchmark_{nombre_original}',
+        }
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options['reutilizar_bd'], serialize=False
+        )
+        try:
+            self.preparar(options)
+            ajustes = dict(AJUSTES)
+            if options['sin_cache']:
+                ajustes['CACHES'] = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+            with override_settings(**ajustes):
+                endpoints = self.endpoints(carritos, options['semilla'])
+                resultados = {}
+                if options['modo'] in ('proceso', 'ambos'):
+                    resultados['proceso'] = {
+                        nombre: self.en_proceso(url, sesion, options) for nombre, url, sesion in endpoints
+                    }
+                if options['modo'] in ('servidor', 'ambos'):
+                    resultados['servidor'] = self.en_servidor(endpoints, options)
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0, keepdb=options['reutilizar_bd'])
+
+        informe = {'meta': self.meta(options, carritos), 'resultados': resultados}
+        salida = Path(options['salida'] or Path(settings.BASE_DIR) / 'benchmarks' / (
+            f"{timezone.now():%Y%m%d-%H%M%S}-{options['productos']}.json"
+        ))
+        salida.parent.mkdir(parents=True, exist_ok=True)
+        # Claves ordenadas y una por línea: dos corridas se pueden comparar con diff
+        salida.write_text(json.dumps(informe, indent=2, sort_keys=True, ensure_ascii=False) + '\n')
+
+        self.mostrar(resultados)
+        self.stdout.write(self.style.SUCCESS(f'Resultados guardados en {salida}'))
+        if anterior is not None:
+            regresiones = self.comparar(anterior['resultados'], resultados, options['tolerancia'])
+            if regresiones and options['estricto']:
+                raise CommandError(f'{regresiones} regresiones respecto de {options["comparar"]}')
+
+    def leer(self, ruta):
+        try:
+            return json.loads(Path(ruta).read_text())
+        except (OSError, ValueError) as e:
+            raise CommandError(f'No se pudo leer {ruta}: {e}')
+
+    def preparar(self, options):
+        if Producto.objects.count() == options['productos'] and Categoria.objects.exists():
+            return  # Base reutilizada con el mismo tamaño
+        Producto.objects.all().delete()
+        Categoria.objects.all().delete()
+        inicio = time.perf_counter()
+        sembrar_catalogo(options['productos'], options['categorias'], semilla=options['semilla'])
+        self.stdout.write(f"Catálogo sintético: {options['productos']} productos en {time.perf_counter() - inicio:.1f}s")
+
+    def endpoints(self, carritos, semilla):
+        """[(nombre, url, session_key o None)]"""
+        producto = Producto.objects.order_by('id').first()
+        categoria = Categoria.objects.order_by('id').first()
+        producto_ids = list(Producto.objects.filter(stock__gt=0).values_list('id', flat=True)[:max(carritos, default=0) * 4])
+        paginas = max(Producto.objects.count() // settings.REST_FRAMEWORK.get('PAGE_SIZE', 10), 1)
+        endpoints = [
+            ('inicio', reverse('inicio'), None),
+            ('productos', reverse('productos'), None),
+            ('productos?orden=precio_asc', reverse('productos') + '?orden=precio_asc', None),
+            ('productos?categoria', reverse('productos') + f'?categoria={categoria.id}', None),
+            ('productos?q', reverse('productos') + '?q=taladro', None),
+            ('api_productos', reverse('api_productos'), None),
+            ('api_productos?page=ultima', reverse('api_productos') + f'?page={paginas}', None),
+            ('api_producto_detalle', reverse('api_producto_detalle', args=[producto.id]), None),
+            ('api_productos_buscar', reverse('api_productos_buscar') + '?q=taladro', None),
+            ('api_categorias', reverse('api_categorias'), None),
+        ]
+        for tamano in carritos:
+            sesion = sembrar_carrito(tamano, producto_ids, semilla=semilla + tamano)
+            endpoints.append((f'ver_carrito[{tamano}]', reverse('ver_carrito'), sesion))
+        return endpoints
+
+    def en_proceso(self, url, sesion, options):
+        client = Client()
+        if sesion:
+            client.cookies[settings.SESSION_COOKIE_NAME] = sesion
+        for _ in range(options['calentamiento']):
+            client.get(url)
+
+        muestras = []
+        inicio = time.perf_counter()
+        for _ in range(options['requests']):
+            t = time.perf_counter()
+            response = client.get(url)
+            muestras.append((time.perf_counter() - t, response.status_code, response.get('Server-Timing', '')))
+        return self.resumir(muestras, time.perf_counter() - inicio)
+
+    def en_servidor(self, endpoints, options):
+        servidor = ThreadedWSGIServer(('127.0.0.1', 0), ManejadorSilencioso, allow_reuse_address=True)
+        servidor.set_app(get_internal_wsgi_application())
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        base = f'http://127.0.0.1:{servidor.server_port}'
+        try:
+            resultados = {}
+            with ThreadPoolExecutor(options['concurrencia']) as clientes:
+                for nombre, url, sesion in endpoints:
+                    cabeceras = {'Cookie': f'{settings.SESSION_COOKIE_NAME}={sesion}'} if sesion else {}
+
+                    def pedir(_):
+                        t = time.perf_counter()
+                        try:
+                            with urllib.request.urlopen(urllib.request.Request(base + url, headers=cabeceras), timeout=30) as r:
+                                r.read()
+                                return time.perf_counter() - t, r.status, r.headers.get('Server-Timing', '')
+                        except urllib.error.HTTPError as e:
+                            return time.perf_counter() - t, e.code, ''
+                        except OSError:
+                            return time.perf_counter() - t, 0, ''
+
+                    list(clientes.map(pedir, range(options['calentamiento'])))
+                    inicio = time.perf_counter()
+                    muestras = list(clientes.map(pedir, range(options['requests'])))
+                    resultados[nombre] = self.resumir(muestras, time.perf_counter() - inicio)
+        finally:
+            servidor.shutdown()
+            servidor.server_close()
+        return resultados
+
+    def resumir(self, muestras, duracion):
+        latencias = sorted(latencia * 1000 for latencia, _, _ in muestras)
+        consultas = [int(m.group(1)) for _, _, timing in muestras if (m := CONSULTAS.search(timing))]
+        return {
+            'requests': len(muestras),
+            'errores': sum(1 for _, estado, _ in muestras if not 200 <= estado < 400),
+            'rps': round(len(muestras) / duracion, 1) if duracion else 0,
+            'latencia_ms': {
+                'p50': round(percentil(latencias, 0.5), 3),
+                'p95': round(percentil(latencias, 0.95), 3),
+                'p99': round(percentil(latencias, 0.99), 3),
+                'media': round(sum(latencias) / len(latencias), 3) if latencias else 0,
+                'max': round(latencias[-1], 3) if latencias else 0,
+            },
+            'consultas': {
+                'media': round(sum(consultas) / len(consultas), 2) if consultas else None,
+                'max': max(consultas, default=None),
+            },
+        }
+
+    def meta(self, options, carritos):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, timeout=10,
+            ).stdout.strip()
+        except OSError:
+            commit = ''
+        return {
+            'fecha': timezone.now().isoformat(timespec='seconds'),
+            'commit': commit,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'base_de_datos': connection.vendor,
+            'productos': options['productos'],
+            'categorias': options['categorias'],
+            'carritos': carritos,
+            'semilla': options['semilla'],
+            'requests': options['requests'],
+            'concurrencia': options['concurrencia'],
+            'cache': not options['sin_cache'],
+        }
+
+    def mostrar(self, resultados):
+        for modo, por_endpoint in resultados.items():
+            self.stdout.write(f'\n[{modo}]')
+            self.stdout.write(f"{'endpoint':<30} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'consultas':>9} {'err':>4}")
+            for nombre, r in por_endpoint.items():
+                consultas = r['consultas']['media']
+                self.stdout.write(
+                    f"{nombre:<30} {r['rps']:>8.1f} {r['latencia_ms']['p50']:>8.2f} {r['latencia_ms']['p95']:>8.2f} "
+                    f"{r['latencia_ms']['p99']:>8.2f} {consultas if consultas is not None else '-':>9} {r['errores']:>4}"
+                )
+
+    def comparar(self, anterior, actual, tolerancia):
+        """Muestra las diferencias por endpoint y devuelve cuántas son regresiones"""
+        regresiones = 0
+        self.stdout.write(f'\nComparación (tolerancia p95 {tolerancia:.0%}):')
+        for modo, por_endpoint in actual.items():
+            for nombre, r in por_endpoint.items():
+                previo = anterior.get(modo, {}).get(nombre)
+                if previo is None:
+                    continue
+                p95, p95_previo = r['latencia_ms']['p95'], previo['latencia_ms']['p95']
+                consultas, consultas_previas = r['consultas']['media'], previo['consultas']['media']
+                problemas = []
+                if p95_previo and p95 > p95_previo * (1 + tolerancia):
+                    problemas.append(f'p95 {p95_previo:.2f} -> {p95:.2f} ms')
+                if consultas is not None and consultas_previas is not None and consultas > consultas_previas:
+                    problemas.append(f'consultas {consultas_previas} -> {consultas}')
+                if r['errores'] > previo['errores']:
+                    problemas.append(f"errores {previo['errores']} -> {r['errores']}")
+                cambio = (p95 - p95_previo) / p95_previo if p95_previo else 0
+                if problemas:
+                    regresiones += 1
+                    self.stdout.write(self.style.ERROR(f'  {modo}/{nombre}: ' + ', '.join(problemas)))
+                elif self.verbosity >= 2 or cambio < -tolerancia:
+                    self.stdout.write(f'  {modo}/{nombre}: p95 {p95_previo:.2f} -> {p95:.2f} ms ({cambio:+.0%})')
+        if not regresiones:
+            self.stdout.write(self.style.SUCCESS('  Sin regresiones'))
+        return regresiones
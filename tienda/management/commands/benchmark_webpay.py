@@ -0,0 +1,44 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from tienda.pasarela import PasarelaFalsa
+
+
+class Command(BaseCommand):
+    help = 'Mide latencia y concurrencia del flujo de pago contra la pasarela falsa (sin red)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pagos', type=int, default=100)
+        parser.add_argument('--latencia', type=float, default=0.2, help='Latencia simulada de Transbank (s)')
+        parser.add_argument('--workers', type=int, default=4, help='Workers síncronos (como un servidor WSGI)')
+
+    def handle(self, *args, **options):
+        pasarela = PasarelaFalsa(latencia=options['latencia'])
+        pagos = options['pagos']
+
+        def pagar(i):
+            respuesta = pasarela.crear(f'ORD-B{i}', f'S{i}', 1000, 'http://localhost/webpay/confirmacion/')
+            pasarela.confirmar(respuesta['token'])
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(options['workers']) as workers:
+            list(workers.map(pagar, range(pagos)))
+        sincrono = time.perf_counter() - inicio
+
+        async def pagar_async(i):
+            respuesta = await pasarela.crear_async(f'ORD-A{i}', f'S{i}', 1000, 'http://localhost/webpay/confirmacion/')
+            await pasarela.confirmar_async(respuesta['token'])
+
+        async def todos():
+            await asyncio.gather(*(pagar_async(i) for i in range(pagos)))
+
+        inicio = time.perf_counter()
+        asyncio.run(todos())
+        asincrono = time.perf_counter() - inicio
+
+        self.stdout.write(f"{pagos} pagos, latencia simulada {options['latencia']}s por llamada")
+        self.stdout.write(f"  {options['workers']} workers síncronos: {sincrono:.2f}s ({pagos / sincrono:.1f} pagos/s)")
+        self.stdout.write(f"  async (un event loop):  {asincrono:.2f}s ({pagos / asincrono:.1f} pagos/s)")
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from tienda.tareas import metricas
+
+
+class Command(BaseCommand):
+    help = 'Muestra cuántas tareas hay por estado y cuánto tardan, agrupadas por función'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horas', type=int, default=24, help='Considera las tareas creadas en las últimas N horas')
+
+    def handle(self, *args, **options):
+        filas = metricas(timezone.now() - timedelta(hours=options['horas']))
+        if not filas:
+            self.stdout.write('Sin tareas en el período')
+            return
+        self.stdout.write(f"{'tarea':<45} {'pend':>6} {'curso':>6} {'ok':>6} {'fallo':>6} {'media ms':>9} {'máx ms':>9}")
+        for fila in filas:
+            media = f"{fila['duracion_media'] * 1000:.0f}" if fila['duracion_media'] is not None else '-'
+            maxima = f"{fila['duracion_maxima'] * 1000:.0f}" if fila['duracion_maxima'] is not None else '-'
+            self.stdout.write(
+                f"{fila['nombre']:<45} {fila['pendientes']:>6} {fila['en_curso']:>6} "
+                f"{fila['completadas']:>6} {fila['fallidas']:>6} {media:>9} {maxima:>9}"
+            )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from tienda.exportacion import FORMATOS, exportar
+
+
+class Command(BaseCommand):
+    help = 'Exporta el catálogo completo en CSV o NDJSON sin cargarlo en memoria'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--formato', choices=sorted(FORMATOS), default='csv')
+        parser.add_argument('--salida', help='Archivo de destino (por defecto, salida estándar)')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        filas = exportar(options['formato'], options['chunk_size'])
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8', newline='') as archivo:
+                archivo.writelines(filas)
+        else:
+            for fila in filas:
+                self.stdout.write(fila, ending='')
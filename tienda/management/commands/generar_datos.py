@@ -0,0 +1,72 @@
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from tienda.models import Pedido, Producto
+from tienda.sinteticos import (
+    sembrar_catalogo, sembrar_clientes, sembrar_mensajes, sembrar_pedidos, siguiente_indice,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Llena la base con datos sintéticos reproducibles (categorías, productos, clientes, '
+        'mensajes de contacto y pedidos) usando bulk_create por lotes. Se puede ejecutar '
+        'varias veces: cada corrida agrega filas nuevas a continuación de las anteriores.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=10000)
+        parser.add_argument('--categorias', type=int, default=60)
+        parser.add_argument('--clientes', type=int, default=10000)
+        parser.add_argument('--mensajes', type=int, default=5000)
+        parser.add_argument('--pedidos', type=int, default=0)
+        parser.add_argument('--semilla', type=int, default=1, help='Misma semilla, mismos datos')
+        parser.add_argument('--lote', type=int, default=2000, help='Filas por bulk_create')
+        parser.add_argument(
+            '--password', default='ferremas123',
+            help='Contraseña de todos los clientes generados (se hashea una sola vez)'
+        )
+
+    def handle(self, *args, **options):
+        lote = max(options['lote'], 1)
+        semilla = options['semilla']
+        total = time.perf_counter()
+
+        if options['productos'] or options['categorias']:
+            with self.medir('productos', options['productos']):
+                sembrar_catalogo(
+                    options['productos'], options['categorias'], semilla=semilla, lote=lote,
+                    desde=siguiente_indice(Producto.objects.all(), 'codigo', 'SIN-', 7),
+                )
+
+        usuario_ids = []
+        if options['clientes']:
+            with self.medir('clientes (User + Cliente)', options['clientes'] * 2):
+                usuario_ids = sembrar_clientes(
+                    options['clientes'], semilla=semilla, lote=lote, password=options['password'],
+                    desde=siguiente_indice(User.objects.all(), 'username', 'cliente', 7),
+                )
+
+        if options['mensajes']:
+            with self.medir('mensajes de contacto', options['mensajes']):
+                sembrar_mensajes(options['mensajes'], semilla=semilla, lote=lote)
+
+        if options['pedidos']:
+            usuario_ids = usuario_ids or list(User.objects.filter(cliente__isnull=False).values_list('id', flat=True))
+            with self.medir('pedidos', options['pedidos']):
+                sembrar_pedidos(
+                    options['pedidos'], usuario_ids, semilla=semilla, lote=lote,
+                    desde=siguiente_indice(Pedido.objects.all(), 'buy_order', 'SIN-', 9),
+                )
+
+        self.stdout.write(self.style.SUCCESS(f'Listo en {time.perf_counter() - total:.1f}s'))
+
+    @contextmanager
+    def medir(self, nombre, filas):
+        inicio = time.perf_counter()
+        yield
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(f'{nombre}: {filas} filas en {duracion:.1f}s ({filas / duracion:,.0f} filas/s)')
@@ -0,0 +1,42 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from tienda.imagenes import generar_variantes
+from tienda.models import Producto
+
+
+class Command(BaseCommand):
+    help = 'Genera los derivados WebP/JPEG de las imágenes de productos que aún no los tienen'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todas', action='store_true', help='Regenera también las que ya tienen derivados')
+        parser.add_argument('--workers', type=int, default=4, help='Imágenes procesadas en paralelo (Pillow libera el GIL)')
+
+    def handle(self, *args, **options):
+        productos = Producto.objects.exclude(imagen='').exclude(imagen__isnull=True)
+        if not options['todas']:
+            productos = productos.filter(imagen_variantes={})
+        ids = list(productos.values_list('id', flat=True))
+
+        def procesar(producto_id):
+            try:
+                generar_variantes(producto_id)
+                return None
+            except Exception as e:
+                return f'{producto_id}: {e}'
+            finally:
+                connection.close()
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max(options['workers'], 1)) as workers:
+            errores = [error for error in workers.map(procesar, ids) if error]
+        segundos = time.perf_counter() - inicio
+
+        for error in errores:
+            self.stderr.write(f'Producto {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(ids) - len(errores)} de {len(ids)} imágenes procesadas en {segundos:.1f}s'
+        ))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tienda.importacion import ImportadorProductos, leer_archivo
+
+
+class Command(BaseCommand):
+    help = 'Importa (upsert por código) una lista de precios CSV o XLSX de proveedor'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo .csv o .xlsx')
+        parser.add_argument('--lote', type=int, default=1000, help='Filas por bulk_create')
+        parser.add_argument('--crear-categorias', action='store_true',
+                            help='Crea las categorías que no existan en vez de rechazar la fila')
+        parser.add_argument('--max-errores', type=int, default=50, help='Errores a mostrar')
+
+    def handle(self, *args, **options):
+        importador = ImportadorProductos(options['lote'], options['crear_categorias'])
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                resultado = importador.importar(leer_archivo(archivo, options['archivo']))
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for fila, error in resultado.errores[:options['max_errores']]:
+            self.stderr.write(f'Fila {fila}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado.importadas}/{resultado.filas} filas importadas, {len(resultado.errores)} con error "
+            f"en {resultado.segundos:.1f}s ({resultado.filas_por_segundo:.0f} filas/s)"
+        ))
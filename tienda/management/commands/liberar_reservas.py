@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from tienda.stock import liberar_reservas_expiradas
+
+
+class Command(BaseCommand):
+    help = 'Devuelve al stock las reservas de pago vencidas (ejecutar periódicamente, p. ej. con cron)'
+
+    def handle(self, *args, **options):
+        liberadas = liberar_reservas_expiradas()
+        self.stdout.write(self.style.SUCCESS(f'{liberadas} reservas liberadas'))
@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from tienda.models import LineaCarrito
+
+
+class Command(BaseCommand):
+    help = 'Elimina los carritos de visitantes anónimos sin cambios recientes (ejecutar periódicamente, p. ej. con cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=30, help='Antigüedad mínima en días (por defecto 30)')
+
+    def handle(self, *args, **options):
+        limite = timezone.now() - timedelta(days=options['dias'])
+        eliminadas, _ = LineaCarrito.objects.filter(
+            clave__startswith='visitante:', actualizado__lt=limite
+        ).delete()
+        self.stdout.write(self.style.SUCCESS(f'{eliminadas} líneas de carrito eliminadas'))
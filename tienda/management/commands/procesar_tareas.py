@@ -0,0 +1,102 @@
+import logging
+import multiprocessing
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from tienda.tareas import ejecutar, identificador_trabajador, purgar, reclamar
+
+logger = logging.getLogger(__name__)
+
+
+def _ejecutar(tarea_id):
+    try:
+        return ejecutar(tarea_id)
+    finally:
+        connection.close()  # Cada hilo o proceso usa su propia conexión
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta las tareas en segundo plano encoladas en la base de datos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrencia', type=int, default=4, help='Tareas ejecutadas en paralelo')
+        parser.add_argument(
+            '--procesos', action='store_true',
+            help='Usa un pool de procesos (tareas de CPU, p. ej. imágenes) en vez de hilos'
+        )
+        parser.add_argument('--intervalo', type=float, default=1.0, help='Segundos de espera cuando no hay tareas')
+        parser.add_argument('--una-vez', action='store_true', help='Procesa las tareas listas y termina (cron, tests)')
+
+    def handle(self, *args, **options):
+        self.detener = False
+        if not options['una_vez']:
+            signal.signal(signal.SIGTERM, self.pedir_detencion)
+
+        concurrencia = max(options['concurrencia'], 1)
+        trabajador = identificador_trabajador()
+        if options['procesos']:
+            # 'spawn': procesos limpios que no heredan las conexiones abiertas del padre
+            pool = ProcessPoolExecutor(concurrencia, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup)
+        else:
+            pool = ThreadPoolExecutor(concurrencia, thread_name_prefix='tarea')
+
+        retencion = getattr(settings, 'TAREAS_RETENCION_DIAS', 7)
+        proxima_purga = 0
+        en_curso = {}  # futuro -> id de la tarea
+        self.stdout.write(f"Trabajador {trabajador}: {concurrencia} {'procesos' if options['procesos'] else 'hilos'}")
+        try:
+            while not self.detener:
+                if time.monotonic() >= proxima_purga:
+                    purgar(retencion)
+                    proxima_purga = time.monotonic() + 3600
+
+                libres = concurrencia - len(en_curso)
+                if libres:
+                    for tarea_id in reclamar(libres, trabajador):
+                        en_curso[pool.submit(_ejecutar, tarea_id)] = tarea_id
+
+                if not en_curso:
+                    if options['una_vez']:
+                        break
+                    time.sleep(options['intervalo'])
+                    continue
+
+                terminadas, _ = wait(en_curso, timeout=options['intervalo'], return_when=FIRST_COMPLETED)
+                for futuro in terminadas:
+                    self.recoger(futuro, en_curso.pop(futuro), options['verbosity'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            # Las tareas ya iniciadas terminan; las no reclamadas quedan para el próximo trabajador
+            for futuro in wait(en_curso).done:
+                self.recoger(futuro, en_curso[futuro], options['verbosity'])
+            pool.shutdown()
+
+    def pedir_detencion(self, *args):
+        self.stdout.write('Deteniendo: se terminan las tareas en curso...')
+        self.detener = True
+
+    def recoger(self, futuro, tarea_id, verbosidad):
+        # Un error fuera de lo que ejecutar() registra (base de datos caída, proceso muerto)
+        # se informa y el trabajador sigue con las demás tareas; el bloqueo vencerá y se reintentará
+        try:
+            tarea = futuro.result()
+        except Exception:
+            logger.exception('Error inesperado al ejecutar la tarea #%s', tarea_id)
+            self.stderr.write(f'✘ Tarea #{tarea_id}: error inesperado, se reintentará al vencer su bloqueo')
+        else:
+            self.informar(tarea, verbosidad)
+
+    def informar(self, tarea, verbosidad):
+        if tarea.estado == tarea.COMPLETADA:
+            if verbosidad >= 2:
+                self.stdout.write(f'✔ {tarea.nombre} #{tarea.pk} en {tarea.duracion * 1000:.0f} ms')
+        else:
+            self.stderr.write(f'✘ {tarea.nombre} #{tarea.pk} ({tarea.estado}, intento {tarea.intentos}): '
+                              f'{tarea.ultimo_error.strip().splitlines()[-1]}')
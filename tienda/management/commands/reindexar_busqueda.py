@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from tienda.busqueda import obtener_backend
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda de productos (p. ej. tras cargas con bulk_create)'
+
+    def handle(self, *args, **options):
+        backend = obtener_backend()
+        backend.reconstruir()
+        self.stdout.write(self.style.SUCCESS(f'Índice reconstruido con {type(backend).__name__}'))
@@ -0,0 +1,171 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from .consultas import DetectorConsultas
+from .rendimiento import Medicion, medicion_actual, obtener_registro
+
+logger = logging.getLogger(__name__)
+
+# Los middlewares admiten sync y async, como los de Django: bajo ASGI con vistas
+# async no obligan a pasar cada request por un hilo (sync_to_async). Las
+# conexiones a la base son locales a cada hilo, así que los execute_wrapper se
+# instalan en el hilo donde sync_to_async ejecuta el ORM de ese request.
+
+
+class MiddlewareAsincrono:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+
+class RenovacionSesionMiddleware(MiddlewareAsincrono):
+    """Extiende la expiración de la sesión solo cuando le queda poco tiempo.
+
+    Reemplaza a SESSION_SAVE_EVERY_REQUEST, que reescribía la sesión en cada
+    request: un cliente activo ahora causa una escritura cada
+    SESSION_COOKIE_AGE - SESSION_RENOVAR_UMBRAL segundos, no una por página.
+    Debe ir después de SessionMiddleware.
+    """
+
+    CLAVE = '_renovada'
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.umbral = getattr(settings, 'SESSION_RENOVAR_UMBRAL', settings.SESSION_COOKIE_AGE // 2)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.renovar(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.renovar(request, await self.get_response(request))
+
+    def renovar(self, request, response):
+        sesion = getattr(request, 'session', None)
+        # Una sesión que el request no leyó no se carga solo para esto
+        if sesion is None or not sesion.accessed or sesion.is_empty():
+            return response
+
+        ahora = int(time.time())
+        if sesion.modified:
+            sesion[self.CLAVE] = ahora  # Ya se va a guardar: la marca no cuesta otra escritura
+        elif sesion.get(self.CLAVE, 0) + sesion.get_expiry_age() - ahora < self.umbral:
+            sesion[self.CLAVE] = ahora  # Marca la sesión como modificada: se guarda con la nueva expiración
+        return response
+
+
+class RendimientoMiddleware(MiddlewareAsincrono):
+    """Mide cada request y lo agrega al histograma de su vista.
+
+    Registra tiempo total, consultas y tiempo en la base, render de plantillas y
+    tamaño de la respuesta; los devuelve en el encabezado Server-Timing y avisa en
+    el log cuando un request supera el presupuesto de consultas. Debe ir primero
+    en MIDDLEWARE para incluir el trabajo de los demás middlewares.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.presupuesto = getattr(settings, 'RENDIMIENTO_PRESUPUESTO_CONSULTAS', 30)
+        self.presupuestos = getattr(settings, 'RENDIMIENTO_PRESUPUESTOS', {})
+        self.server_timing = getattr(settings, 'RENDIMIENTO_SERVER_TIMING', True)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        medicion, inicio = Medicion(), time.perf_counter()
+        token = medicion_actual.set(medicion)
+        try:
+            with self.envolver_conexiones(medicion):
+                response = self.get_response(request)
+        finally:
+            medicion_actual.reset(token)
+        return self.registrar(request, response, medicion, time.perf_counter() - inicio)
+
+    async def __acall__(self, request):
+        medicion, inicio = Medicion(), time.perf_counter()
+        token = medicion_actual.set(medicion)  # La ContextVar sí pasa a sync_to_async
+        pila = await sync_to_async(self.envolver_conexiones)(medicion)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(pila.close)()
+            medicion_actual.reset(token)
+        return self.registrar(request, response, medicion, time.perf_counter() - inicio)
+
+    def envolver_conexiones(self, medicion):
+        """Cronometra las consultas de las conexiones del hilo actual hasta cerrar la pila devuelta"""
+        pila = ExitStack()
+        for conexion in connections.all():
+            pila.enter_context(conexion.execute_wrapper(medicion))
+        return pila
+
+    def registrar(self, request, response, medicion, duracion):
+        match = getattr(request, 'resolver_match', None)
+        vista = match.view_name if match else 'sin_ruta'
+        if response.streaming:
+            tamano = int(response.get('Content-Length', 0))
+        else:
+            tamano = len(response.content)
+        obtener_registro().registrar(vista, {
+            'duracion': duracion,
+            'consultas': medicion.consultas,
+            'tiempo_bd': medicion.tiempo_bd,
+            'tiempo_plantillas': medicion.tiempo_plantillas,
+            'bytes': tamano,
+        })
+
+        presupuesto = self.presupuestos.get(vista, self.presupuesto)
+        if medicion.consultas > presupuesto:
+            logger.warning(
+                'Presupuesto de consultas excedido en %s (%s %s): %s consultas, límite %s',
+                vista, request.method, request.path, medicion.consultas, presupuesto,
+            )
+
+        if self.server_timing:
+            response['Server-Timing'] = ', '.join([
+                f'total;dur={duracion * 1000:.1f}',
+                f'db;dur={medicion.tiempo_bd * 1000:.1f};desc="{medicion.consultas} consultas"',
+                f'tpl;dur={medicion.tiempo_plantillas * 1000:.1f}',
+            ])
+        return response
+
+
+class ConsultasRepetidasMiddleware(MiddlewareAsincrono):
+    """Desarrollo: avisa en el log cuando un request repite la misma consulta más de
+    CONSULTAS_REPETIDAS_UMBRAL veces (un N+1), indicando desde dónde se emitió.
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with DetectorConsultas() as detector:
+            response = self.get_response(request)
+        return self.avisar(request, response, detector)
+
+    async def __acall__(self, request):
+        detector = DetectorConsultas()
+        await sync_to_async(detector.__enter__)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(detector.__exit__)(None, None, None)
+        return self.avisar(request, response, detector)
+
+    def avisar(self, request, response, detector):
+        if detector.repetidas():
+            logger.warning(
+                'Consultas repetidas en %s %s (%s en total):\n%s',
+                request.method, request.path, detector.total, detector.informe(),
+            )
+        return response
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.1 on 2026-10-18 06:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0003_alter_producto_categoria_alter_producto_imagen_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['-creado', 'id'], name='producto_creado_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['marca', 'precio'], name='producto_marca_precio_idx'),
+        ),
+    ]
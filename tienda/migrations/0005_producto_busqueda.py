@@ -0,0 +1,24 @@
+# Generated by Django 5.2.1 on 2026-10-18 06:45
+
+from django.db import migrations
+
+
+def instalar_indice(apps, schema_editor):
+    from tienda.busqueda import obtener_backend
+    obtener_backend(schema_editor.connection).instalar(schema_editor.connection)
+
+
+def desinstalar_indice(apps, schema_editor):
+    from tienda.busqueda import obtener_backend
+    obtener_backend(schema_editor.connection).desinstalar(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0004_producto_indices_catalogo'),
+    ]
+
+    operations = [
+        migrations.RunPython(instalar_indice, desinstalar_indice),
+    ]
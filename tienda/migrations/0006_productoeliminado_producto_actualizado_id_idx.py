@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-18 07:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0005_producto_busqueda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductoEliminado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('producto_id', models.BigIntegerField(verbose_name='ID del producto')),
+                ('codigo', models.CharField(max_length=20, verbose_name='Código')),
+                ('eliminado', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de eliminación')),
+            ],
+            options={
+                'verbose_name': 'Producto eliminado',
+                'verbose_name_plural': 'Productos eliminados',
+                'indexes': [models.Index(fields=['eliminado', 'id'], name='eliminado_fecha_id_idx')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['actualizado', 'id'], name='producto_actualizado_id_idx'),
+        ),
+    ]
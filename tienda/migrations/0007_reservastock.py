@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-18 07:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0006_productoeliminado_producto_actualizado_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservaStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('referencia', models.CharField(db_index=True, max_length=26, verbose_name='Orden de compra')),
+                ('cantidad', models.PositiveIntegerField(verbose_name='Cantidad')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('confirmada', 'Confirmada'), ('liberada', 'Liberada')], default='pendiente', max_length=10, verbose_name='Estado')),
+                ('expira', models.DateTimeField(verbose_name='Expira')),
+                ('creado', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tienda.producto', verbose_name='Producto')),
+            ],
+            options={
+                'verbose_name': 'Reserva de stock',
+                'verbose_name_plural': 'Reservas de stock',
+                'indexes': [models.Index(fields=['estado', 'expira'], name='reserva_estado_expira_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.1 on 2026-10-18 07:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0007_reservastock'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Pedido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('buy_order', models.CharField(max_length=26, unique=True, verbose_name='Orden de compra')),
+                ('session_key', models.CharField(blank=True, max_length=40, verbose_name='Sesión')),
+                ('total', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Total')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente de pago'), ('pagado', 'Pagado'), ('rechazado', 'Rechazado'), ('cancelado', 'Cancelado')], default='pendiente', max_length=10, verbose_name='Estado')),
+                ('codigo_autorizacion', models.CharField(blank=True, max_length=20, verbose_name='Código de autorización')),
+                ('respuesta_webpay', models.JSONField(blank=True, null=True, verbose_name='Respuesta de Webpay')),
+                ('fecha', models.DateTimeField(auto_now_add=True, verbose_name='Fecha')),
+                ('actualizado', models.DateTimeField(auto_now=True, verbose_name='Última actualización')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pedidos', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Pedido',
+                'verbose_name_plural': 'Pedidos',
+                'ordering': ['-fecha'],
+                'indexes': [
+                    models.Index(fields=['usuario', '-fecha'], name='pedido_usuario_fecha_idx'),
+                    models.Index(fields=['-fecha'], name='pedido_fecha_idx'),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name='LineaPedido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.CharField(max_length=20, verbose_name='Código')),
+                ('nombre', models.CharField(max_length=200, verbose_name='Nombre')),
+                ('precio_unitario', models.DecimalField(decimal_places=2, max_digits=8, verbose_name='Precio unitario')),
+                ('cantidad', models.PositiveIntegerField(verbose_name='Cantidad')),
+                ('subtotal', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Subtotal')),
+                ('pedido', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lineas', to='tienda.pedido', verbose_name='Pedido')),
+                ('producto', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='tienda.producto', verbose_name='Producto')),
+            ],
+            options={
+                'verbose_name': 'Línea de pedido',
+                'verbose_name_plural': 'Líneas de pedido',
+            },
+        ),
+    ]
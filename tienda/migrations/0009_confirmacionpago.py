@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0008_pedido_lineapedido'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConfirmacionPago',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64, unique=True, verbose_name='Token Webpay')),
+                ('estado', models.CharField(choices=[('procesando', 'Procesando'), ('completada', 'Completada')], default='procesando', max_length=10, verbose_name='Estado')),
+                ('respuesta', models.JSONField(blank=True, null=True, verbose_name='Respuesta de Webpay')),
+                ('creado', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('actualizado', models.DateTimeField(auto_now=True, verbose_name='Última actualización')),
+            ],
+            options={
+                'verbose_name': 'Confirmación de pago',
+                'verbose_name_plural': 'Confirmaciones de pago',
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0009_confirmacionpago'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LineaCarrito',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=48, verbose_name='Carrito')),
+                ('cantidad', models.PositiveIntegerField(verbose_name='Cantidad')),
+                ('actualizado', models.DateTimeField(auto_now=True, verbose_name='Última actualización')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tienda.producto', verbose_name='Producto')),
+            ],
+            options={
+                'verbose_name': 'Línea de carrito',
+                'verbose_name_plural': 'Líneas de carrito',
+                'indexes': [models.Index(fields=['actualizado'], name='lineacarrito_actualizado_idx')],
+                'constraints': [models.UniqueConstraint(fields=('clave', 'producto'), name='lineacarrito_clave_producto_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,58 @@
+import datetime
+
+from django.core import validators
+from django.db import migrations, models
+
+
+def asignar_rut_provisorio(apps, schema_editor):
+    # Perfiles creados antes de que existiera el RUT: un valor único que no cumple
+    # el formato, para que se note y se complete desde el admin
+    Cliente = apps.get_model('tienda', 'Cliente')
+    for cliente in Cliente.objects.filter(rut__isnull=True).only('id'):
+        Cliente.objects.filter(pk=cliente.pk).update(rut=f'SIN-{cliente.pk}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0012_tarea'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='comuna',
+            field=models.CharField(default='', max_length=100, verbose_name='Comuna'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='fecha_nacimiento',
+            field=models.DateField(default=datetime.date(1900, 1, 1), verbose_name='Fecha de nacimiento'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='nacionalidad',
+            field=models.CharField(choices=[('chile', 'Chile'), ('argentina', 'Argentina'), ('peru', 'Perú'), ('mexico', 'México')], default='chile', max_length=20, verbose_name='Nacionalidad'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='sexo',
+            field=models.CharField(choices=[('masculino', 'Masculino'), ('femenino', 'Femenino'), ('otro', 'Otro')], default='otro', max_length=10, verbose_name='Sexo'),
+            preserve_default=False,
+        ),
+        # El RUT es único: se agrega nulo, se completa fila por fila y luego se restringe
+        migrations.AddField(
+            model_name='cliente',
+            name='rut',
+            field=models.CharField(max_length=12, null=True, verbose_name='RUT'),
+        ),
+        migrations.RunPython(asignar_rut_provisorio, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='cliente',
+            name='rut',
+            field=models.CharField(max_length=12, unique=True, validators=[validators.RegexValidator(message='Formato: 12.345.678-9', regex='^\\d{1,2}\\.\\d{3}\\.\\d{3}-[\\dkK]$')], verbose_name='RUT'),
+        ),
+    ]
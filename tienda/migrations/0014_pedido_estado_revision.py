@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 07:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0013_cliente_datos_personales'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pedido',
+            name='estado',
+            field=models.CharField(choices=[('pendiente', 'Pendiente de pago'), ('pagado', 'Pagado'), ('rechazado', 'Rechazado'), ('cancelado', 'Cancelado'), ('revision', 'Pagado, requiere revisión')], default='pendiente', max_length=10, verbose_name='Estado'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0014_pedido_estado_revision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categoria',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Última actualización'),
+            preserve_default=False,
+        ),
+    ]
@@ -13,6 +13,7 @@ class Categoria(models.Model):
         unique=True,
         help_text=_('Nombre descriptivo de la categoría')
     )
+    actualizado = models.DateTimeField(_('Última actualización'), auto_now=True)  # Para el ETag de la API
 
     class Meta:
         verbose_name = _('Categoría')
@@ -53,6 +54,8 @@ class Producto(models.Model):
         default=1  # Se asegura que haya una categoría predeterminada
     )
     imagen = models.ImageField(_('Imagen'), upload_to='productos/', null=True, blank=True)
+    # Derivados generados por tienda.imagenes: {'webp': {'400': 'productos/x__400w.webp'}, 'jpeg': {...}}
+    imagen_variantes = models.JSONField(_('Variantes de imagen'), default=dict, blank=True, editable=False)
     descripcion = models.TextField(_('Descripción'), blank=True)
     creado = models.DateTimeField(_('Fecha de creación'), auto_now_add=True)
     actualizado = models.DateTimeField(_('Última actualización'), auto_now=True)
@@ -64,6 +67,11 @@ class Producto(models.Model):
         indexes = [
             models.Index(fields=['nombre', 'marca']),
             models.Index(fields=['precio']),
+            # Paginación keyset del catálogo
+            models.Index(fields=['-creado', 'id'], name='producto_creado_id_idx'),
+            models.Index(fields=['marca', 'precio'], name='producto_marca_precio_idx'),
+            # Sincronización incremental (/api/productos/cambios/)
+            models.Index(fields=['actualizado', 'id'], name='producto_actualizado_id_idx'),
         ]
 
     def __str__(self):
@@ -74,6 +82,180 @@ class Producto(models.Model):
         """Indica si el producto está disponible y actualizado recientemente"""
         return self.stock > 0 and self.actualizado > timezone.now() - timedelta(days=30)
 
+    def variantes_imagen(self, formato):
+        """[(ancho, url)] de los derivados de la imagen en ese formato, de menor a mayor"""
+        variantes = (self.imagen_variantes or {}).get(formato) or {}
+        return [
+            (int(ancho), self.imagen.storage.url(nombre))
+            for ancho, nombre in sorted(variantes.items(), key=lambda variante: int(variante[0]))
+        ]
+
+    @property
+    def srcset_webp(self):
+        return ', '.join(f'{url} {ancho}w' for ancho, url in self.variantes_imagen('webp'))
+
+    @property
+    def srcset_jpeg(self):
+        return ', '.join(f'{url} {ancho}w' for ancho, url in self.variantes_imagen('jpeg'))
+
+    @property
+    def imagen_src(self):
+        """URL para `src`: un JPEG de hasta 400 px o, si aún no hay derivados, el original"""
+        variantes = self.variantes_imagen('jpeg')
+        if not variantes:
+            return self.imagen.url if self.imagen else ''
+        hasta_400 = [url for ancho, url in variantes if ancho <= 400]
+        return hasta_400[-1] if hasta_400 else variantes[0][1]
+
+class ProductoEliminado(models.Model):
+    """Lápida de un producto eliminado, para que los clientes sincronizados lo borren"""
+    producto_id = models.BigIntegerField(_('ID del producto'))
+    codigo = models.CharField(_('Código'), max_length=20)
+    eliminado = models.DateTimeField(_('Fecha de eliminación'), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('Producto eliminado')
+        verbose_name_plural = _('Productos eliminados')
+        indexes = [
+            models.Index(fields=['eliminado', 'id'], name='eliminado_fecha_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.codigo} (eliminado {self.eliminado:%Y-%m-%d %H:%M})"
+
+class ReservaStock(models.Model):
+    """Unidades apartadas durante el pago en Webpay, descontadas ya de Producto.stock"""
+    PENDIENTE = 'pendiente'
+    CONFIRMADA = 'confirmada'
+    LIBERADA = 'liberada'
+    ESTADOS = [
+        (PENDIENTE, _('Pendiente')),
+        (CONFIRMADA, _('Confirmada')),
+        (LIBERADA, _('Liberada')),
+    ]
+
+    referencia = models.CharField(_('Orden de compra'), max_length=26, db_index=True)
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, verbose_name=_('Producto'))
+    cantidad = models.PositiveIntegerField(_('Cantidad'))
+    estado = models.CharField(_('Estado'), max_length=10, choices=ESTADOS, default=PENDIENTE)
+    expira = models.DateTimeField(_('Expira'))
+    creado = models.DateTimeField(_('Fecha de creación'), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('Reserva de stock')
+        verbose_name_plural = _('Reservas de stock')
+        indexes = [
+            # Búsqueda de reservas vencidas
+            models.Index(fields=['estado', 'expira'], name='reserva_estado_expira_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.referencia}: {self.cantidad} x {self.producto_id} ({self.estado})"
+
+class LineaCarrito(models.Model):
+    """Línea del carrito guardada en la base de datos (ver tienda.carrito.AlmacenBD)"""
+    # 'usuario:<id>' para clientes autenticados, 'visitante:<uuid>' para anónimos
+    clave = models.CharField(_('Carrito'), max_length=48)
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, verbose_name=_('Producto'))
+    cantidad = models.PositiveIntegerField(_('Cantidad'))
+    actualizado = models.DateTimeField(_('Última actualización'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('Línea de carrito')
+        verbose_name_plural = _('Líneas de carrito')
+        constraints = [
+            # También sirve de índice para leer el carrito completo por clave
+            models.UniqueConstraint(fields=['clave', 'producto'], name='lineacarrito_clave_producto_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['actualizado'], name='lineacarrito_actualizado_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.clave}: {self.cantidad} x {self.producto_id}"
+
+class Pedido(models.Model):
+    """Compra registrada al iniciar el pago en Webpay"""
+    PENDIENTE = 'pendiente'
+    PAGADO = 'pagado'
+    RECHAZADO = 'rechazado'
+    CANCELADO = 'cancelado'
+    REVISION = 'revision'  # Pago autorizado sin stock para despacharlo: reponer o devolver el dinero
+    ESTADOS = [
+        (PENDIENTE, _('Pendiente de pago')),
+        (PAGADO, _('Pagado')),
+        (RECHAZADO, _('Rechazado')),
+        (CANCELADO, _('Cancelado')),
+        (REVISION, _('Pagado, requiere revisión')),
+    ]
+
+    buy_order = models.CharField(_('Orden de compra'), max_length=26, unique=True)
+    usuario = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='pedidos', verbose_name=_('Usuario')
+    )
+    session_key = models.CharField(_('Sesión'), max_length=40, blank=True)
+    total = models.DecimalField(_('Total'), max_digits=12, decimal_places=2)
+    estado = models.CharField(_('Estado'), max_length=10, choices=ESTADOS, default=PENDIENTE)
+    codigo_autorizacion = models.CharField(_('Código de autorización'), max_length=20, blank=True)
+    respuesta_webpay = models.JSONField(_('Respuesta de Webpay'), null=True, blank=True)
+    fecha = models.DateTimeField(_('Fecha'), auto_now_add=True)
+    actualizado = models.DateTimeField(_('Última actualización'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('Pedido')
+        verbose_name_plural = _('Pedidos')
+        ordering = ['-fecha']
+        indexes = [
+            models.Index(fields=['usuario', '-fecha'], name='pedido_usuario_fecha_idx'),
+            models.Index(fields=['-fecha'], name='pedido_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.buy_order} ({self.get_estado_display()}) - ${self.total}"
+
+
+class LineaPedido(models.Model):
+    """Producto comprado, con precio y datos copiados al momento de la compra"""
+    pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE, related_name='lineas', verbose_name=_('Pedido'))
+    producto = models.ForeignKey(
+        Producto, on_delete=models.SET_NULL, null=True, verbose_name=_('Producto')
+    )
+    codigo = models.CharField(_('Código'), max_length=20)
+    nombre = models.CharField(_('Nombre'), max_length=200)
+    precio_unitario = models.DecimalField(_('Precio unitario'), max_digits=8, decimal_places=2)
+    cantidad = models.PositiveIntegerField(_('Cantidad'))
+    subtotal = models.DecimalField(_('Subtotal'), max_digits=12, decimal_places=2)
+
+    class Meta:
+        verbose_name = _('Línea de pedido')
+        verbose_name_plural = _('Líneas de pedido')
+
+    def __str__(self):
+        return f"{self.cantidad} x {self.nombre}"
+
+class ConfirmacionPago(models.Model):
+    """Registro por token de Webpay para que confirmar un pago sea idempotente"""
+    PROCESANDO = 'procesando'
+    COMPLETADA = 'completada'
+    ESTADOS = [
+        (PROCESANDO, _('Procesando')),
+        (COMPLETADA, _('Completada')),
+    ]
+
+    token = models.CharField(_('Token Webpay'), max_length=64, unique=True)
+    estado = models.CharField(_('Estado'), max_length=10, choices=ESTADOS, default=PROCESANDO)
+    respuesta = models.JSONField(_('Respuesta de Webpay'), null=True, blank=True)
+    creado = models.DateTimeField(_('Fecha de creación'), auto_now_add=True)
+    actualizado = models.DateTimeField(_('Última actualización'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('Confirmación de pago')
+        verbose_name_plural = _('Confirmaciones de pago')
+
+    def __str__(self):
+        return f"{self.token[:12]}… ({self.estado})"
+
 # Opciones predefinidas
 NACIONALIDADES = [
     ('chile', 'Chile'),
@@ -128,6 +310,43 @@ class Cliente(models.Model):
 
 
 
+class Tarea(models.Model):
+    """Trabajo en segundo plano encolado con tienda.tareas y ejecutado por `manage.py procesar_tareas`"""
+    PENDIENTE = 'pendiente'
+    EN_CURSO = 'en_curso'
+    COMPLETADA = 'completada'
+    FALLIDA = 'fallida'
+    ESTADOS = [
+        (PENDIENTE, _('Pendiente')),
+        (EN_CURSO, _('En curso')),
+        (COMPLETADA, _('Completada')),
+        (FALLIDA, _('Fallida')),
+    ]
+
+    nombre = models.CharField(_('Función'), max_length=200)  # Ruta importable, p. ej. tienda.imagenes.generar_variantes
+    argumentos = models.JSONField(_('Argumentos'), default=dict)  # {'args': [...], 'kwargs': {...}}
+    estado = models.CharField(_('Estado'), max_length=10, choices=ESTADOS, default=PENDIENTE)
+    intentos = models.PositiveSmallIntegerField(_('Intentos'), default=0)
+    max_intentos = models.PositiveSmallIntegerField(_('Máximo de intentos'), default=3)
+    ejecutar_desde = models.DateTimeField(_('Ejecutar desde'), default=timezone.now)
+    bloqueada_hasta = models.DateTimeField(_('Bloqueada hasta'), null=True, blank=True)
+    trabajador = models.CharField(_('Trabajador'), max_length=100, blank=True)
+    ultimo_error = models.TextField(_('Último error'), blank=True)
+    duracion = models.FloatField(_('Duración (s)'), null=True, blank=True)
+    creado = models.DateTimeField(_('Fecha de creación'), auto_now_add=True)
+    terminada = models.DateTimeField(_('Fecha de término'), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _('Tarea')
+        verbose_name_plural = _('Tareas')
+        indexes = [
+            # Búsqueda de la próxima tarea por ejecutar
+            models.Index(fields=['estado', 'ejecutar_desde'], name='tarea_estado_desde_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.nombre} #{self.pk} ({self.estado})"
+
 class MensajeContacto(models.Model):
     """Modelo para mensajes recibidos del formulario de contacto"""
     nombre = models.CharField(_('Nombre completo'), max_length=100)
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import EmailMessage, get_connection
+
+from .models import MensajeContacto
+from .tareas import tarea
+
+
+@tarea(max_intentos=5, espera=60)
+def notificar_contacto(mensaje_id):
+    """Avisa al equipo de un mensaje de contacto y envía el acuse de recibo al cliente"""
+    mensaje = MensajeContacto.objects.filter(pk=mensaje_id).first()
+    if mensaje is None:
+        return  # Se eliminó antes de que corriera la tarea
+
+    destinatarios = getattr(settings, 'CONTACTO_DESTINATARIOS', None) or list(
+        User.objects.filter(is_staff=True, is_active=True).exclude(email='').values_list('email', flat=True)
+    )
+    correos = [
+        EmailMessage(
+            f'Hemos recibido tu mensaje: {mensaje.asunto}',
+            f'Hola {mensaje.nombre},\n\nRecibimos tu mensaje y te responderemos pronto.\n\nFerremas',
+            to=[mensaje.email],
+        )
+    ]
+    if destinatarios:
+        correos.append(EmailMessage(
+            f'[Contacto] {mensaje.asunto}',
+            f'{mensaje.nombre} <{mensaje.email}> escribió:\n\n{mensaje.mensaje}',
+            to=destinatarios,
+            reply_to=[mensaje.email],
+        ))
+    # Una sola conexión SMTP para ambos correos
+    get_connection().send_messages(correos)
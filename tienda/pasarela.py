@@ -0,0 +1,117 @@
+import time
+import uuid
+from functools import lru_cache
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+from transbank.common.api_constants import ApiConstants
+from transbank.common.headers_builder import HeadersBuilder
+from transbank.common.integration_type import IntegrationType, webpay_host
+from transbank.common.options import WebpayOptions
+from transbank.common.request_service import RequestService
+from transbank.common.validation_util import ValidationUtil
+from transbank.error.transaction_commit_error import TransactionCommitError
+from transbank.error.transaction_create_error import TransactionCreateError
+from transbank.error.transbank_error import TransbankError
+from transbank.webpay.webpay_plus.request import TransactionCreateRequest
+from transbank.webpay.webpay_plus.schema import TransactionCreateRequestSchema
+from transbank.webpay.webpay_plus.transaction import Transaction
+
+# Cliente de Webpay Plus reutilizable. El SDK de Transbank abre una conexión
+# nueva por llamada (requests.post a nivel de módulo) y espera hasta 600 s; aquí
+# se usa una sola sesión con pool de conexiones y timeouts estrictos.
+
+
+class PasarelaWebpay:
+    """Webpay Plus sobre una requests.Session compartida (keep-alive + pool)"""
+
+    def __init__(self, commerce_code, api_key, integration_type, timeout=(3.05, 15), pool=20):
+        # timeout = (conexión, lectura) en segundos; requests acepta la tupla tal cual
+        self.options = WebpayOptions(commerce_code, api_key, integration_type, timeout=timeout)
+        self.host = webpay_host(integration_type)
+        self.sesion = requests.Session()
+        self.sesion.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=pool, max_retries=0))
+
+    def crear(self, buy_order, session_id, amount, return_url):
+        ValidationUtil.has_text_with_max_length(buy_order, ApiConstants.BUY_ORDER_LENGTH, "buy_order")
+        ValidationUtil.has_text_with_max_length(session_id, ApiConstants.SESSION_ID_LENGTH, "session_id")
+        ValidationUtil.has_text_with_max_length(return_url, ApiConstants.RETURN_URL_LENGTH, "return_url")
+        solicitud = TransactionCreateRequest(buy_order, session_id, amount, return_url)
+        try:
+            return self._enviar('POST', Transaction.CREATE_ENDPOINT, TransactionCreateRequestSchema().dumps(solicitud))
+        except TransbankError as e:
+            raise TransactionCreateError(e.message, e.code)
+
+    def confirmar(self, token):
+        ValidationUtil.has_text_with_max_length(token, ApiConstants.TOKEN_LENGTH, "token")
+        try:
+            return self._enviar('PUT', Transaction.COMMIT_ENDPOINT.format(token), {})
+        except TransbankError as e:
+            raise TransactionCommitError(e.message, e.code)
+
+    def _enviar(self, metodo, endpoint, datos):
+        respuesta = self.sesion.request(
+            metodo, f"{self.host}{endpoint}", data=datos,
+            headers=HeadersBuilder.build(self.options), timeout=self.options.timeout
+        )
+        return RequestService.process_response(respuesta)
+
+    # Versiones async: la llamada HTTP corre en un hilo aparte y el event loop
+    # de ASGI sigue atendiendo otros requests mientras Transbank responde.
+    async def crear_async(self, buy_order, session_id, amount, return_url):
+        return await sync_to_async(self.crear, thread_sensitive=False)(buy_order, session_id, amount, return_url)
+
+    async def confirmar_async(self, token):
+        return await sync_to_async(self.confirmar, thread_sensitive=False)(token)
+
+
+class PasarelaFalsa(PasarelaWebpay):
+    """Pasarela local para desarrollo y benchmarks sin red: simula la latencia de Transbank.
+
+    `crear` devuelve como URL de pago la propia URL de retorno, de modo que el
+    flujo completo (pagar -> confirmar) funciona sin salir del servidor.
+    """
+
+    def __init__(self, *args, latencia=0.2, **kwargs):
+        self.latencia = latencia
+        self.transacciones = {}
+
+    def crear(self, buy_order, session_id, amount, return_url):
+        time.sleep(self.latencia)
+        token = uuid.uuid4().hex
+        self.transacciones[token] = {'buy_order': buy_order, 'session_id': session_id, 'amount': float(amount)}
+        return {'url': return_url, 'token': token}
+
+    def confirmar(self, token):
+        time.sleep(self.latencia)
+        transaccion = self.transacciones.pop(token, None)
+        if transaccion is None:
+            raise TransactionCommitError('Transacción inexistente o ya confirmada', 422)
+        return {
+            **transaccion,
+            'status': 'AUTHORIZED',
+            'response_code': 0,
+            'authorization_code': '1213',
+            'transaction_date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+
+
+@lru_cache(maxsize=None)
+def obtener_pasarela():
+    """Pasarela configurada, creada una sola vez por proceso"""
+    config = settings.TRANSBANK_WEBPAY
+    clase = import_string(getattr(settings, 'WEBPAY_PASARELA', 'tienda.pasarela.PasarelaWebpay'))
+    kwargs = {}
+    if issubclass(clase, PasarelaFalsa):
+        kwargs['latencia'] = getattr(settings, 'WEBPAY_FALSA_LATENCIA', 0.2)
+    return clase(
+        config['COMMERCE_CODE'],
+        config['API_KEY'],
+        IntegrationType.LIVE if config.get('ENVIRONMENT') == 'LIVE' else IntegrationType.TEST,
+        timeout=(getattr(settings, 'WEBPAY_TIMEOUT_CONEXION', 3.05), getattr(settings, 'WEBPAY_TIMEOUT_LECTURA', 15)),
+        pool=getattr(settings, 'WEBPAY_POOL_CONEXIONES', 20),
+        **kwargs
+    )
@@ -0,0 +1,47 @@
+import uuid
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import LineaPedido, Pedido
+
+
+def nueva_orden_de_compra():
+    """Orden única por intento de pago (Webpay admite hasta 26 caracteres)"""
+    return f"ORD-{uuid.uuid4().hex[:22].upper()}"
+
+
+def crear_pedido(request, buy_order, carrito):
+    """Registra el pedido y sus líneas (un INSERT + un bulk_create) con precios congelados"""
+    with transaction.atomic():
+        pedido = Pedido.objects.create(
+            buy_order=buy_order,
+            usuario=request.user if request.user.is_authenticated else None,
+            session_key=request.session.session_key or '',
+            total=carrito['total'],
+        )
+        LineaPedido.objects.bulk_create([
+            LineaPedido(
+                pedido=pedido,
+                producto=item['producto'],
+                codigo=item['producto'].codigo,
+                nombre=item['nombre'],
+                precio_unitario=item['precio'],
+                cantidad=item['cantidad'],
+                subtotal=item['subtotal'],
+            )
+            for item in carrito['items']
+        ])
+    return pedido
+
+
+def actualizar_pedido(buy_order, estado, respuesta=None, desde=(Pedido.PENDIENTE,)):
+    """Actualiza el estado con un único UPDATE por la orden de compra (índice único).
+
+    Solo cambia pedidos en alguno de los estados `desde`.
+    """
+    campos = {'estado': estado, 'actualizado': timezone.now()}
+    if respuesta is not None:
+        campos['respuesta_webpay'] = respuesta
+        campos['codigo_autorizacion'] = respuesta.get('authorization_code') or ''
+    return Pedido.objects.filter(buy_order=buy_order, estado__in=desde).update(**campos)
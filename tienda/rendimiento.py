@@ -0,0 +1,139 @@
+import threading
+import time
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from functools import lru_cache
+
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates, Template
+
+# Mediciones por request (tiempo total, consultas, tiempo en la base, render de
+# plantillas y tamaño de la respuesta) agregadas por vista. El registro vive en
+# memoria de cada proceso: con varios workers cada uno expone sus propios valores.
+
+METRICAS = (
+    # clave: (nombre Prometheus, descripción)
+    ('duracion', 'ferremas_request_duracion_segundos', 'Tiempo total del request'),
+    ('consultas', 'ferremas_request_consultas', 'Consultas SQL por request'),
+    ('tiempo_bd', 'ferremas_request_bd_segundos', 'Tiempo en la base de datos por request'),
+    ('tiempo_plantillas', 'ferremas_request_plantillas_segundos', 'Tiempo de render de plantillas por request'),
+    ('bytes', 'ferremas_respuesta_bytes', 'Tamaño del cuerpo de la respuesta'),
+)
+CUANTILES = (0.5, 0.95, 0.99)
+
+
+class Medicion:
+    """Acumuladores del request en curso"""
+
+    def __init__(self):
+        self.consultas = 0
+        self.tiempo_bd = 0.0
+        self.tiempo_plantillas = 0.0
+        self.profundidad_plantillas = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Envoltorio de connection.execute_wrapper: cuenta y cronometra cada consulta
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tiempo_bd += time.perf_counter() - inicio
+            self.consultas += 1
+
+
+medicion_actual = ContextVar('medicion_actual', default=None)
+
+
+def percentil(ordenados, cuantil):
+    if not ordenados:
+        return 0
+    return ordenados[min(int(cuantil * len(ordenados)), len(ordenados) - 1)]
+
+
+class RegistroRendimiento:
+    """Histograma móvil por vista: guarda las últimas `ventana` mediciones de cada una"""
+
+    def __init__(self, ventana=1000):
+        self.ventana = ventana
+        self.lock = threading.Lock()
+        self.recientes = defaultdict(lambda: deque(maxlen=self.ventana))
+        # Totales desde el arranque, para _sum y _count de Prometheus
+        self.totales = defaultdict(lambda: defaultdict(float))
+
+    def registrar(self, vista, valores):
+        with self.lock:
+            self.recientes[vista].append(valores)
+            totales = self.totales[vista]
+            totales['requests'] += 1
+            for clave, valor in valores.items():
+                totales[clave] += valor
+
+    def resumen(self):
+        """{vista: {metrica: {cuantil: valor}, 'requests': n}} calculado sobre la ventana"""
+        with self.lock:
+            recientes = {vista: list(valores) for vista, valores in self.recientes.items()}
+            totales = {vista: dict(valores) for vista, valores in self.totales.items()}
+        resumen = {}
+        for vista, mediciones in recientes.items():
+            resumen[vista] = {'requests': int(totales[vista]['requests']), 'totales': totales[vista]}
+            for clave, *_ in METRICAS:
+                ordenados = sorted(medicion[clave] for medicion in mediciones)
+                resumen[vista][clave] = {cuantil: percentil(ordenados, cuantil) for cuantil in CUANTILES}
+        return resumen
+
+    def prometheus(self):
+        """Resumen en formato de texto de Prometheus (tipo summary)"""
+        resumen = self.resumen()
+        lineas = []
+        for clave, nombre, descripcion in METRICAS:
+            lineas.append(f'# HELP {nombre} {descripcion}')
+            lineas.append(f'# TYPE {nombre} summary')
+            for vista in sorted(resumen):
+                etiqueta = vista.replace('\\', '\\\\').replace('"', '\\"')
+                for cuantil, valor in resumen[vista][clave].items():
+                    lineas.append(f'{nombre}{{vista="{etiqueta}",quantile="{cuantil}"}} {valor:.6g}')
+                lineas.append(f'{nombre}_sum{{vista="{etiqueta}"}} {resumen[vista]["totales"].get(clave, 0):.6g}')
+                lineas.append(f'{nombre}_count{{vista="{etiqueta}"}} {resumen[vista]["requests"]}')
+        return '\n'.join(lineas) + '\n'
+
+    def reiniciar(self):
+        with self.lock:
+            self.recientes.clear()
+            self.totales.clear()
+
+
+@lru_cache(maxsize=None)
+def obtener_registro():
+    """Registro del proceso, creado una sola vez"""
+    return RegistroRendimiento(getattr(settings, 'RENDIMIENTO_VENTANA', 1000))
+
+
+class PlantillaMedida(Template):
+    """Template del backend de Django que acumula su tiempo de render en la medición del request.
+
+    Solo se mide el render exterior: un render_to_string dentro de una plantilla
+    no se cuenta dos veces.
+    """
+
+    def render(self, context=None, request=None):
+        medicion = medicion_actual.get()
+        if medicion is None:
+            return super().render(context, request)
+        medicion.profundidad_plantillas += 1
+        inicio = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            medicion.profundidad_plantillas -= 1
+            if medicion.profundidad_plantillas == 0:
+                medicion.tiempo_plantillas += time.perf_counter() - inicio
+
+
+class PlantillasMedidas(DjangoTemplates):
+    """Backend DjangoTemplates cuyas plantillas se cronometran (TEMPLATES['BACKEND'])"""
+
+    def from_string(self, template_code):
+        return PlantillaMedida(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return PlantillaMedida(super().get_template(template_name).template, self)
@@ -15,16 +15,50 @@ class ProductoSerializer(serializers.ModelSerializer):
     precio = serializers.DecimalField(max_digits=8, decimal_places=2, min_value=0)
     stock = serializers.IntegerField(min_value=0)
     disponible = serializers.BooleanField(read_only=True)
+    imagenes = serializers.SerializerMethodField()
 
     class Meta:
         model = Producto
         fields = [
             'id', 'codigo', 'nombre', 'marca', 'modelo', 'precio', 'stock',
-            'categoria', 'disponible', 'imagen', 'descripcion'
+            'categoria', 'disponible', 'imagen', 'imagenes', 'descripcion'
         ]
 
+    def get_imagenes(self, producto):
+        """URLs de los derivados por formato y ancho: {'webp': {'160': url, ...}, 'jpeg': {...}}"""
+        request = self.context.get('request')
+        return {
+            formato: {
+                str(ancho): request.build_absolute_uri(url) if request else url
+                for ancho, url in producto.variantes_imagen(formato)
+            }
+            for formato in ('webp', 'jpeg')
+        }
+
 class ContactoSerializer(serializers.ModelSerializer):
     """Serializador para mensajes de contacto"""
     class Meta:
         model = MensajeContacto
         fields = ['nombre', 'email', 'asunto', 'mensaje', 'fecha', 'leido']
+
+
+class ConversionLoteSerializer(serializers.Serializer):
+    """Conversión de una lista de montos en CLP o de los precios de una lista de productos"""
+    MAXIMO = 1000
+
+    moneda = serializers.CharField(max_length=3)
+    montos = serializers.ListField(
+        child=serializers.DecimalField(max_digits=14, decimal_places=2, min_value=0),
+        required=False, max_length=MAXIMO
+    )
+    productos = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=False, max_length=MAXIMO
+    )
+
+    def validate_moneda(self, valor):
+        return valor.upper()
+
+    def validate(self, datos):
+        if ('montos' in datos) == ('productos' in datos):
+            raise serializers.ValidationError('Indica "montos" o "productos" (solo uno de los dos).')
+        return datos
@@ -1,9 +1,33 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from django.contrib.auth.models import User
-from .models import Cliente
+from django.contrib.auth.signals import user_logged_in
+from .models import Producto, Categoria, ProductoEliminado
+from .busqueda import obtener_backend
+from .carrito import fusionar_carrito
+from .catalogo import invalidar_catalogo
 
-@receiver(post_save, sender=User)
-def crear_perfil_cliente(sender, instance, created, **kwargs):
-    if created:
-        Cliente.objects.create(usuario=instance)
\ No newline at end of file
+# El carrito armado como visitante se suma al del cliente al iniciar sesión
+@receiver(user_logged_in)
+def fusionar_carrito_al_iniciar_sesion(sender, request, user, **kwargs):
+    if request is not None:
+        fusionar_carrito(request, user)
+
+# Índice de búsqueda: se actualiza solo el producto modificado
+@receiver(post_save, sender=Producto)
+def indexar_producto(sender, instance, **kwargs):
+    obtener_backend().indexar(instance)
+
+@receiver(post_delete, sender=Producto)
+def desindexar_producto(sender, instance, **kwargs):
+    obtener_backend().eliminar(instance.pk)
+
+# Lápida para la sincronización incremental (eliminar_producto borra la fila)
+@receiver(post_delete, sender=Producto)
+def registrar_producto_eliminado(sender, instance, **kwargs):
+    ProductoEliminado.objects.create(producto_id=instance.pk, codigo=instance.codigo)
+
+# Cualquier cambio en el catálogo invalida los listados y fichas cacheadas
+@receiver([post_save, post_delete], sender=Producto)
+@receiver([post_save, post_delete], sender=Categoria)
+def invalidar_cache_catalogo(sender, **kwargs):
+    invalidar_catalogo()
\ No newline at end of file
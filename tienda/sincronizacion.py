@@ -0,0 +1,71 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .catalogo import codificar_valores, decodificar_cursor
+from .models import Producto, ProductoEliminado
+
+# Los cambios se recorren en orden (fecha, tipo, id). El tipo desempata un
+# producto y una lápida con la misma fecha: 0 = actualizado, 1 = eliminado.
+ACTUALIZADO, ELIMINADO = 0, 1
+
+
+def _leer_cursor(cursor):
+    valores = decodificar_cursor(cursor)
+    if not valores or len(valores) != 3:
+        return None
+    fecha = parse_datetime(str(valores[0]))
+    try:
+        return (fecha, int(valores[1]), int(valores[2])) if fecha else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _despues_de(campo, tipo, cursor):
+    """Condición `(campo, tipo, id) > cursor` para una de las dos tablas"""
+    if cursor is None:
+        return Q()
+    fecha, tipo_cursor, id_cursor = cursor
+    condicion = Q(**{f'{campo}__gt': fecha})
+    if tipo > tipo_cursor:
+        condicion |= Q(**{campo: fecha})
+    elif tipo == tipo_cursor:
+        condicion |= Q(**{campo: fecha, 'id__gt': id_cursor})
+    return condicion
+
+
+def cambios_desde(cursor=None, limite=100):
+    """Productos creados, actualizados o eliminados después del cursor.
+
+    Devuelve `(cambios, siguiente_cursor, hay_mas)`, donde cada cambio es
+    `(tipo, fecha, objeto)`. Con un cursor vacío se recorre el catálogo completo.
+    """
+    posicion = _leer_cursor(cursor)
+    # Margen para no saltarse filas de transacciones que aún no confirman
+    hasta = timezone.now() - timedelta(seconds=getattr(settings, 'SINCRONIZACION_MARGEN', 2))
+
+    productos = Producto.objects.filter(
+        _despues_de('actualizado', ACTUALIZADO, posicion), actualizado__lte=hasta
+    ).order_by('actualizado', 'id')[:limite + 1]
+    eliminados = ProductoEliminado.objects.filter(
+        _despues_de('eliminado', ELIMINADO, posicion), eliminado__lte=hasta
+    ).order_by('eliminado', 'id')[:limite + 1]
+
+    # Mezcla de ambas secuencias ya ordenadas; cada una trae como máximo limite + 1 filas
+    cambios = sorted(
+        [(ACTUALIZADO, p.actualizado, p) for p in productos]
+        + [(ELIMINADO, e.eliminado, e) for e in eliminados],
+        key=lambda cambio: (cambio[1], cambio[0], cambio[2].id)
+    )
+    hay_mas = len(cambios) > limite
+    cambios = cambios[:limite]
+
+    if cambios:
+        tipo, fecha, objeto = cambios[-1]
+        siguiente = codificar_valores([fecha.isoformat(), tipo, objeto.id])
+    else:
+        siguiente = cursor or ''
+    return cambios, siguiente, hay_mas
@@ -0,0 +1,216 @@
+import math
+import random
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .busqueda import obtener_backend
+from .carrito import CLAVE_SESION
+from .catalogo import invalidar_catalogo
+from .clientes import formatear_rut
+from .models import (
+    NACIONALIDADES, SEXO_CHOICES, Categoria, Cliente, LineaCarrito, LineaPedido, MensajeContacto, Pedido, Producto,
+)
+
+# Datos sintéticos reproducibles para benchmarks y entornos de desarrollo: la
+# misma semilla genera siempre los mismos datos. Se inserta con bulk_create por
+# lotes, así que no corren las señales: el índice de búsqueda se reconstruye al
+# final y cada User se crea junto con su perfil Cliente en el mismo lote.
+
+# Tipo de producto: precio típico en CLP
+TIPOS = {
+    'Taladro': 59990, 'Martillo': 8990, 'Sierra': 24990, 'Destornillador': 3990, 'Llave': 6990,
+    'Alicate': 7990, 'Lijadora': 49990, 'Esmeril': 44990, 'Nivel': 9990, 'Huincha': 4990,
+    'Brocha': 2990, 'Rodillo': 5990, 'Candado': 6990, 'Pala': 14990, 'Carretilla': 54990,
+}
+VARIANTES = ('percutor', 'inalámbrico', 'profesional', 'compacto', 'de banco', 'industrial', 'eléctrico', 'manual')
+# Marca: prefijo de sus modelos. Las primeras son las más frecuentes (pesos 1/posición)
+MARCAS = {
+    'Bosch': 'GSB', 'Makita': 'HP', 'DeWalt': 'DCD', 'Stanley': 'STHT', 'Truper': 'TRU',
+    'Black+Decker': 'BD', 'Bauker': 'BK', 'Einhell': 'TE', 'Ubermann': 'UB', 'Skil': 'SK',
+}
+PESOS_MARCAS = [1 / posicion for posicion in range(1, len(MARCAS) + 1)]
+NOMBRES = (
+    'Sofía', 'Matías', 'Valentina', 'Benjamín', 'Isidora', 'Vicente', 'Josefa', 'Martín', 'Florencia',
+    'Agustín', 'Catalina', 'Tomás', 'Antonia', 'Joaquín', 'Fernanda', 'Diego', 'Javiera', 'Cristóbal',
+)
+APELLIDOS = (
+    'González', 'Muñoz', 'Rojas', 'Díaz', 'Pérez', 'Soto', 'Contreras', 'Silva', 'Martínez', 'Sepúlveda',
+    'Morales', 'Rodríguez', 'López', 'Fuentes', 'Hernández', 'Torres', 'Araya', 'Flores', 'Espinoza', 'Valenzuela',
+)
+COMUNAS = (
+    'Santiago', 'Puente Alto', 'Maipú', 'La Florida', 'Las Condes', 'Ñuñoa', 'Providencia', 'San Bernardo',
+    'Viña del Mar', 'Valparaíso', 'Concepción', 'Temuco', 'Antofagasta', 'La Serena', 'Rancagua', 'Talca',
+)
+ASUNTOS = ('Cotización', 'Estado de mi pedido', 'Cambio de producto', 'Disponibilidad de stock', 'Factura', 'Despacho')
+
+
+def rut_sintetico(i):
+    # Permutación de 5.000.000-24.999.999 (7919 es primo con el rango): RUT distintos
+    # para cada i, sin orden evidente y siempre con 7 u 8 dígitos
+    return formatear_rut(5_000_000 + (i * 7919) % 20_000_000)
+
+
+def siguiente_indice(queryset, campo, prefijo, digitos):
+    """Índice siguiente al mayor ya generado con el formato `prefijo` + `digitos` dígitos.
+
+    No se usa count(): si se borraron filas, repetiría índices que siguen ocupados.
+    """
+    ultimo = (
+        queryset.filter(**{f'{campo}__regex': rf'^{prefijo}\d{{{digitos}}}$'})
+        .order_by(f'-{campo}').values_list(campo, flat=True).first()  # Ancho fijo: el orden de texto es el numérico
+    )
+    return int(ultimo[len(prefijo):]) + 1 if ultimo else 0
+
+
+def _lotes(desde, cantidad, lote):
+    for inicio in range(desde, desde + cantidad, lote):
+        yield range(inicio, min(inicio + lote, desde + cantidad))
+
+
+def sembrar_catalogo(productos=1000, categorias=50, semilla=1, lote=2000, prefijo='SIN', desde=0):
+    """Crea `categorias` categorías y `productos` productos; devuelve (categorías, productos) creados"""
+    rng = random.Random(semilla)
+    tipos = list(TIPOS)
+    nombres = [f'{tipos[i % len(tipos)]}s {i // len(tipos) + 1:03d}' for i in range(categorias)]
+    with transaction.atomic():
+        Categoria.objects.bulk_create([Categoria(nombre=nombre) for nombre in nombres], ignore_conflicts=True)
+        categoria_ids = dict(Categoria.objects.filter(nombre__in=nombres).values_list('nombre', 'id'))
+
+        creados = 0
+        for indices in _lotes(desde, productos, lote):
+            nuevos = []
+            for i in indices:
+                indice = rng.randrange(categorias)
+                tipo = tipos[indice % len(tipos)]  # El tipo corresponde a la categoría
+                marca = rng.choices(list(MARCAS), PESOS_MARCAS)[0]
+                precio = min(rng.lognormvariate(math.log(TIPOS[tipo]), 0.4), 999990)
+                nuevos.append(Producto(
+                    codigo=f'{prefijo}-{i:07d}',
+                    nombre=f'{tipo} {rng.choice(VARIANTES)} {rng.randint(100, 999)}',
+                    marca=marca,
+                    modelo=f"{MARCAS[marca]}{rng.randint(10, 999)}{rng.choice(('', '', '-LI', '-X', '-PRO'))}",
+                    precio=Decimal(round(precio, -1)),
+                    stock=0 if rng.random() < 0.1 else rng.randint(1, 500),  # ~10 % sin stock
+                    categoria_id=categoria_ids[nombres[indice]],
+                    descripcion=f'{tipo} marca {marca}, ideal para trabajos de construcción y hogar.',
+                ))
+            Producto.objects.bulk_create(nuevos)
+            creados += len(nuevos)
+
+    obtener_backend().reconstruir()
+    invalidar_catalogo()
+    return len(categoria_ids), creados
+
+
+def sembrar_clientes(cantidad, semilla=1, lote=2000, desde=0, password='ferremas123'):
+    """Crea `cantidad` usuarios con su perfil Cliente; devuelve los ids de los usuarios"""
+    rng = random.Random(semilla)
+    # Un solo hash para todos: hashear cada contraseña con PBKDF2 tomaría horas
+    clave = make_password(password)
+    nacionalidades = [valor for valor, _ in NACIONALIDADES]
+    sexos = [valor for valor, _ in SEXO_CHOICES]
+    referencia = date(2006, 1, 1)  # Fija, para que las fechas no dependan del día en que se generan
+    usuario_ids = []
+    with transaction.atomic():
+        for indices in _lotes(desde, cantidad, lote):
+            usuarios = []
+            for i in indices:
+                nombre, apellido = rng.choice(NOMBRES), rng.choice(APELLIDOS)
+                usuarios.append(User(
+                    username=f'cliente{i:07d}', email=f'cliente{i:07d}@ejemplo.cl', password=clave,
+                    first_name=nombre, last_name=f'{apellido} {rng.choice(APELLIDOS)}',
+                ))
+            usuarios = User.objects.bulk_create(usuarios)
+            Cliente.objects.bulk_create([
+                Cliente(
+                    usuario_id=usuario.pk,
+                    rut=rut_sintetico(i),
+                    telefono=f'+569{rng.randint(10_000_000, 99_999_999)}',
+                    direccion=f'{rng.choice(APELLIDOS)} {rng.randint(1, 9999)}',
+                    comuna=rng.choice(COMUNAS),
+                    nacionalidad=rng.choices(nacionalidades, (85, 5, 6, 4))[0],
+                    sexo=rng.choices(sexos, (48, 48, 4))[0],
+                    fecha_nacimiento=referencia - timedelta(days=rng.randint(0, 60 * 365)),
+                )
+                for i, usuario in zip(indices, usuarios)
+            ])
+            usuario_ids.extend(usuario.pk for usuario in usuarios)
+    return usuario_ids
+
+
+def sembrar_mensajes(cantidad, semilla=1, lote=2000):
+    """Crea `cantidad` mensajes de contacto; ~70 % ya leídos"""
+    rng = random.Random(semilla)
+    creados = 0
+    with transaction.atomic():
+        for indices in _lotes(0, cantidad, lote):
+            mensajes = []
+            for i in indices:
+                nombre = f'{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)}'
+                asunto = rng.choice(ASUNTOS)
+                mensajes.append(MensajeContacto(
+                    nombre=nombre, email=f'contacto{i}@ejemplo.cl', asunto=asunto,
+                    mensaje=f'Hola, les escribo por: {asunto.lower()}. Quedo atento a su respuesta.',
+                    leido=rng.random() < 0.7,
+                ))
+            MensajeContacto.objects.bulk_create(mensajes)
+            creados += len(mensajes)
+    return creados
+
+
+def sembrar_pedidos(cantidad, usuario_ids, semilla=1, lote=1000, max_lineas=5, desde=0):
+    """Crea `cantidad` pedidos con 1 a `max_lineas` líneas, repartidos entre `usuario_ids`"""
+    rng = random.Random(semilla)
+    productos = list(Producto.objects.values_list('id', 'codigo', 'nombre', 'precio'))
+    if not productos:
+        return 0
+    estados = [Pedido.PAGADO, Pedido.PENDIENTE, Pedido.RECHAZADO, Pedido.CANCELADO]
+    creados = 0
+    with transaction.atomic():
+        for indices in _lotes(desde, cantidad, lote):
+            pedidos, lineas_por_pedido = [], []
+            for i in indices:
+                lineas = []
+                for producto_id, codigo, nombre, precio in rng.sample(productos, min(rng.randint(1, max_lineas), len(productos))):
+                    cantidad_linea = rng.randint(1, 4)
+                    lineas.append(LineaPedido(
+                        producto_id=producto_id, codigo=codigo, nombre=nombre, precio_unitario=precio,
+                        cantidad=cantidad_linea, subtotal=precio * cantidad_linea,
+                    ))
+                estado = rng.choices(estados, (80, 10, 6, 4))[0]
+                pedidos.append(Pedido(
+                    buy_order=f'SIN-{i:09d}',
+                    usuario_id=rng.choice(usuario_ids) if usuario_ids else None,
+                    total=sum(linea.subtotal for linea in lineas),
+                    estado=estado,
+                    codigo_autorizacion=f'{rng.randint(0, 999999):06d}' if estado == Pedido.PAGADO else '',
+                ))
+                lineas_por_pedido.append(lineas)
+            pedidos = Pedido.objects.bulk_create(pedidos)
+            for pedido, lineas in zip(pedidos, lineas_por_pedido):
+                for linea in lineas:
+                    linea.pedido_id = pedido.pk
+            LineaPedido.objects.bulk_create([linea for lineas in lineas_por_pedido for linea in lineas])
+            creados += len(pedidos)
+    return creados
+
+
+def sembrar_carrito(tamano, producto_ids, semilla=1):
+    """Crea la sesión de un visitante con `tamano` productos distintos en el carrito; devuelve su session_key"""
+    rng = random.Random(semilla)
+    identificador = uuid.UUID(int=rng.getrandbits(128)).hex
+    sesion = import_module(settings.SESSION_ENGINE).SessionStore()
+    sesion[CLAVE_SESION] = identificador
+    sesion.create()
+    LineaCarrito.objects.bulk_create([
+        LineaCarrito(clave=f'visitante:{identificador}', producto_id=producto_id, cantidad=rng.randint(1, 5))
+        for producto_id in rng.sample(producto_ids, min(tamano, len(producto_ids)))
+    ])
+    return sesion.session_key
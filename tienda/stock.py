@@ -0,0 +1,134 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from .catalogo import invalidar_catalogo
+from .models import Producto, ReservaStock
+
+logger = logging.getLogger(__name__)
+
+# Reservas de stock durante el pago. El descuento es un UPDATE condicional
+# (`stock = stock - n WHERE stock >= n`), atómico en la base de datos: dos
+# compradores simultáneos nunca pueden dejar el stock negativo.
+
+
+class StockInsuficiente(Exception):
+    def __init__(self, producto_id):
+        self.producto_id = producto_id
+        super().__init__(f'Stock insuficiente para el producto {producto_id}')
+
+
+def _descontar(producto_id, cantidad):
+    return Producto.objects.filter(pk=producto_id, stock__gte=cantidad).update(
+        stock=F('stock') - cantidad, actualizado=timezone.now()
+    )
+
+
+def _devolver(producto_id, cantidad):
+    Producto.objects.filter(pk=producto_id).update(stock=F('stock') + cantidad, actualizado=timezone.now())
+
+
+def reservar_stock(referencia, carrito):
+    """Aparta el stock de todo el carrito ({producto_id: cantidad}) o de nada.
+
+    Lanza StockInsuficiente si algún producto no alcanza; en ese caso no se descuenta nada.
+    """
+    liberar_reserva(referencia)  # Un reintento de pago reemplaza la reserva anterior de la misma orden
+    expira = timezone.now() + timedelta(minutes=getattr(settings, 'RESERVA_STOCK_MINUTOS', 15))
+    lineas = sorted((int(pid), cantidad) for pid, cantidad in carrito.items() if cantidad > 0)
+
+    try:
+        _reservar_lineas(referencia, lineas, expira)
+    except StockInsuficiente:
+        # Las reservas vencidas aún no liberadas pueden estar reteniendo ese stock
+        if not liberar_reservas_expiradas():
+            raise
+        _reservar_lineas(referencia, lineas, expira)
+    invalidar_catalogo()
+
+
+def _reservar_lineas(referencia, lineas, expira):
+    # Las líneas vienen ordenadas por id: dos carritos con los mismos productos
+    # bloquean las filas en el mismo orden y no pueden caer en un deadlock
+    with transaction.atomic():
+        for producto_id, cantidad in lineas:
+            if not _descontar(producto_id, cantidad):
+                raise StockInsuficiente(producto_id)  # Revierte los descuentos ya hechos
+        ReservaStock.objects.bulk_create([
+            ReservaStock(referencia=referencia, producto_id=producto_id, cantidad=cantidad, expira=expira)
+            for producto_id, cantidad in lineas
+        ])
+
+
+def confirmar_reserva(referencia):
+    """Pago autorizado: el stock ya descontado queda como venta definitiva.
+
+    Si la reserva ya se había liberado (venció mientras el comprador estaba en
+    Webpay, o la reemplazó otro pago del mismo cliente) el stock se vuelve a
+    descontar. Lanza StockInsuficiente si ya no alcanza: el cobro está hecho y
+    el pedido requiere revisión manual.
+    """
+    confirmadas = ReservaStock.objects.filter(
+        referencia=referencia, estado=ReservaStock.PENDIENTE
+    ).update(estado=ReservaStock.CONFIRMADA)
+    if confirmadas or ReservaStock.objects.filter(referencia=referencia, estado=ReservaStock.CONFIRMADA).exists():
+        return confirmadas
+    return _recuperar_liberadas(referencia)
+
+
+def _recuperar_liberadas(referencia):
+    # Solo la última reserva de la orden: las anteriores las reemplazaron reintentos de pago
+    ultima = ReservaStock.objects.filter(
+        referencia=referencia, estado=ReservaStock.LIBERADA
+    ).aggregate(expira=Max('expira'))['expira']
+    if ultima is None:
+        return 0
+
+    recuperadas, faltantes = 0, []
+    reservas = ReservaStock.objects.filter(referencia=referencia, estado=ReservaStock.LIBERADA, expira=ultima)
+    for reserva in reservas.order_by('producto_id').only('id', 'producto_id', 'cantidad'):
+        with transaction.atomic():
+            # La venta queda confirmada aunque falte stock: el pago ya se cobró
+            if ReservaStock.objects.filter(pk=reserva.pk, estado=ReservaStock.LIBERADA).update(
+                estado=ReservaStock.CONFIRMADA
+            ):
+                if _descontar(reserva.producto_id, reserva.cantidad):
+                    recuperadas += 1
+                else:
+                    faltantes.append(reserva.producto_id)
+    invalidar_catalogo()
+
+    logger.warning('Pago autorizado para %s con la reserva ya liberada: stock descontado de nuevo', referencia)
+    if faltantes:
+        logger.error('Pago autorizado para %s sin stock para los productos %s', referencia, faltantes)
+        raise StockInsuficiente(faltantes[0])
+    return recuperadas
+
+
+def liberar_reserva(referencia):
+    """Pago cancelado o rechazado: devuelve el stock de las reservas pendientes"""
+    return _liberar(ReservaStock.objects.filter(referencia=referencia))
+
+
+def liberar_reservas_expiradas():
+    """Devuelve el stock de las reservas cuyo pago nunca se confirmó"""
+    return _liberar(ReservaStock.objects.filter(expira__lt=timezone.now()))
+
+
+def _liberar(reservas):
+    liberadas = 0
+    for reserva in reservas.filter(estado=ReservaStock.PENDIENTE).only('id', 'producto_id', 'cantidad'):
+        with transaction.atomic():
+            # El cambio de estado condicional garantiza que cada reserva se devuelva una sola vez
+            if ReservaStock.objects.filter(pk=reserva.pk, estado=ReservaStock.PENDIENTE).update(
+                estado=ReservaStock.LIBERADA
+            ):
+                _devolver(reserva.producto_id, reserva.cantidad)
+                liberadas += 1
+    if liberadas:
+        invalidar_catalogo()
+    return liberadas
@@ -0,0 +1,158 @@
+import logging
+import os
+import random
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, Max, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Tarea
+
+logger = logging.getLogger(__name__)
+
+# Cola de tareas en la base de datos, sin broker externo. Encolar es un INSERT en
+# la misma transacción que el cambio que la origina: si la transacción se revierte,
+# la tarea tampoco existe. `manage.py procesar_tareas` las ejecuta con un pool de
+# hilos o de procesos.
+
+
+def tarea(max_intentos=3, espera=30):
+    """Registra una función como tarea y le agrega `.encolar(*args, **kwargs)`.
+
+    La función sigue pudiendo llamarse directamente. Ante un error se reintenta
+    hasta `max_intentos` veces, esperando `espera` segundos con backoff exponencial.
+    Los argumentos deben ser serializables a JSON (ids, no instancias).
+    """
+    def decorador(funcion):
+        funcion.es_tarea = True
+        funcion.max_intentos = max_intentos
+        funcion.espera = espera
+        funcion.nombre_tarea = f'{funcion.__module__}.{funcion.__qualname__}'
+
+        def encolar(*args, ejecutar_desde=None, **kwargs):
+            return encolar_tarea(funcion, args, kwargs, ejecutar_desde)
+
+        funcion.encolar = encolar
+        return funcion
+    return decorador
+
+
+def encolar_tarea(funcion, args=(), kwargs=None, ejecutar_desde=None):
+    if getattr(settings, 'TAREAS_SINCRONAS', False):
+        # Desarrollo sin trabajador: se ejecuta al confirmar la transacción actual
+        transaction.on_commit(lambda: funcion(*args, **(kwargs or {})))
+        return None
+    return Tarea.objects.create(
+        nombre=funcion.nombre_tarea,
+        argumentos={'args': list(args), 'kwargs': kwargs or {}},
+        max_intentos=funcion.max_intentos,
+        ejecutar_desde=ejecutar_desde or timezone.now(),
+    )
+
+
+def identificador_trabajador():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def reclamar(limite, trabajador=None):
+    """Marca como EN_CURSO hasta `limite` tareas listas y devuelve sus ids.
+
+    Cada tarea se toma con un UPDATE condicional, así dos trabajadores nunca
+    ejecutan la misma. Una tarea EN_CURSO cuyo bloqueo venció (el trabajador
+    murió) vuelve a estar disponible.
+    """
+    ahora = timezone.now()
+    trabajador = trabajador or identificador_trabajador()
+    disponibles = Q(estado=Tarea.PENDIENTE, ejecutar_desde__lte=ahora) | Q(estado=Tarea.EN_CURSO, bloqueada_hasta__lt=ahora)
+    candidatas = Tarea.objects.filter(disponibles).order_by('ejecutar_desde', 'id').values_list('id', flat=True)[:limite * 2]
+
+    reclamadas = []
+    bloqueo = ahora + timedelta(seconds=getattr(settings, 'TAREAS_TIEMPO_MAXIMO', 300))
+    for tarea_id in candidatas:
+        if Tarea.objects.filter(disponibles, pk=tarea_id).update(
+            estado=Tarea.EN_CURSO, bloqueada_hasta=bloqueo, trabajador=trabajador
+        ):
+            reclamadas.append(tarea_id)
+            if len(reclamadas) == limite:
+                break
+    return reclamadas
+
+
+def ejecutar(tarea_id):
+    """Ejecuta una tarea ya reclamada y registra el resultado, la duración y los reintentos"""
+    tarea = Tarea.objects.get(pk=tarea_id)
+    tarea.intentos += 1
+    funcion = None
+    inicio = time.perf_counter()
+    try:
+        funcion = import_string(tarea.nombre)
+        if not getattr(funcion, 'es_tarea', False):
+            raise ValueError(f'{tarea.nombre} no está registrada con @tarea')
+        funcion(*tarea.argumentos.get('args', []), **tarea.argumentos.get('kwargs', {}))
+    except Exception:
+        tarea.duracion = time.perf_counter() - inicio
+        tarea.ultimo_error = traceback.format_exc()
+        if tarea.intentos < tarea.max_intentos:
+            espera = getattr(funcion, 'espera', 30)
+            # Backoff exponencial con algo de azar para no reintentar todas a la vez
+            segundos = espera * 2 ** (tarea.intentos - 1) * random.uniform(1, 1.25)
+            tarea.estado = Tarea.PENDIENTE
+            tarea.ejecutar_desde = timezone.now() + timedelta(seconds=segundos)
+            logger.warning('Tarea %s falló (intento %s), se reintenta en %.0fs', tarea, tarea.intentos, segundos)
+        else:
+            tarea.estado = Tarea.FALLIDA
+            tarea.terminada = timezone.now()
+            logger.error('Tarea %s falló definitivamente tras %s intentos', tarea, tarea.intentos)
+    else:
+        tarea.duracion = time.perf_counter() - inicio
+        tarea.estado = Tarea.COMPLETADA
+        tarea.terminada = timezone.now()
+        tarea.ultimo_error = ''
+    # Solo se registra si el bloqueo sigue siendo de este trabajador: si la tarea pasó de
+    # TAREAS_TIEMPO_MAXIMO y otro la reclamó, el resultado de ese otro es el que vale
+    registrada = Tarea.objects.filter(
+        pk=tarea.pk, estado=Tarea.EN_CURSO, trabajador=tarea.trabajador, bloqueada_hasta=tarea.bloqueada_hasta
+    ).update(
+        intentos=tarea.intentos, estado=tarea.estado, ejecutar_desde=tarea.ejecutar_desde, bloqueada_hasta=None,
+        ultimo_error=tarea.ultimo_error, duracion=tarea.duracion, terminada=tarea.terminada,
+    )
+    if not registrada:
+        logger.warning('Tarea %s superó su tiempo máximo y fue reclamada por otro trabajador; '
+                       'no se registra este resultado', tarea)
+    tarea.bloqueada_hasta = None
+    return tarea
+
+
+def ejecutar_pendientes(limite=100):
+    """Ejecuta en este mismo proceso las tareas listas (tests, cron simple)"""
+    return [ejecutar(tarea_id) for tarea_id in reclamar(limite)]
+
+
+def metricas(desde=None):
+    """Cantidad por estado y tiempos de ejecución agrupados por función"""
+    tareas = Tarea.objects.all()
+    if desde is not None:
+        tareas = tareas.filter(creado__gte=desde)
+    return list(
+        tareas.values('nombre').annotate(
+            total=Count('id'),
+            pendientes=Count('id', filter=Q(estado=Tarea.PENDIENTE)),
+            en_curso=Count('id', filter=Q(estado=Tarea.EN_CURSO)),
+            completadas=Count('id', filter=Q(estado=Tarea.COMPLETADA)),
+            fallidas=Count('id', filter=Q(estado=Tarea.FALLIDA)),
+            duracion_media=Avg('duracion', filter=Q(estado=Tarea.COMPLETADA)),
+            duracion_maxima=Max('duracion', filter=Q(estado=Tarea.COMPLETADA)),
+        ).order_by('nombre')
+    )
+
+
+def purgar(dias):
+    """Borra las tareas terminadas hace más de `dias` días"""
+    limite = timezone.now() - timedelta(days=dias)
+    return Tarea.objects.filter(estado__in=[Tarea.COMPLETADA, Tarea.FALLIDA], terminada__lt=limite).delete()[0]
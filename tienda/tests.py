@@ -1,3 +1,1376 @@
-from django.test import TestCase
+import csv
+import json
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from importlib.util import find_spec
+import tempfile
+from io import BytesIO, StringIO
+from types import SimpleNamespace
+from unittest import skipUnless
+from unittest.mock import AsyncMock, Mock, patch
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.contrib.auth.hashers import check_password, make_password
+from django.contrib.auth.models import AnonymousUser, User
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.contrib.messages.middleware import MessageMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core import mail
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.http import HttpResponse, QueryDict
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import views
+from .busqueda import buscar_productos, obtener_backend
+from .carrito import CLAVE_SESION, AlmacenBD, AlmacenCache, CarritoOcupado, calcular_carrito, carrito_actual, fusionar_carrito
+from .catalogo import codificar_valores
+from .clientes import ImportadorClientes, formatear_rut, validar_rut
+from .confirmaciones import confirmar_idempotente
+from .divisas import ProveedorTasas, ServicioDivisas, obtener_servicio
+from .consultas import ConsultasRepetidas, DetectorConsultas, huella
+from .middleware import ConsultasRepetidasMiddleware, RendimientoMiddleware, RenovacionSesionMiddleware
+from .rendimiento import RegistroRendimiento, obtener_registro
+from .forms import ProductoForm
+from .imagenes import generar_variantes
+from .importacion import ImportadorProductos, leer_archivo, leer_csv
+from .pasarela import obtener_pasarela
+from .models import Categoria, Cliente, ConfirmacionPago, LineaCarrito, MensajeContacto, Pedido, Producto, ReservaStock, Tarea
+from .notificaciones import notificar_contacto
+from .sinteticos import sembrar_carrito, sembrar_catalogo, sembrar_clientes, sembrar_pedidos
+from .stock import StockInsuficiente, confirmar_reserva, liberar_reserva, liberar_reservas_expiradas, reservar_stock
+from .tareas import ejecutar, ejecutar_pendientes, reclamar, tarea
+
+
+def crear_productos(cantidad, categoria=None, desde=0):
+    """Crea productos de prueba con códigos válidos"""
+    categoria = categoria or Categoria.objects.create(nombre=f'Herramientas {desde}' if desde else 'Herramientas')
+    return Producto.objects.bulk_create([
+        Producto(
+            codigo=f'P-{i:05d}', nombre=f'Producto {i}', marca='Marca', modelo='M1',
+            precio=Decimal('1000.00') + i, stock=10, categoria=categoria
+        )
+        for i in range(desde, desde + cantidad)
+    ])
+
+
+def cargar_carrito(client, cantidades):
+    """Deja en el carrito del visitante del cliente de pruebas exactamente {producto_id: cantidad}"""
+    session = client.session
+    identificador = session.setdefault(CLAVE_SESION, uuid.uuid4().hex)
+    session.save()
+    almacen = AlmacenBD()
+    almacen.vaciar(f'visitante:{identificador}')
+    for producto_id, cantidad in cantidades.items():
+        almacen.fijar(f'visitante:{identificador}', producto_id, cantidad)
+
+
+class TiendaTestCase(TestCase):
+    def setUp(self):
+        # El cache en memoria sobrevive entre tests; bulk_create no dispara señales
+        cache.clear()
+
+
+class CarritoTests(TiendaTestCase):
+    def cargar_carrito(self, productos):
+        cargar_carrito(self.client, {p.id: 2 for p in productos})
+
+    def test_calcular_carrito_una_consulta(self):
+        productos = crear_productos(40)
+        carrito = {str(p.id): 2 for p in productos}
+        carrito['999999'] = 1  # Producto inexistente se ignora
+
+        with self.assertNumQueries(1):
+            resultado = calcular_carrito(carrito)
+
+        self.assertEqual(len(resultado['items']), 40)
+        self.assertEqual(resultado['total'], sum(p.precio * 2 for p in productos))
+        self.assertEqual(resultado['count'], 81)
+
+    def test_ver_carrito_consultas_constantes(self):
+        productos = crear_productos(40)
+
+        conteos = []
+        for tamano in (1, 40):
+            self.cargar_carrito(productos[:tamano])
+            self.client.get(reverse('inicio'))  # Deja la sesión renovada y en el cache
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('ver_carrito'))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.context['productos']), tamano)
+            conteos.append(len(queries))
+
+        self.assertEqual(conteos[0], conteos[1])
+
+    def test_ver_carrito_json(self):
+        productos = crear_productos(3)
+        self.cargar_carrito(productos)
+
+        response = self.client.get(reverse('ver_carrito'), {'api': 'true'})
+        data = response.json()
+        self.assertEqual(len(data['productos']), 3)
+        self.assertNotIn('producto', data['productos'][0])
+
+    def test_contexto_perezoso_sin_consultas(self):
+        productos = crear_productos(5)
+        self.cargar_carrito(productos)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('contacto'))
+        self.assertContains(response, '<span class="badge bg-danger">10</span>', html=True)
+        self.assertFalse([q for q in queries if 'tienda_producto' in q['sql']])
+
+    def test_contador_no_consulta_lineas_en_cada_pagina(self):
+        productos = crear_productos(5)
+        self.cargar_carrito(productos)
+        self.client.get(reverse('contacto'))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('contacto'))
+        self.assertContains(response, '<span class="badge bg-danger">10</span>', html=True)
+        self.assertFalse([q for q in queries if 'tienda_lineacarrito' in q['sql']])
+
+        self.client.post(reverse('agregar_carrito', args=[productos[0].id]))
+        response = self.client.get(reverse('contacto'))
+        self.assertContains(response, '<span class="badge bg-danger">11</span>', html=True)
+
+    def test_carrito_ocupado_responde_sin_error(self):
+        producto = crear_productos(1)[0]
+        with patch.object(AlmacenBD, 'agregar', side_effect=CarritoOcupado('visitante')):
+            response = self.client.post(reverse('agregar_carrito', args=[producto.id]), {}, HTTP_ACCEPT='application/json')
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(response.json()['status'], 'error')
+
+            response = self.client.post(reverse('agregar_carrito', args=[producto.id]))
+            self.assertRedirects(response, reverse('ver_carrito'))
+            self.assertIn('otra pestaña', str(list(get_messages(response.wsgi_request))[0]))
+
+
+class AlmacenCarritoTests(TiendaTestCase):
+    def preparar_request(self):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        SessionMiddleware(lambda r: None).process_request(request)
+        return request
+
+    def test_agregar_actualizar_y_quitar(self):
+        productos = crear_productos(2)
+        for almacen in (AlmacenBD(), AlmacenCache()):
+            almacen.agregar('prueba', productos[0].id, 2)
+            almacen.agregar('prueba', productos[0].id, 3)
+            almacen.fijar('prueba', productos[1].id, 7)
+            almacen.fijar('prueba', productos[1].id, 4)
+            self.assertEqual(almacen.contenido('prueba'), {str(productos[0].id): 5, str(productos[1].id): 4})
+            almacen.quitar('prueba', productos[0].id)
+            almacen.vaciar('prueba')
+            self.assertEqual(almacen.contenido('prueba'), {})
+
+    def test_cache_no_modifica_ni_libera_un_candado_ajeno(self):
+        producto = crear_productos(1)[0]
+        almacen = AlmacenCache()
+        almacen.agregar('prueba', producto.id, 1)
+        self.assertIsNone(cache.get('carrito:prueba:candado'))  # Lo liberó quien lo tomó
+
+        cache.set('carrito:prueba:candado', 'otro request', 5)
+        almacen.espera_candado = 0.05
+        with self.assertRaises(CarritoOcupado):
+            almacen.agregar('prueba', producto.id, 1)
+        self.assertEqual(cache.get('carrito:prueba:candado'), 'otro request')
+        self.assertEqual(almacen.contenido('prueba'), {str(producto.id): 1})
+        with self.assertRaises(CarritoOcupado):
+            almacen.vaciar('prueba')  # Vaciar también espera el candado
+        self.assertEqual(almacen.contenido('prueba'), {str(producto.id): 1})
+
+    def test_cache_no_escribe_si_el_candado_pudo_expirar(self):
+        producto = crear_productos(1)[0]
+        almacen = AlmacenCache()
+        almacen.margen_candado = almacen.duracion_candado  # Como si el request se hubiera demorado
+        with self.assertRaises(CarritoOcupado):
+            almacen.agregar('prueba', producto.id, 1)
+        self.assertEqual(almacen.contenido('prueba'), {})
+        self.assertIsNotNone(cache.get('carrito:prueba:candado'))  # Se deja expirar, no se borra
+
+    def test_sesion_solo_guarda_el_identificador(self):
+        producto = crear_productos(1)[0]
+        request = self.preparar_request()
+        self.assertEqual(carrito_actual(request).contenido(), {})
+        self.assertFalse(request.session.modified)  # Leer un carrito vacío no crea sesión
+
+        carrito_actual(request).agregar(producto.id, 2)
+        self.assertEqual(list(request.session.keys()), [CLAVE_SESION])
+        self.assertEqual(LineaCarrito.objects.get().cantidad, 2)
+
+    def test_carrito_anonimo_se_fusiona_al_iniciar_sesion(self):
+        productos = crear_productos(2)
+        usuario = SimpleNamespace(pk=7)
+        AlmacenBD().agregar('usuario:7', productos[0].id, 1)
+
+        request = self.preparar_request()
+        carrito_actual(request).agregar(productos[0].id, 2)
+        carrito_actual(request).agregar(productos[1].id, 1)
+        fusionar_carrito(request, usuario)
+
+        self.assertEqual(AlmacenBD().contenido('usuario:7'), {str(productos[0].id): 3, str(productos[1].id): 1})
+        self.assertFalse(LineaCarrito.objects.filter(clave__startswith='visitante:').exists())
+        self.assertNotIn(CLAVE_SESION, request.session)
+
+    def test_carrito_legado_de_la_sesion_se_migra(self):
+        producto = crear_productos(1)[0]
+        request = self.preparar_request()
+        request.session['carrito'] = {str(producto.id): 3, '999999': 1}
+        self.assertEqual(carrito_actual(request).contenido(), {str(producto.id): 3})
+        self.assertNotIn('carrito', request.session)
+
+
+class CarritoLoteTests(TiendaTestCase):
+    def enviar(self, operaciones):
+        return self.client.post(reverse('carrito_lote'), {'operaciones': operaciones}, content_type='application/json')
+
+    def test_lote_valida_en_una_consulta_y_devuelve_carrito(self):
+        productos = crear_productos(30)
+        cargar_carrito(self.client, {productos[0].id: 1, productos[1].id: 4})
+        operaciones = [{'op': 'agregar', 'producto': p.id, 'cantidad': 2} for p in productos[2:]]
+        operaciones += [
+            {'op': 'agregar', 'producto': productos[0].id},
+            {'op': 'fijar', 'producto': productos[2].id, 'cantidad': 5},
+            {'op': 'quitar', 'producto': productos[1].id},
+        ]
+
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.enviar(operaciones)
+        self.assertEqual(len([q for q in consultas if 'FROM "tienda_producto"' in q['sql']]), 1)
+
+        data = response.json()
+        cantidades = {item['producto_id']: item['cantidad'] for item in data['productos']}
+        self.assertEqual(cantidades[productos[0].id], 2)
+        self.assertEqual(cantidades[productos[2].id], 5)
+        self.assertNotIn(productos[1].id, cantidades)
+        self.assertEqual(data['count'], 2 + 5 + 2 * 27)
+
+    def test_lote_invalido_no_aplica_nada(self):
+        productos = crear_productos(2)  # stock = 10
+        response = self.enviar([
+            {'op': 'agregar', 'producto': productos[0].id, 'cantidad': 3},
+            {'op': 'fijar', 'producto': productos[1].id, 'cantidad': 11},
+            {'op': 'vender', 'producto': productos[0].id},
+            {'op': 'agregar', 'producto': 999999},
+        ])
+        self.assertEqual(response.status_code, 400)
+        errores = response.json()['errores']
+        self.assertEqual([e.get('indice') for e in errores], [2, 3, None])
+        self.assertEqual(errores[2]['producto'], productos[1].id)
+        self.assertFalse(LineaCarrito.objects.exists())
+
+
+class AplicarLoteBDTests(TiendaTestCase):
+    def aplicar(self, operaciones):
+        with DetectorConsultas() as detector:
+            AlmacenBD().aplicar('prueba', operaciones)
+        return detector.total
+
+    def test_efecto_neto_con_consultas_constantes(self):
+        productos = crear_productos(33)
+        a, b, c = (p.id for p in productos[:3])
+        AlmacenBD().agregar('prueba', a, 1)
+        AlmacenBD().agregar('prueba', b, 4)
+
+        # Una sentencia por tipo de cambio (quitar, fijar, agregar), no por operación
+        pocas = self.aplicar([('agregar', productos[3].id, 1), ('fijar', productos[4].id, 1), ('quitar', a, 0)])
+        muchas = self.aplicar([('agregar', p.id, 2) for p in productos[3:]] + [
+            ('agregar', a, 2),  # Se había quitado: vuelve a crearse
+            ('quitar', b, 0), ('agregar', b, 3),  # Quitar y volver a agregar deja solo lo nuevo
+            ('fijar', c, 5), ('agregar', c, 1),  # Agregar después de fijar suma a lo fijado
+            ('quitar', productos[4].id, 0),
+        ])
+
+        self.assertEqual(pocas, muchas)
+        contenido = AlmacenBD().contenido('prueba')
+        self.assertEqual((contenido[str(a)], contenido[str(b)], contenido[str(c)]), (2, 3, 6))
+        self.assertEqual(contenido[str(productos[3].id)], 3)  # Suma sobre la línea existente
+        self.assertEqual(contenido[str(productos[32].id)], 2)
+        self.assertNotIn(str(productos[4].id), contenido)
+
+        self.aplicar([('fijar', a, 0), ('quitar', c, 0)])
+        self.assertNotIn(str(a), AlmacenBD().contenido('prueba'))
+        self.assertNotIn(str(c), AlmacenBD().contenido('prueba'))
+
+
+class AlmacenCarritoConcurrenciaTests(TransactionTestCase):
+    def test_agregados_simultaneos_no_se_pierden(self):
+        producto = crear_productos(1)[0]
+
+        def agregar():
+            try:
+                for _ in range(5):
+                    AlmacenBD().agregar('visitante:pestanas', producto.id, 1)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=agregar) for _ in range(8)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(LineaCarrito.objects.get().cantidad, 40)
+
+
+class SesionTests(TiendaTestCase):
+    def escrituras(self, consultas):
+        return [q['sql'] for q in consultas if q['sql'].lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE'))]
+
+    def test_navegacion_anonima_no_crea_sesion(self):
+        crear_productos(3)
+        with CaptureQueriesContext(connection) as consultas:
+            for url in (reverse('inicio'), reverse('productos'), reverse('ver_carrito')):
+                self.client.get(url)
+        self.assertEqual(self.escrituras(consultas), [])
+        self.assertFalse(Session.objects.exists())
+
+    def test_expiracion_se_renueva_solo_bajo_el_umbral(self):
+        producto = crear_productos(1)[0]
+        self.client.post(reverse('agregar_carrito', args=[producto.id]))
+        self.assertEqual(Session.objects.count(), 1)
+
+        with CaptureQueriesContext(connection) as consultas:
+            for _ in range(3):
+                self.client.get(reverse('productos'))
+        self.assertFalse([sql for sql in self.escrituras(consultas) if 'django_session' in sql])
+
+        # A la sesión le queda menos que el umbral: la siguiente vista la renueva
+        session = self.client.session
+        session[RenovacionSesionMiddleware.CLAVE] -= settings.SESSION_COOKIE_AGE
+        session.save()
+        expiracion = Session.objects.get().expire_date
+        self.client.get(reverse('productos'))
+        self.assertGreater(Session.objects.get().expire_date, expiracion)
+        self.assertGreater(self.client.session[RenovacionSesionMiddleware.CLAVE], time.time() - 60)
+
+
+class CatalogoTests(TiendaTestCase):
+    def test_paginacion_keyset_recorre_todo_sin_repetir(self):
+        crear_productos(30)
+        vistos = []
+        url = reverse('productos')
+        params = {}
+        while True:
+            response = self.client.get(url, params)
+            vistos += [p.id for p in response.context['productos']]
+            siguiente = response.context['siguiente_url']
+            if not siguiente:
+                break
+            params = QueryDict(siguiente.lstrip('?'))
+
+        self.assertEqual(len(vistos), 30)
+        self.assertEqual(len(set(vistos)), 30)
+
+    def test_filtros_y_orden_por_precio(self):
+        crear_productos(10)
+        response = self.client.get(reverse('productos'), {
+            'precio_min': '1003', 'precio_max': '1006', 'orden': 'precio_desc'
+        })
+        precios = [p.precio for p in response.context['productos']]
+        self.assertEqual(precios, [Decimal('1006'), Decimal('1005'), Decimal('1004'), Decimal('1003')])
+
+    def test_cursor_invalido_vuelve_a_primera_pagina(self):
+        crear_productos(3)
+        response = self.client.get(reverse('productos'), {'cursor': 'no-es-un-cursor'})
+        self.assertEqual(len(response.context['productos']), 3)
+
+    def test_cursor_manipulado_vuelve_a_primera_pagina(self):
+        crear_productos(3)
+        for valores in (['2020-01-01 00:00:00+00:00', 'abc'], [None, 1], [[1], {'a': 1}]):
+            with self.subTest(valores=valores):
+                response = self.client.get(reverse('productos'), {'cursor': codificar_valores(valores)})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.context['productos']), 3)
+
+
+class BusquedaTests(TiendaTestCase):
+    def setUp(self):
+        super().setUp()
+        categoria = Categoria.objects.create(nombre='Herramientas')
+        self.taladro = Producto.objects.create(
+            codigo='TAL-100', nombre='Taladro percutor', marca='Bosch', modelo='GSB 13',
+            precio=Decimal('59990'), stock=5, categoria=categoria, descripcion='Taladro de 650W'
+        )
+        self.martillo = Producto.objects.create(
+            codigo='MAR-200', nombre='Martillo carpintero', marca='Stanley', modelo='ST-16',
+            precio=Decimal('8990'), stock=20, categoria=categoria, descripcion='Ideal para taladrar madera no'
+        )
+
+    def test_busqueda_por_prefijo_y_relevancia(self):
+        response = self.client.get(reverse('api_productos_buscar'), {'q': 'tala'})
+        ids = [p['id'] for p in response.json()['results']]
+        self.assertEqual(ids, [self.taladro.id, self.martillo.id])
+
+    def test_indice_sigue_cambios_y_eliminaciones(self):
+        self.martillo.nombre = 'Combo demoledor'
+        self.martillo.save()
+        response = self.client.get(reverse('productos'), {'q': 'combo'})
+        self.assertEqual(response.context['productos'], [self.martillo])
+
+        self.martillo.delete()
+        response = self.client.get(reverse('api_productos_buscar'), {'q': 'combo'})
+        self.assertEqual(response.json()['count'], 0)
+
+    @override_settings(CATALOGO_TAMANO_PAGINA=2)
+    def test_busqueda_filtrada_y_paginada(self):
+        crear_productos(250, self.taladro.categoria)  # Coincidencias fuera del filtro que llenarían el límite del motor
+        filtrados = crear_productos(3, desde=300)
+        obtener_backend().reconstruir()
+        params = {'q': 'producto', 'categoria': filtrados[0].categoria_id}
+
+        response = self.client.get(reverse('productos'), params)
+        pagina = response.context['productos']
+        self.assertEqual(len(pagina), 2)
+        response = self.client.get(reverse('productos') + response.context['siguiente_url'])
+        self.assertEqual(sorted(p.id for p in pagina + response.context['productos']), [p.id for p in filtrados])
+        self.assertIsNone(response.context['siguiente_url'])
+
+        # El admin no trunca: todas las coincidencias, acotadas por el queryset
+        self.assertEqual(obtener_backend().filtrar(Producto.objects.all(), 'producto').count(), 253)
+        self.assertFalse(obtener_backend().filtrar(Producto.objects.all(), '" OR').exists())
+
+    def test_operadores_fts_se_ignoran(self):
+        response = self.client.get(reverse('api_productos_buscar'), {'q': 'bosch" OR NEAR('})
+        self.assertEqual(response.status_code, 200)
+
+
+class CacheCatalogoTests(TiendaTestCase):
+    def test_listado_cacheado_hasta_que_cambia_el_catalogo(self):
+        producto = crear_productos(3)[0]
+        url = reverse('productos')
+        self.client.get(url)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertFalse([q for q in queries if 'tienda_producto' in q['sql']])
+        self.assertContains(response, 'Producto 0')
+
+        producto = Producto.objects.get(pk=producto.pk)
+        producto.nombre = 'Serrucho'
+        producto.save()  # post_save incrementa la versión del catálogo
+        response = self.client.get(url)
+        self.assertContains(response, 'Serrucho')
+        self.assertNotContains(response, 'Producto 0')
+
+    def test_inicio_invalida_al_eliminar_categoria(self):
+        categoria = Categoria.objects.create(nombre='Pinturas')
+        version = self.client.get(reverse('inicio')).context['catalogo_version']
+        categoria.delete()
+        self.assertGreater(self.client.get(reverse('inicio')).context['catalogo_version'], version)
+
+
+class GetCondicionalTests(TiendaTestCase):
+    def test_lista_responde_304_sin_serializar(self):
+        crear_productos(5)
+        url = reverse('api_productos')
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        with self.assertNumQueries(2):  # Solo los agregados de productos y de eliminaciones
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Producto.objects.first().delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_eliminar_cambia_last_modified(self):
+        productos = crear_productos(2)
+        url = reverse('api_productos')
+        modificado = self.client.get(url)['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=modificado).status_code, 304)
+
+        # Last-Modified tiene resolución de segundos: la eliminación debe caer en un segundo posterior
+        Producto.objects.update(actualizado=timezone.now() - timedelta(minutes=1))
+        modificado = self.client.get(url)['Last-Modified']
+        productos[0].delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=modificado).status_code, 200)
+
+    def test_detalle_y_categorias(self):
+        producto = crear_productos(1)[0]
+        url = reverse('api_producto_detalle', args=[producto.pk])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(reverse('api_producto_detalle', args=[999])).status_code, 404)
+
+        url = reverse('api_categorias')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Categoria.objects.create(nombre='Jardín')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_categorias_no_depende_del_cache_del_proceso(self):
+        categoria = Categoria.objects.create(nombre='Jardín')
+        url = reverse('api_categorias')
+        etag = self.client.get(url)['ETag']
+
+        # Otro trabajador renombra la categoría: este proceso no recibe la señal
+        with patch('tienda.signals.invalidar_catalogo'):
+            categoria.nombre = 'Jardinería'
+            categoria.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['nombre'], 'Jardinería')
+
+
+@override_settings(SINCRONIZACION_MARGEN=0)
+class SincronizacionTests(TiendaTestCase):
+    def leer_todo(self, desde='', limite=2):
+        cambios = []
+        while True:
+            data = self.client.get(reverse('api_productos_cambios'), {'desde': desde, 'limite': limite}).json()
+            cambios += data['cambios']
+            desde = data['siguiente']
+            if not data['hay_mas']:
+                return cambios, desde
+
+    def test_sincronizacion_completa_y_delta(self):
+        productos = crear_productos(5)
+        cambios, cursor = self.leer_todo()
+        self.assertEqual(sorted(c['producto']['id'] for c in cambios), sorted(p.id for p in productos))
+
+        # Sin cambios: lista vacía y el mismo cursor
+        cambios, mismo_cursor = self.leer_todo(cursor)
+        self.assertEqual(cambios, [])
+        self.assertEqual(mismo_cursor, cursor)
+
+        actualizado = Producto.objects.get(pk=productos[1].pk)
+        actualizado.precio = Decimal('1.00')
+        actualizado.save()
+        Producto.objects.get(pk=productos[3].pk).delete()
+
+        cambios, _ = self.leer_todo(cursor)
+        self.assertEqual([c['tipo'] for c in cambios], ['actualizado', 'eliminado'])
+        self.assertEqual(cambios[0]['producto']['precio'], '1.00')
+        self.assertEqual(cambios[1]['codigo'], productos[3].codigo)
+
+
+class ExportacionTests(TiendaTestCase):
+    def test_exportar_csv_y_ndjson(self):
+        crear_productos(3)
+        salida = StringIO()
+        call_command('exportar_productos', '--chunk-size', '2', stdout=salida)
+        filas = list(csv.reader(StringIO(salida.getvalue())))
+        self.assertEqual(filas[0][:3], ['id', 'codigo', 'nombre'])
+        self.assertEqual(len(filas), 4)
+
+        salida = StringIO()
+        call_command('exportar_productos', '--formato', 'ndjson', stdout=salida)
+        lineas = [json.loads(linea) for linea in salida.getvalue().splitlines()]
+        self.assertEqual({l['categoria'] for l in lineas}, {'Herramientas'})
+
+
+class ImportacionTests(TiendaTestCase):
+    def test_upsert_por_codigo_con_errores_por_fila(self):
+        Categoria.objects.create(nombre='Herramientas')
+        existente = crear_productos(1, Categoria.objects.create(nombre='Otros'))[0]
+        archivo = StringIO(
+            'codigo,nombre,marca,modelo,precio,stock,categoria,descripcion\n'
+            f'{existente.codigo},Nuevo nombre,Bosch,X1,1500,,herramientas,\n'
+            'tal-1,Taladro,Bosch,GSB,59990,3,Herramientas,Percutor\n'
+            'MAL CODIGO,Sierra,Makita,S1,100,1,Herramientas,\n'
+            'SIE-1,Sierra,Makita,S1,-5,1,Herramientas,\n'
+            'SIE-2,Sierra,Makita,S1,100,1,Inexistente,\n'
+        )
+        resultado = ImportadorProductos(tamano_lote=2).importar(leer_csv(archivo))
+
+        self.assertEqual((resultado.filas, resultado.importadas), (5, 2))
+        self.assertEqual([fila for fila, _ in resultado.errores], [4, 5, 6])
+        existente.refresh_from_db()
+        # La celda de stock vacía no pisa el stock existente
+        self.assertEqual((existente.nombre, existente.precio, existente.stock), ('Nuevo nombre', Decimal('1500'), 10))
+        self.assertEqual(Producto.objects.get(codigo='TAL-1').categoria.nombre, 'Herramientas')
+        # Los productos importados quedan en el índice de búsqueda
+        self.assertEqual(buscar_productos('percutor'), [Producto.objects.get(codigo='TAL-1')])
+
+    def test_lista_de_precios_solo_actualiza_sus_columnas(self):
+        categoria = Categoria.objects.create(nombre='Herramientas')
+        a, b = crear_productos(2, categoria)
+        Producto.objects.filter(pk=a.pk).update(descripcion='Con batería')
+        usuario = User.objects.create_user('staff', password='x', is_staff=True)
+        self.client.force_login(usuario)
+        archivo = SimpleUploadedFile('precios.csv', (
+            'codigo,nombre,marca,modelo,precio,categoria\n'
+            f'{a.codigo},{a.nombre},Marca,M1,2000,Herramientas\n'
+            f'{b.codigo},{b.nombre},Marca,M1,3000,Herramientas\n'
+        ).encode())
+
+        # Un tamaño de lote inválido usa el valor por defecto en vez de fallar
+        respuesta = self.client.post(reverse('importar_productos'), {'archivo': archivo, 'lote': 'abc'})
+
+        self.assertEqual(respuesta.json()['importadas'], 2)
+        a.refresh_from_db()
+        self.assertEqual((a.precio, a.stock, a.descripcion), (Decimal('2000'), 10, 'Con batería'))
+        # El índice de búsqueda conserva la descripción que el archivo no traía
+        self.assertEqual(buscar_productos('batería'), [a])
+
+
+class ReservaStockTests(TiendaTestCase):
+    def test_reserva_todo_o_nada_y_liberacion(self):
+        a, b = crear_productos(2)
+        with self.assertRaises(StockInsuficiente):
+            reservar_stock('ORD-1', {str(a.id): 5, str(b.id): 11})
+        a.refresh_from_db()
+        self.assertEqual(a.stock, 10)  # El descuento de `a` se revirtió
+
+        reservar_stock('ORD-1', {str(a.id): 5, str(b.id): 10})
+        b.refresh_from_db()
+        self.assertEqual(b.stock, 0)
+
+        self.assertEqual(liberar_reserva('ORD-1'), 2)
+        self.assertEqual(liberar_reserva('ORD-1'), 0)  # Liberar dos veces no duplica el stock
+        b.refresh_from_db()
+        self.assertEqual(b.stock, 10)
+
+    def test_confirmar_y_expirar(self):
+        producto = crear_productos(1)[0]
+        reservar_stock('ORD-1', {str(producto.id): 4})
+        self.assertEqual(confirmar_reserva('ORD-1'), 1)
+        self.assertEqual(liberar_reserva('ORD-1'), 0)  # Una venta confirmada no se devuelve
+
+        reservar_stock('ORD-2', {str(producto.id): 6})
+        ReservaStock.objects.filter(referencia='ORD-2').update(expira=timezone.now() - timedelta(minutes=1))
+        # Sin stock libre, la nueva reserva libera las vencidas y reintenta
+        reservar_stock('ORD-3', {str(producto.id): 6})
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock, 0)
+        self.assertEqual(ReservaStock.objects.get(referencia='ORD-2').estado, ReservaStock.LIBERADA)
+
+
+    def test_reserva_liberada_y_luego_autorizada(self):
+        producto = crear_productos(1)[0]  # stock = 10
+        reservar_stock('ORD-1', {str(producto.id): 4})
+        ReservaStock.objects.update(expira=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(liberar_reservas_expiradas(), 1)  # Venció mientras el comprador estaba en Webpay
+
+        with self.assertLogs('tienda.stock', 'WARNING'):
+            self.assertEqual(confirmar_reserva('ORD-1'), 1)
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock, 6)  # Se volvió a descontar
+        self.assertEqual(ReservaStock.objects.get().estado, ReservaStock.CONFIRMADA)
+        self.assertEqual(confirmar_reserva('ORD-1'), 0)  # Confirmar de nuevo no descuenta otra vez
+        self.assertEqual(Producto.objects.get(pk=producto.pk).stock, 6)
+
+    def test_reserva_liberada_sin_stock_al_autorizar(self):
+        producto = crear_productos(1)[0]
+        reservar_stock('ORD-1', {str(producto.id): 4})
+        liberar_reserva('ORD-1')  # Otro pago del mismo cliente la reemplazó
+        reservar_stock('ORD-2', {str(producto.id): 10})
+
+        with self.assertLogs('tienda.stock', 'ERROR'), self.assertRaises(StockInsuficiente):
+            confirmar_reserva('ORD-1')
+        self.assertEqual(Producto.objects.get(pk=producto.pk).stock, 0)  # Nunca negativo
+
+
+class ReservaStockConcurrenciaTests(TransactionTestCase):
+    def test_muchos_hilos_contra_un_sku_no_sobrevenden(self):
+        producto = crear_productos(1)[0]  # stock = 10
+        resultados = []
+
+        def comprar(numero):
+            try:
+                reservar_stock(f'ORD-{numero}', {str(producto.id): 1})
+                resultados.append(True)
+            except StockInsuficiente:
+                resultados.append(False)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=comprar, args=(i,)) for i in range(25)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        producto.refresh_from_db()
+        self.assertEqual(resultados.count(True), 10)
+        self.assertEqual(producto.stock, 0)
+        self.assertEqual(ReservaStock.objects.count(), 10)
+
+
+class PedidoTests(TiendaTestCase):
+    def test_pedido_con_precios_congelados_y_estado_actualizado(self):
+        productos = crear_productos(3)
+        cargar_carrito(self.client, {p.id: 2 for p in productos})
+
+        with patch('tienda.views.obtener_pasarela') as pasarela:
+            pasarela.return_value.crear.return_value = {'url': 'https://webpay.test/pagar', 'token': 'tok'}
+            response = self.client.get(reverse('webpay_pagar'))
+        self.assertEqual(response.status_code, 302)
+
+        pedido = Pedido.objects.get()
+        self.assertEqual(pedido.estado, Pedido.PENDIENTE)
+        self.assertEqual(pedido.total, sum(p.precio * 2 for p in productos))
+        self.assertEqual(pedido.lineas.count(), 3)
+
+        # Un cambio de precio posterior no altera el pedido
+        Producto.objects.filter(pk=productos[0].pk).update(precio=1)
+
+        with patch('tienda.views.obtener_pasarela') as pasarela:
+            pasarela.return_value.confirmar.return_value = {
+                'status': 'AUTHORIZED', 'buy_order': pedido.buy_order, 'authorization_code': '1213'
+            }
+            self.client.get(reverse('webpay_confirmacion'), {'token_ws': 'tok'})
+
+        pedido.refresh_from_db()
+        self.assertEqual((pedido.estado, pedido.codigo_autorizacion), (Pedido.PAGADO, '1213'))
+        self.assertEqual(pedido.lineas.get(producto=productos[0]).precio_unitario, productos[0].precio)
+        self.assertEqual(Producto.objects.get(pk=productos[1].pk).stock, 8)
+        self.assertEqual(ReservaStock.objects.get(producto=productos[1]).estado, ReservaStock.CONFIRMADA)
+
+
+    def test_pedido_cancelado_y_luego_autorizado_queda_en_revision(self):
+        producto = crear_productos(1)[0]
+        Pedido.objects.create(buy_order='ORD-1', total=4000, estado=Pedido.CANCELADO)
+        reservar_stock('ORD-1', {str(producto.id): 4})
+        liberar_reserva('ORD-1')
+        Producto.objects.filter(pk=producto.pk).update(stock=1)  # Lo compró otro cliente
+
+        with patch('tienda.views.obtener_pasarela') as pasarela, self.assertLogs('tienda.stock', 'ERROR'):
+            pasarela.return_value.confirmar.return_value = {
+                'status': 'AUTHORIZED', 'buy_order': 'ORD-1', 'authorization_code': '1213'
+            }
+            self.client.get(reverse('webpay_confirmacion'), {'token_ws': 'tok'})
+
+        pedido = Pedido.objects.get()
+        self.assertEqual((pedido.estado, pedido.codigo_autorizacion), (Pedido.REVISION, '1213'))
+
+
+class ConfirmacionIdempotenteTests(TiendaTestCase):
+    def test_token_repetido_no_vuelve_a_llamar_a_webpay(self):
+        respuesta = {'status': 'AUTHORIZED', 'buy_order': 'ORD-1', 'amount': 1000, 'authorization_code': '1213'}
+        with patch('tienda.views.obtener_pasarela') as pasarela:
+            pasarela.return_value.confirmar.return_value = respuesta
+            primera = self.client.get(reverse('webpay_confirmacion'), {'token_ws': 'tok'})
+            segunda = self.client.get(reverse('webpay_confirmacion'), {'token_ws': 'tok'})
+
+        pasarela.return_value.confirmar.assert_called_once_with('tok')
+        self.assertContains(primera, 'Pago Exitoso')
+        self.assertContains(segunda, 'Pago Exitoso')
+        self.assertEqual(ConfirmacionPago.objects.get(token='tok').respuesta, respuesta)
+
+    def test_error_de_webpay_permite_reintentar(self):
+        with patch('tienda.views.obtener_pasarela') as pasarela:
+            pasarela.return_value.confirmar.side_effect = [TimeoutError('sin respuesta'), {'status': 'FAILED'}]
+            self.client.get(reverse('webpay_confirmacion'), {'token_ws': 'tok'})
+            self.assertFalse(ConfirmacionPago.objects.exists())
+            self.client.get(reverse('webpay_confirmacion'), {'token_ws': 'tok'})
+
+        self.assertEqual(pasarela.return_value.confirmar.call_count, 2)
+        self.assertEqual(ConfirmacionPago.objects.get().estado, ConfirmacionPago.COMPLETADA)
+
+
+class ConfirmacionConcurrenciaTests(TransactionTestCase):
+    def test_confirmaciones_simultaneas_llaman_una_vez(self):
+        llamadas = []
+
+        def confirmar(token):
+            llamadas.append(token)
+            time.sleep(0.2)  # Simula la latencia del commit mientras llegan los reintentos
+            return {'status': 'AUTHORIZED', 'buy_order': 'ORD-1'}
+
+        resultados = []
+
+        def confirmar_en_hilo():
+            try:
+                resultados.append(confirmar_idempotente('tok', confirmar))
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=confirmar_en_hilo) for _ in range(5)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(llamadas, ['tok'])
+        self.assertEqual(len(resultados), 5)
+        self.assertTrue(all(r == {'status': 'AUTHORIZED', 'buy_order': 'ORD-1'} for r in resultados))
+
+
+@override_settings(WEBPAY_PASARELA='tienda.pasarela.PasarelaFalsa', WEBPAY_FALSA_LATENCIA=0)
+class PasarelaTests(TiendaTestCase):
+    def setUp(self):
+        super().setUp()
+        obtener_pasarela.cache_clear()
+        self.addCleanup(obtener_pasarela.cache_clear)
+
+    def preparar_request(self, path, carrito=None, **params):
+        request = RequestFactory().get(path, params)
+        request.user = AnonymousUser()
+        SessionMiddleware(lambda r: None).process_request(request)
+        MessageMiddleware(lambda r: None).process_request(request)
+        if carrito is not None:
+            request.session['carrito'] = carrito
+            request.session.save()
+        return request
+
+    def test_pasarela_reutilizada_por_proceso(self):
+        self.assertIs(obtener_pasarela(), obtener_pasarela())
+
+    def test_flujo_async_con_pasarela_falsa(self):
+        producto = crear_productos(1)[0]
+        request = self.preparar_request(reverse('webpay_pagar'), {str(producto.id): 3})
+        response = async_to_sync(views.iniciar_pago_async)(request)
+        self.assertEqual(response.status_code, 302)
+        token = QueryDict(response['Location'].split('?')[1])['token_ws']
+
+        request = self.preparar_request(reverse('webpay_confirmacion'), token_ws=token)
+        response = async_to_sync(views.confirmar_pago_async)(request)
+        self.assertContains(response, 'Pago Exitoso')
+        self.assertEqual(Pedido.objects.get().estado, Pedido.PAGADO)
+        self.assertEqual(Producto.objects.get(pk=producto.pk).stock, 7)
+
+
+@override_settings(DIVISAS_PROVEEDOR='tienda.divisas.ProveedorArchivo', DIVISAS_OPCIONES={})
+class DivisasTests(TiendaTestCase):
+    def setUp(self):
+        super().setUp()
+        obtener_servicio.cache_clear()
+        self.addCleanup(obtener_servicio.cache_clear)
+
+    def test_ambos_endpoints_usan_la_misma_tasa(self):
+        # tienda/datos/tasas_cambio.json: 1 USD = 950 CLP
+        response = self.client.get(reverse('convertir_moneda'), {'monto': '2'})
+        self.assertEqual(response.json()['monto_convertido'], 1900)
+        self.assertEqual(response.json()['tasa'], 950)
+
+        response = self.client.get(reverse('api_moneda'), {'clp': '9500'})
+        self.assertEqual(response.json()['valor_usd'], 10.0)
+
+        response = self.client.get(reverse('api_moneda'), {'clp': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_tasa_vencida_se_sirve_mientras_se_actualiza(self):
+        proveedor = Mock(spec=ProveedorTasas)
+        proveedor.obtener.side_effect = [{'USD': Decimal('900')}, {'USD': Decimal('1000')}]
+        servicio = ServicioDivisas(proveedor, ttl=60)
+
+        self.assertEqual(servicio.tasa('USD'), Decimal('900'))
+        self.assertEqual(servicio.tasa('USD'), Decimal('900'))  # Fresca: no vuelve a consultar
+        self.assertEqual(proveedor.obtener.call_count, 1)
+
+        servicio._local['obtenido'] -= 120
+        cache.delete('divisas:tasas')
+        self.assertEqual(servicio.tasa('USD'), Decimal('900'))  # La vencida, sin esperar
+        with servicio._lock:  # El hilo de actualización suelta el lock al terminar
+            pass
+        self.assertEqual(servicio.tasa('USD'), Decimal('1000'))
+        self.assertEqual(proveedor.obtener.call_count, 2)
+
+    def test_catalogo_en_dolares(self):
+        crear_productos(2)
+        with self.assertNumQueries(2):  # Productos y categorías; la conversión no consulta la base
+            response = self.client.get(reverse('productos'), {'moneda': 'usd'})
+        precios = {p.precio: p.precio_moneda for p in response.context['productos']}
+        self.assertEqual(precios, {Decimal('1000.00'): Decimal('1.05'), Decimal('1001.00'): Decimal('1.05')})
+        self.assertContains(response, 'USD 1.05')
+
+    def test_conversion_masiva_de_montos_y_productos(self):
+        response = self.client.post(reverse('api_moneda_lote'), {
+            'moneda': 'usd', 'montos': ['950', '1424.99', '1425', '0']
+        }, content_type='application/json')
+        # Redondeo comercial (ROUND_HALF_UP) a 2 decimales
+        self.assertEqual([m['valor'] for m in response.json()['montos']], ['1.00', '1.50', '1.50', '0.00'])
+
+        productos = crear_productos(3)
+        ids = [productos[2].id, productos[0].id, 999999]
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse('api_moneda_lote'), {
+                'moneda': 'USD', 'productos': ids
+            }, content_type='application/json')
+        data = response.json()
+        self.assertEqual([p['id'] for p in data['productos']], ids[:2])
+        self.assertEqual((data['productos'][0]['precio_clp'], data['productos'][0]['precio']), ('1002.00', '1.05'))
+        self.assertEqual(data['no_encontrados'], [999999])
+
+        response = self.client.post(reverse('api_moneda_lote'), {'moneda': 'USD'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ImagenesTests(TiendaTestCase):
+    def setUp(self):
+        super().setUp()
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(MEDIA_ROOT=directorio.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def imagen(self, ancho=1000, alto=500):
+        contenido = BytesIO()
+        Image.new('RGBA', (ancho, alto), (200, 50, 50, 128)).save(contenido, format='PNG')
+        return SimpleUploadedFile('taladro.png', contenido.getvalue(), content_type='image/png')
+
+    def test_variantes_webp_y_jpeg_sin_ampliar(self):
+        producto = crear_productos(1)[0]
+        producto.imagen = self.imagen()
+        producto.save()
+
+        variantes = generar_variantes(producto.pk)
+        self.assertEqual(sorted(variantes['webp'], key=int), ['160', '400', '800'])
+        with default_storage.open(variantes['jpeg']['400']) as archivo:
+            self.assertEqual(Image.open(archivo).size, (400, 200))
+
+        producto.refresh_from_db()
+        self.assertIn('taladro__160w.webp 160w', producto.srcset_webp)
+        self.assertTrue(producto.imagen_src.endswith('taladro__400w.jpg'))
+
+        response = self.client.get(reverse('productos'))
+        self.assertContains(response, 'type="image/webp"')
+        response = self.client.get(reverse('api_producto_detalle', args=[producto.pk]))
+        self.assertTrue(response.json()['imagenes']['jpeg']['800'].startswith('http://testserver/media/'))
+
+        # Imagen más chica que el mayor ancho: se agrega su ancho original y no se amplía
+        producto.imagen = self.imagen(300, 300)
+        producto.save()
+        self.assertEqual(sorted(generar_variantes(producto.pk)['webp'], key=int), ['160', '300'])
+        self.assertFalse(default_storage.exists(variantes['webp']['800']))  # Se borran las de la imagen anterior
+
+    def test_formulario_programa_variantes_al_subir_imagen(self):
+        categoria = Categoria.objects.create(nombre='Herramientas')
+        datos = {
+            'codigo': 'TAL-1', 'nombre': 'Taladro', 'marca': 'Bosch', 'modelo': 'X',
+            'precio': '1000', 'stock': '3', 'categoria': categoria.id,
+        }
+        with patch('tienda.forms.programar_variantes') as programar:
+            form = ProductoForm(datos, {'imagen': self.imagen()})
+            producto = form.save()
+            programar.assert_called_once_with(producto.pk, [])
+
+            form = ProductoForm({**datos, 'stock': '4'}, instance=producto)
+            form.save()
+            programar.assert_called_once()  # Sin imagen nueva no se vuelve a procesar
+
+    @override_settings(TAREAS_SINCRONAS=True)
+    def test_reemplazar_imagen_desde_formulario_borra_variantes_anteriores(self):
+        categoria = Categoria.objects.create(nombre='Herramientas')
+        datos = {
+            'codigo': 'TAL-1', 'nombre': 'Taladro', 'marca': 'Bosch', 'modelo': 'X',
+            'precio': '1000', 'stock': '3', 'categoria': categoria.id,
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            producto = ProductoForm(datos, {'imagen': self.imagen()}).save()
+        producto.refresh_from_db()
+        anteriores = producto.imagen_variantes
+        actualizado = producto.actualizado
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductoForm(datos, {'imagen': self.imagen(300, 300)}, instance=producto).save()
+        producto.refresh_from_db()
+        self.assertEqual(sorted(producto.imagen_variantes['webp'], key=int), ['160', '300'])
+        self.assertGreater(producto.actualizado, actualizado)  # Los clientes sincronizados ven el cambio
+        self.assertFalse(default_storage.exists(anteriores['webp']['800']))
+        self.assertFalse(default_storage.exists(anteriores['jpeg']['160']))
+
+
+EJECUTADAS = []
+
+
+@tarea(max_intentos=2, espera=10)
+def tarea_de_prueba(valor, fallar=False):
+    if fallar:
+        raise RuntimeError('falla de prueba')
+    EJECUTADAS.append(valor)
+
+
+@tarea()
+def tarea_que_se_demora(tarea_id):
+    # Mientras corre vence su bloqueo y otro trabajador la reclama
+    Tarea.objects.filter(pk=tarea_id).update(trabajador='otro', bloqueada_hasta=timezone.now() + timedelta(minutes=5))
+
+
+class TareasTests(TiendaTestCase):
+    def setUp(self):
+        super().setUp()
+        EJECUTADAS.clear()
+
+    def test_encolar_y_ejecutar(self):
+        registro = tarea_de_prueba.encolar(7)
+        self.assertEqual(registro.estado, Tarea.PENDIENTE)
+        self.assertEqual(EJECUTADAS, [])  # Encolar no ejecuta
+
+        ejecutar_pendientes()
+        registro.refresh_from_db()
+        self.assertEqual(EJECUTADAS, [7])
+        self.assertEqual(registro.estado, Tarea.COMPLETADA)
+        self.assertIsNotNone(registro.duracion)
+        self.assertEqual(ejecutar_pendientes(), [])
+
+    def test_reintento_con_espera_y_falla_definitiva(self):
+        registro = tarea_de_prueba.encolar(1, fallar=True)
+        ejecutar_pendientes()
+        registro.refresh_from_db()
+        self.assertEqual((registro.estado, registro.intentos), (Tarea.PENDIENTE, 1))
+        self.assertGreaterEqual(registro.ejecutar_desde, timezone.now() + timedelta(seconds=9))
+        self.assertIn('falla de prueba', registro.ultimo_error)
+        self.assertEqual(ejecutar_pendientes(), [])  # Aún no se cumple la espera
+
+        Tarea.objects.filter(pk=registro.pk).update(ejecutar_desde=timezone.now())
+        ejecutar_pendientes()
+        registro.refresh_from_db()
+        self.assertEqual((registro.estado, registro.intentos), (Tarea.FALLIDA, 2))
+
+    def test_tarea_abandonada_se_vuelve_a_reclamar(self):
+        registro = tarea_de_prueba.encolar(3)
+        self.assertEqual(reclamar(10, 'a'), [registro.pk])
+        self.assertEqual(reclamar(10, 'b'), [])  # Nadie más la toma mientras está bloqueada
+
+        Tarea.objects.filter(pk=registro.pk).update(bloqueada_hasta=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(reclamar(10, 'b'), [registro.pk])
+
+    def test_resultado_no_pisa_a_quien_la_reclamo_despues(self):
+        registro = tarea_que_se_demora.encolar(None)
+        Tarea.objects.filter(pk=registro.pk).update(argumentos={'args': [registro.pk], 'kwargs': {}})
+        self.assertEqual(reclamar(10, 'a'), [registro.pk])
+
+        ejecutar(registro.pk)
+        registro.refresh_from_db()
+        self.assertEqual((registro.estado, registro.trabajador, registro.intentos), (Tarea.EN_CURSO, 'otro', 0))
+
+    @override_settings(CONTACTO_DESTINATARIOS=['ventas@ferremas.cl'])
+    def test_contacto_envia_correos_desde_la_cola(self):
+        datos = {'nombre': 'Ana', 'email': 'ana@example.com', 'asunto': 'Cotización', 'mensaje': 'Hola'}
+        self.client.post(reverse('contacto'), datos)
+        self.assertEqual(len(mail.outbox), 0)  # La respuesta no espera al correo
+
+        ejecutar_pendientes()
+        self.assertEqual(sorted(correo.to[0] for correo in mail.outbox), ['ana@example.com', 'ventas@ferremas.cl'])
+        self.assertEqual(MensajeContacto.objects.count(), 1)
+
+    def test_contacto_sin_tarea_no_guarda_el_mensaje(self):
+        datos = {'nombre': 'Ana', 'email': 'ana@example.com', 'asunto': 'Cotización', 'mensaje': 'Hola'}
+        with patch.object(notificar_contacto, 'encolar', side_effect=RuntimeError('cola caída')):
+            with self.assertRaises(RuntimeError):
+                self.client.post(reverse('contacto'), datos)
+        self.assertFalse(MensajeContacto.objects.exists())
+
+
+class ProcesarTareasTests(TransactionTestCase):
+    def test_comando_procesa_las_tareas_listas(self):
+        EJECUTADAS.clear()
+        for valor in range(5):
+            tarea_de_prueba.encolar(valor)
+        call_command('procesar_tareas', '--una-vez', '--concurrencia', '2', stdout=StringIO())
+
+        self.assertEqual(sorted(EJECUTADAS), list(range(5)))
+        self.assertEqual(Tarea.objects.filter(estado=Tarea.COMPLETADA).count(), 5)
+
+    def test_error_inesperado_no_detiene_al_trabajador(self):
+        EJECUTADAS.clear()
+        registros = [tarea_de_prueba.encolar(valor) for valor in range(3)]
+
+        def ejecutar_o_fallar(tarea_id):
+            if tarea_id == registros[0].pk:
+                raise DatabaseError('conexión perdida')
+            return ejecutar(tarea_id)
+
+        errores = StringIO()
+        with patch('tienda.management.commands.procesar_tareas.ejecutar', ejecutar_o_fallar), \
+                self.assertLogs('tienda.management.commands.procesar_tareas', 'ERROR'):
+            call_command('procesar_tareas', '--una-vez', '--concurrencia', '1', stdout=StringIO(), stderr=errores)
+
+        self.assertEqual(sorted(EJECUTADAS), [1, 2])
+        self.assertIn(f'#{registros[0].pk}', errores.getvalue())
+        self.assertEqual(Tarea.objects.get(pk=registros[0].pk).estado, Tarea.EN_CURSO)  # Se reintentará
+
+
+class RendimientoTests(TiendaTestCase):
+    def setUp(self):
+        super().setUp()
+        obtener_registro().reiniciar()
+
+    def test_server_timing_y_registro_por_vista(self):
+        crear_productos(3)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('productos'))
+        self.assertIn(f'desc="{len(consultas)} consultas"', response['Server-Timing'])
+        self.assertIn('tpl;dur=', response['Server-Timing'])
+
+        resumen = obtener_registro().resumen()['productos']
+        self.assertEqual(resumen['requests'], 1)
+        self.assertEqual(resumen['consultas'][0.5], len(consultas))
+        self.assertEqual(resumen['bytes'][0.99], len(response.content))
+        self.assertGreater(resumen['tiempo_plantillas'][0.5], 0)
+
+    def test_mide_tambien_bajo_asgi(self):
+        crear_productos(3)
+        self.assertTrue(iscoroutinefunction(RendimientoMiddleware(AsyncMock())))
+        response = async_to_sync(self.async_client.get)(reverse('productos'))
+
+        self.assertEqual(response.status_code, 200)
+        resumen = obtener_registro().resumen()['productos']
+        self.assertGreater(resumen['consultas'][0.5], 0)  # El wrapper alcanza las consultas hechas en sync_to_async
+        self.assertGreater(resumen['tiempo_plantillas'][0.5], 0)
+        self.assertIn('db;dur=', response['Server-Timing'])
+
+    def test_percentiles_y_formato_prometheus(self):
+        registro = RegistroRendimiento(ventana=100)
+        for i in range(1, 201):  # Solo quedan las últimas 100: 101..200
+            registro.registrar('productos', {
+                'duracion': i / 1000, 'consultas': i, 'tiempo_bd': 0, 'tiempo_plantillas': 0, 'bytes': 10,
+            })
+        self.assertEqual(registro.resumen()['productos']['consultas'], {0.5: 151, 0.95: 196, 0.99: 200})
+
+        texto = registro.prometheus()
+        self.assertIn('ferremas_request_consultas{vista="productos",quantile="0.95"} 196', texto)
+        self.assertIn('ferremas_request_consultas_count{vista="productos"} 200', texto)
+        self.assertIn('# TYPE ferremas_request_duracion_segundos summary', texto)
+
+    @override_settings(RENDIMIENTO_PRESUPUESTO_CONSULTAS=0)
+    def test_advierte_al_exceder_presupuesto_de_consultas(self):
+        crear_productos(1)
+        with self.assertLogs('tienda.middleware', 'WARNING') as logs:
+            self.client.get(reverse('productos'))
+        self.assertIn('Presupuesto de consultas excedido en productos', logs.output[0])
+
+    def test_metricas_solo_para_administradores(self):
+        self.client.get(reverse('inicio'))
+        self.assertEqual(self.client.get(reverse('metricas')).status_code, 302)
+
+        request = RequestFactory().get(reverse('metricas'))
+        request.user = SimpleNamespace(is_authenticated=True, is_staff=False)
+        with self.assertRaises(PermissionDenied):
+            views.metricas(request)
+        request.user.is_staff = True
+        response = views.metricas(request)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn('vista="inicio"', response.content.decode())
+
+
+class ConsultasRepetidasTests(TiendaTestCase):
+    """Las vistas principales hacen las mismas consultas con 2 que con 30 productos"""
+
+    def setUp(self):
+        super().setUp()
+        self.creados = 0
+
+    def medir(self, url):
+        self.client.get(url)  # La primera visita crea y renueva la sesión
+        cache.clear()  # Sin fragmentos cacheados: se mide el peor caso
+        with DetectorConsultas(umbral=2) as detector:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        detector.verificar()
+        return detector.total
+
+    def assertConsultasConstantes(self, url, preparar=None, tamanos=(2, 30)):
+        conteos = []
+        for tamano in tamanos:
+            productos = crear_productos(tamano - self.creados, desde=self.creados)
+            self.creados = tamano
+            if preparar:
+                preparar(productos)
+            conteos.append(self.medir(url))
+        self.assertEqual(conteos[0], conteos[-1], f'{url}: las consultas crecen con los datos ({conteos})')
+
+    def test_detector_senala_la_consulta_repetida_y_su_origen(self):
+        productos = crear_productos(4)
+        with DetectorConsultas(umbral=3) as detector:
+            for producto in productos:
+                Producto.objects.get(pk=producto.pk)
+        self.assertEqual(len(detector.repetidas()), 1)
+        with self.assertRaisesMessage(ConsultasRepetidas, 'tests.py'):
+            detector.verificar()
+        self.assertEqual(
+            huella('SELECT * FROM t WHERE id IN (%s, %s) AND nombre = \'x\''),
+            huella('SELECT * FROM t WHERE id IN (%s) AND nombre = \'y\''),
+        )
+
+    @override_settings(CONSULTAS_REPETIDAS_UMBRAL=3)
+    def test_middleware_asincrono(self):
+        productos = crear_productos(4)
+
+        async def vista(request):
+            await sync_to_async(lambda: [Producto.objects.get(pk=p.pk) for p in productos])()
+            return HttpResponse()
+
+        middleware = ConsultasRepetidasMiddleware(vista)
+        self.assertTrue(iscoroutinefunction(middleware))
+        with self.assertLogs('tienda.middleware', 'WARNING') as logs:
+            async_to_sync(middleware)(RequestFactory().get('/'))
+        self.assertIn('4x SELECT', logs.output[0])
+
+    def test_inicio(self):
+        self.assertConsultasConstantes(reverse('inicio'))
+
+    def test_lista_productos(self):
+        self.assertConsultasConstantes(reverse('productos'))
+        self.assertConsultasConstantes(reverse('productos') + '?orden=precio_desc&q=Producto', tamanos=(32, 60))
+
+    def test_ver_carrito(self):
+        cargados = {}
+
+        def llenar_carrito(productos):
+            cargados.update({p.id: 1 for p in productos})
+            cargar_carrito(self.client, cargados)
+
+        self.assertConsultasConstantes(reverse('ver_carrito'), llenar_carrito)
+
+    def test_api_listados(self):
+        self.assertConsultasConstantes(reverse('api_productos'))
+        self.assertConsultasConstantes(reverse('api_categorias'), tamanos=(32, 60))
+
+
+class SinteticosTests(TiendaTestCase):
+    def test_catalogo_reproducible_y_buscable(self):
+        self.assertEqual(sembrar_catalogo(productos=120, categorias=7, semilla=3, lote=50), (7, 120))
+        primera = list(Producto.objects.order_by('codigo').values_list('codigo', 'nombre', 'precio', 'categoria__nombre'))
+        for producto in Producto.objects.all()[:5]:
+            producto.full_clean()  # Códigos y precios válidos para el modelo
+
+        Producto.objects.all().delete()
+        sembrar_catalogo(productos=120, categorias=7, semilla=3, lote=50)
+        segunda = list(Producto.objects.order_by('codigo').values_list('codigo', 'nombre', 'precio', 'categoria__nombre'))
+        self.assertEqual(primera, segunda)
+        self.assertTrue(buscar_productos('taladro'))
+
+    def test_carrito_sembrado_se_ve_en_la_sesion(self):
+        sembrar_catalogo(productos=30, categorias=2)
+        sesion = sembrar_carrito(8, list(Producto.objects.values_list('id', flat=True)))
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = sesion
+        self.assertEqual(len(self.client.get(reverse('ver_carrito')).context['productos']), 8)
+
+    def test_clientes_con_rut_valido_y_pedidos(self):
+        self.assertEqual(formatear_rut(12345678), '12.345.678-5')
+        self.assertEqual(formatear_rut(11111111), '11.111.111-1')
+
+        sembrar_catalogo(productos=20, categorias=3)
+        with CaptureQueriesContext(connection) as consultas:
+            usuario_ids = sembrar_clientes(150, lote=100)
+        self.assertLess(len(consultas), 20)  # Por lotes, no por fila
+        self.assertEqual(Cliente.objects.filter(usuario_id__in=usuario_ids).count(), 150)
+        for cliente in Cliente.objects.all()[:10]:
+            cliente.full_clean(exclude=['usuario'])
+        self.assertTrue(self.client.login(username='cliente0000007', password='ferremas123'))
+
+        self.assertEqual(sembrar_pedidos(30, usuario_ids), 30)
+        pedido = Pedido.objects.prefetch_related('lineas').first()
+        self.assertEqual(pedido.total, sum(linea.subtotal for linea in pedido.lineas.all()))
+
+
+    def test_generar_datos_continua_tras_borrar_filas(self):
+        opciones = {'productos': 5, 'categorias': 2, 'clientes': 3, 'mensajes': 0, 'pedidos': 2, 'stdout': StringIO()}
+        call_command('generar_datos', **opciones)
+        User.objects.create_user('clientela')  # No sigue el formato generado: no cuenta
+        Pedido.objects.get(buy_order='SIN-000000000').delete()
+        Producto.objects.get(codigo='SIN-0000000').delete()
+        User.objects.get(username='cliente0000000').delete()
+
+        call_command('generar_datos', **opciones)  # Con count() repetía SIN-0000004, cliente0000002...
+
+        self.assertEqual(Producto.objects.order_by('-codigo').first().codigo, 'SIN-0000009')
+        self.assertEqual(Cliente.objects.order_by('-usuario__username').first().usuario.username, 'cliente0000005')
+        self.assertEqual(Pedido.objects.order_by('-buy_order').first().buy_order, 'SIN-000000003')
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])  # Tests rápidos
+class ClientesTests(TiendaTestCase):
+    DATOS_REGISTRO = {
+        'username': 'ana', 'first_name': 'Ana', 'last_name': 'Rojas', 'email': 'ana@example.com',
+        'rut': '12.345.678-5', 'nacionalidad': 'chile', 'sexo': 'femenino', 'fecha_nacimiento': '1990-05-01',
+        'celular': '+56912345678', 'direccion': 'Av. Siempre Viva 742', 'comuna': 'Ñuñoa',
+        'password1': 'Ferremas2024', 'password2': 'Ferremas2024',
+    }
+
+    def test_validar_rut(self):
+        self.assertEqual(validar_rut('10.000.013-k'), '10.000.013-K')
+        with self.assertRaisesMessage(ValidationError, 'dígito verificador'):
+            validar_rut('12.345.678-9')
+        with self.assertRaisesMessage(ValidationError, 'Formato'):
+            validar_rut('12345678-5')
+
+    def test_registro_crea_usuario_y_perfil_en_una_transaccion(self):
+        # request_started vacía connection.queries: se cuenta con el detector (execute_wrapper)
+        with DetectorConsultas() as detector:
+            response = self.client.post(reverse('registro'), self.DATOS_REGISTRO)
+        self.assertRedirects(response, reverse('inicio'))
+        cliente = Cliente.objects.select_related('usuario').get()
+        self.assertEqual((cliente.usuario.username, cliente.rut, cliente.telefono), ('ana', '12.345.678-5', '+56912345678'))
+        self.assertEqual(cliente.usuario.email, 'ana@example.com')
+        inserts = {sql.split('"')[1]: veces for sql, veces in detector.conteo.items() if sql.startswith('INSERT')}
+        self.assertEqual(inserts.get('auth_user'), 1)
+        self.assertEqual(inserts.get('tienda_cliente'), 1)
+
+        # RUT repetido: se rechaza en el formulario, sin crear el usuario
+        self.client.logout()
+        response = self.client.post(reverse('registro'), {**self.DATOS_REGISTRO, 'username': 'otra', 'email': 'otra@example.com'})
+        self.assertContains(response, 'Este RUT ya está registrado')
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_usuario_sin_perfil_se_puede_crear(self):
+        # Staff creado con createsuperuser o desde el admin: ya no falla por la señal
+        usuario = User.objects.create_user('staff', password='x', is_staff=True)
+        self.assertFalse(Cliente.objects.filter(usuario=usuario).exists())
+
+    def test_importacion_masiva_con_errores_por_fila(self):
+        User.objects.create_user('existente')
+        hasheada = make_password('Previa123')
+        archivo = StringIO(
+            'username,email,password,first_name,last_name,rut,telefono,direccion,comuna,nacionalidad,sexo,fecha_nacimiento\n'
+            'ana,ana@example.com,Secreta123,Ana,Rojas,12.345.678-5,+56912345678,Calle 1,Ñuñoa,chile,femenino,1990-05-01\n'
+            f'luis,luis@example.com,{hasheada},Luis,Soto,11.111.111-1,,Calle 2,Maipú,peru,masculino,1985-01-31\n'
+            'existente,e@example.com,x,E,E,10.000.013-K,,,Santiago,chile,otro,1980-01-01\n'
+            'rut_malo,r@example.com,x,R,R,12.345.678-9,,,Santiago,chile,otro,1980-01-01\n'
+            'repetido,p@example.com,x,P,P,12.345.678-5,,,Santiago,chile,otro,1980-01-01\n'
+            'sin_clave,s@example.com,,S,S,10.000.027-K,,,Santiago,marte,otro,1980-01-01\n'
+        )
+        resultado = ImportadorClientes(tamano_lote=3).importar(leer_csv(archivo))
+
+        self.assertEqual((resultado.filas, resultado.importadas), (6, 2))
+        self.assertEqual(sorted(fila for fila, _ in resultado.errores), [4, 5, 6, 7])
+        ana = User.objects.get(username='ana')
+        self.assertTrue(check_password('Secreta123', ana.password))
+        self.assertEqual(ana.cliente.comuna, 'Ñuñoa')
+        self.assertEqual(User.objects.get(username='luis').password, hasheada)  # Se conserva el hash
+
+    @skipUnless(find_spec('openpyxl'), 'requiere openpyxl')
+    def test_importacion_xlsx_con_fechas_y_numeros(self):
+        from openpyxl import Workbook
+
+        libro = Workbook()
+        hoja = libro.active
+        hoja.append(['username', 'email', 'first_name', 'last_name', 'rut', 'telefono', 'direccion', 'comuna',
+                     'nacionalidad', 'sexo', 'fecha_nacimiento'])
+        hoja.append(['ana', 'ana@example.com', 'Ana', 'Rojas', '12.345.678-5', 56912345678, 'Calle 1', 'Ñuñoa',
+                     'chile', 'femenino', datetime(1990, 5, 1)])
+        archivo = BytesIO()
+        libro.save(archivo)
+        archivo.seek(0)
+
+        resultado = ImportadorClientes().importar(leer_archivo(archivo, 'clientes.xlsx'))
+
+        self.assertEqual((resultado.importadas, resultado.errores), (1, []))
+        cliente = Cliente.objects.get(usuario__username='ana')
+        self.assertEqual((cliente.fecha_nacimiento, cliente.telefono), (date(1990, 5, 1), '56912345678'))
+
+
+class ImportacionClientesProcesosTests(TiendaTestCase):
+    # Sin cambiar PASSWORD_HASHERS: los procesos hijos cargan la configuración real
+    def test_importacion_hashea_en_procesos(self):
+        archivo = StringIO(
+            'username,password,rut,comuna,nacionalidad,sexo,fecha_nacimiento\n'
+            + ''.join(
+                f'c{i},Clave{i}x,{formatear_rut(20_000_000 + i)},Santiago,chile,otro,1980-01-01\n' for i in range(6)
+            )
+        )
+        resultado = ImportadorClientes(tamano_lote=4, procesos=2).importar(leer_csv(archivo))
+        self.assertEqual(resultado.importadas, 6)
+        self.assertTrue(User.objects.get(username='c5').check_password('Clave5x'))
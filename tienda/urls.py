@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path, include
 from tienda import views
 
@@ -8,6 +9,8 @@ urlpatterns = [
     path('productos/crear/', views.crear_producto, name='crear_producto'),
     path('productos/editar/<int:producto_id>/', views.editar_producto, name='editar_producto'),
     path('productos/eliminar/<int:producto_id>/', views.eliminar_producto, name='eliminar_producto'),
+    path('productos/exportar/', views.exportar_productos, name='exportar_productos'),
+    path('productos/importar/', views.importar_productos, name='importar_productos'),
     path('contacto/', views.contacto, name='contacto'),
     path('registro/', views.registro, name='registro'),
     path('login/', views.login_view, name='login'),
@@ -17,14 +20,22 @@ urlpatterns = [
     path('carrito/', views.ver_carrito, name='ver_carrito'),
     path('carrito/actualizar/<int:producto_id>/', views.actualizar_carrito, name='actualizar_carrito'),  
     path('carrito/eliminar/<int:producto_id>/', views.eliminar_del_carrito, name='eliminar_del_carrito'),  
+    path('carrito/lote/', views.carrito_lote, name='carrito_lote'),
     
     # Pago
-    path("webpay/pagar/", views.iniciar_pago, name="webpay_pagar"),
-    path("webpay/confirmacion/", views.confirmar_pago, name="webpay_confirmacion"),
+    # Bajo ASGI (WEBPAY_ASYNC) se sirven las versiones async, que no bloquean mientras Transbank responde
+    path("webpay/pagar/", views.iniciar_pago_async if settings.WEBPAY_ASYNC else views.iniciar_pago, name="webpay_pagar"),
+    path("webpay/confirmacion/", views.confirmar_pago_async if settings.WEBPAY_ASYNC else views.confirmar_pago, name="webpay_confirmacion"),
     path('pago-exitoso/', views.pago_exitoso, name='pago_exitoso'),
     path('pago-fallido/', views.pago_fallido, name='pago_fallido'),
     path('pago-cancelado/', views.pago_cancelado, name='pago_cancelado'),
 
+    # Tipo de cambio
+    path('moneda/convertir/', views.convertir_moneda, name='convertir_moneda'),
+
+    # Métricas de rendimiento (Prometheus)
+    path('metricas/', views.metricas, name='metricas'),
+
 
 
     # APIs separadas
@@ -1,13 +1,17 @@
 from django.urls import path
-from .api import ContactoCreateAPIView, MonedaAPIView, WebpayAPIView
-from .views import ProductoListAPIView, CategoriaListAPIView
+from .api import ProductoBusquedaAPIView, ProductoCambiosAPIView, ContactoCreateAPIView, MonedaAPIView, MonedaLoteAPIView, WebpayAPIView
+from .views import ProductoListAPIView, ProductoDetailAPIView, CategoriaListAPIView
 
 
 urlpatterns = [
     path('productos/', ProductoListAPIView.as_view(), name='api_productos'),
+    path('productos/<int:pk>/', ProductoDetailAPIView.as_view(), name='api_producto_detalle'),
+    path('productos/cambios/', ProductoCambiosAPIView.as_view(), name='api_productos_cambios'),
+    path('productos/buscar/', ProductoBusquedaAPIView.as_view(), name='api_productos_buscar'),
     path('categorias/', CategoriaListAPIView.as_view(), name='api_categorias'),
     path('contacto/', ContactoCreateAPIView.as_view(), name='api_contacto'),
     path('moneda/', MonedaAPIView.as_view(), name='api_moneda'),
+    path('moneda/lote/', MonedaLoteAPIView.as_view(), name='api_moneda_lote'),
     path('webpay/', WebpayAPIView.as_view(), name='api_webpay'),
    
 ]
\ No newline at end of file
@@ -2,18 +2,36 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth import login, authenticate
 from django.contrib.auth.forms import UserCreationForm
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.urls import reverse
 from django.views.decorators.http import require_POST
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
+from django.conf import settings
+from django.db import transaction
 from rest_framework import generics
-from transbank.webpay.webpay_plus.transaction import Transaction, WebpayOptions
-from transbank.common.integration_type import IntegrationType
+from asgiref.sync import sync_to_async
+import json
 import requests    
-from .models import MensajeContacto, Producto, Categoria
+from functools import wraps
+from decimal import Decimal, InvalidOperation
+from .models import MensajeContacto, Producto, Categoria, Pedido
 from .serializers import ProductoSerializer, CategoriaSerializer
 from .forms import ProductoForm
+from .exportacion import FORMATOS, exportar
+from .importacion import ImportadorProductos, leer_archivo
+from .pasarela import obtener_pasarela
+from .divisas import TasaNoDisponible, obtener_servicio
+from .notificaciones import notificar_contacto
+from .confirmaciones import confirmar_idempotente, confirmar_idempotente_async
+from .pedidos import actualizar_pedido, crear_pedido, nueva_orden_de_compra
+from .stock import StockInsuficiente, confirmar_reserva, liberar_reserva, reservar_stock
+from .condicional import condicional_productos, condicional_producto, condicional_categorias
+from .carrito import MAX_OPERACIONES, CarritoOcupado, aplicar_lote, carrito_actual, obtener_carrito, items_json
+from .rendimiento import obtener_registro
+from .catalogo import (
+    ORDENES, ORDEN_POR_DEFECTO, contexto_cache, filtrar_productos, listado_cacheado, paginar_busqueda, paginar_keyset,
+)
 from django.views.decorators.csrf import csrf_exempt
 from .forms import RegistroCompletoForm
 import os
@@ -23,12 +41,65 @@ import os
 
 # Vistas principales
 def inicio(request):
-    productos_destacados = Producto.objects.filter(stock__gt=0)[:4]
-    return render(request, 'tienda/inicio.html', {'productos_destacados': productos_destacados})
+    productos_destacados = listado_cacheado(
+        'destacados', {}, lambda: list(Producto.objects.filter(stock__gt=0)[:4])
+    )
+    return render(request, 'tienda/inicio.html', {
+        'productos_destacados': productos_destacados,
+        **contexto_cache(),
+    })
 
 def lista_productos(request):
-    productos = Producto.objects.all()
-    return render(request, 'tienda/productos.html', {'productos': productos})
+    orden = request.GET.get('orden', ORDEN_POR_DEFECTO)
+    if orden not in ORDENES:
+        orden = ORDEN_POR_DEFECTO
+
+    tamano = getattr(settings, 'CATALOGO_TAMANO_PAGINA', 24)
+    q = request.GET.get('q', '').strip()
+
+    def calcular_pagina():
+        if q:
+            # Resultados de búsqueda por relevancia, con los filtros aplicados dentro del motor
+            return paginar_busqueda(q, filtrar_productos(request.GET), cursor=request.GET.get('cursor'), tamano=tamano)
+        return paginar_keyset(
+            filtrar_productos(request.GET), orden,
+            cursor=request.GET.get('cursor'),
+            tamano=tamano,
+        )
+
+    productos, siguiente = listado_cacheado('productos', request.GET, calcular_pagina)
+
+    # Modo "precios en otra moneda": la conversión va fuera del cache porque la tasa cambia sola
+    moneda = request.GET.get('moneda', '').upper()
+    if moneda and moneda != 'CLP':
+        try:
+            productos = obtener_servicio().convertir_productos(productos, moneda)
+        except TasaNoDisponible:
+            moneda = ''
+            messages.warning(request, "No fue posible obtener el tipo de cambio; se muestran precios en pesos.")
+    else:
+        moneda = ''
+    categorias = listado_cacheado('categorias', {}, lambda: list(Categoria.objects.all()))
+
+    # Los filtros se conservan al avanzar de página
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    primera_url = f"?{params.urlencode()}" if request.GET.get('cursor') else None
+    siguiente_url = None
+    if siguiente:
+        params['cursor'] = siguiente
+        siguiente_url = f"?{params.urlencode()}"
+
+    return render(request, 'tienda/productos.html', {
+        'productos': productos,
+        'categorias': categorias,
+        'filtros': request.GET,
+        'orden': orden,
+        'primera_url': primera_url,
+        'siguiente_url': siguiente_url,
+        'moneda': moneda,
+        **contexto_cache(),
+    })
 
 # Autenticación
 def registro(request):
@@ -72,9 +143,12 @@ def contacto(request):
         if not nombre or not email or not asunto or not mensaje:
             messages.error(request, 'Todos los campos son obligatorios')
         else:
-            MensajeContacto.objects.create(
-                nombre=nombre, email=email, asunto=asunto, mensaje=mensaje
-            )
+            # El mensaje y su tarea se guardan juntos: no queda uno sin el otro
+            with transaction.atomic():
+                mensaje_contacto = MensajeContacto.objects.create(
+                    nombre=nombre, email=email, asunto=asunto, mensaje=mensaje
+                )
+                notificar_contacto.encolar(mensaje_contacto.pk)  # Los correos salen desde el trabajador de tareas
             messages.success(request, 'Mensaje enviado!')
             return redirect('contacto')
     
@@ -124,21 +198,74 @@ def eliminar_producto(request, producto_id):
     messages.success(request, "Producto eliminado exitosamente")
     return redirect('productos')
 
+@login_required
+def exportar_productos(request):
+    if not request.user.is_staff:
+        raise PermissionDenied
+
+    formato = request.GET.get('formato', 'csv')
+    if formato not in FORMATOS:
+        formato = 'csv'
+    response = StreamingHttpResponse(exportar(formato), content_type=FORMATOS[formato])
+    response['Content-Disposition'] = f'attachment; filename="productos.{formato}"'
+    return response
+
+@login_required
+@require_POST
+def importar_productos(request):
+    if not request.user.is_staff:
+        raise PermissionDenied
+
+    archivo = request.FILES.get('archivo')
+    if not archivo:
+        return JsonResponse({'error': 'Debes adjuntar un archivo CSV o XLSX en el campo "archivo"'}, status=400)
+
+    try:
+        lote = int(request.POST.get('lote', 1000))
+    except ValueError:
+        lote = 1000
+    importador = ImportadorProductos(
+        tamano_lote=max(lote, 1),
+        crear_categorias=request.POST.get('crear_categorias') == 'true',
+    )
+    try:
+        resultado = importador.importar(leer_archivo(archivo.file, archivo.name))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(resultado.como_dict())
+
+# Métricas de rendimiento en formato Prometheus (solo administradores)
+@login_required
+def metricas(request):
+    if not request.user.is_staff:
+        raise PermissionDenied
+
+    return HttpResponse(obtener_registro().prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # Carrito
+def carrito_disponible(vista):
+    """Si otro request mantiene ocupado el carrito, responde 409 (JSON) o vuelve al carrito con un aviso"""
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        try:
+            return vista(request, *args, **kwargs)
+        except CarritoOcupado:
+            mensaje = "Tu carrito se está actualizando en otra pestaña. Intenta de nuevo."
+            if (request.headers.get('Accept') == 'application/json' or request.GET.get('api') == 'true'
+                    or request.content_type == 'application/json'):
+                return JsonResponse({'status': 'error', 'message': mensaje}, status=409)
+            messages.error(request, mensaje)
+            return redirect('ver_carrito')
+    return envoltura
+
+
 @csrf_exempt  # Desactiva CSRF solo para pruebas.
 
 @require_POST
+@carrito_disponible
 def agregar_al_carrito(request, producto_id):
     producto = get_object_or_404(Producto, id=producto_id)
-    carrito = request.session.get('carrito', {})
-
-    if str(producto_id) in carrito:
-        carrito[str(producto_id)] += 1
-    else:
-        carrito[str(producto_id)] = 1
-
-    request.session['carrito'] = carrito
-    request.session.modified = True
+    carrito_actual(request).agregar(producto.id, 1)
 
     # Si la solicitud viene de Postman (API), devolver JSON correctamente
     if request.headers.get('Accept') == 'application/json' or request.GET.get('api') == 'true':
@@ -151,92 +278,141 @@ def agregar_al_carrito(request, producto_id):
 
 
 def ver_carrito(request):
-    carrito = request.session.get('carrito', {})
-    productos = []
-    total = 0
-    
-    for producto_id, cantidad in carrito.items():
-        producto = Producto.objects.filter(id=int(producto_id)).first()
-        if producto:
-            subtotal = producto.precio * cantidad
-            productos.append({
-                'producto_id': producto.id,
-                'nombre': producto.nombre,
-                'precio': producto.precio,
-                'cantidad': cantidad,
-                'subtotal': subtotal
-            })
-            total += subtotal
+    carrito = obtener_carrito(request)
+    productos = carrito['items']
+    total = carrito['total']
 
     # Si la solicitud viene de Postman o es una API, devolver JSON
     if request.headers.get('Accept') == 'application/json' or request.GET.get('api') == 'true':
-        return JsonResponse({'productos': productos, 'total': total})
+        return JsonResponse({'productos': items_json(productos), 'total': total})
 
     return render(request, 'tienda/carrito.html', {'productos': productos, 'total': total})
 
 
 @require_POST
+@carrito_disponible
 def actualizar_carrito(request, producto_id):
     cantidad = int(request.POST.get('cantidad', 1))
-    carrito = request.session.get('carrito', {})
-
     if cantidad > 0:
-        carrito[str(producto_id)] = cantidad
-    else:
-        carrito.pop(str(producto_id), None)  # Si la cantidad es 0, elimina el producto
-
-    request.session['carrito'] = carrito
+        get_object_or_404(Producto, id=producto_id)
+    carrito_actual(request).fijar(producto_id, cantidad)  # Con cantidad 0 elimina el producto
     return redirect('ver_carrito')
 
 @csrf_exempt  # Desactiva CSRF solo para pruebas
 
 @require_POST
+@carrito_disponible
 def eliminar_del_carrito(request, producto_id):
-    carrito = request.session.get('carrito', {})
-    carrito.pop(str(producto_id), None)  # Elimina el producto del carrito
-    request.session['carrito'] = carrito
+    carrito_actual(request).quitar(producto_id)  # Elimina el producto del carrito
     messages.success(request, "Producto eliminado del carrito.")
     
     return redirect('ver_carrito')
 
+
+@require_POST
+@carrito_disponible
+def carrito_lote(request):
+    """Aplica varias operaciones al carrito en un solo request (pedido rápido, repetir compra).
+
+    Cuerpo JSON: {"operaciones": [{"op": "agregar" | "fijar" | "quitar", "producto": id, "cantidad": n}, ...]}.
+    Si alguna operación es inválida o excede el stock no se aplica ninguna.
+    """
+    try:
+        datos = json.loads(request.body)
+        operaciones = datos['operaciones']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'status': 'error', 'message': 'Se esperaba un JSON con la lista "operaciones".'}, status=400)
+    if not isinstance(operaciones, list) or not 0 < len(operaciones) <= MAX_OPERACIONES:
+        return JsonResponse({'status': 'error', 'message': f'Envía entre 1 y {MAX_OPERACIONES} operaciones.'}, status=400)
+
+    carrito, errores = aplicar_lote(request, operaciones)
+    if errores:
+        return JsonResponse({'status': 'error', 'errores': errores}, status=400)
+    return JsonResponse({
+        'status': 'success',
+        'productos': items_json(carrito['items']),
+        'total': carrito['total'],
+        'count': carrito['count'],
+    })
+
 # Webpay 
-def iniciar_pago(request):
+# Cada vista se divide en la preparación (sesión, stock, pedido), la llamada a
+# Webpay y el manejo del resultado, para compartir la lógica entre la versión
+# síncrona (WSGI) y la async (ASGI), que no bloquea un worker mientras Transbank responde.
+def _preparar_pago(request):
+    """Devuelve una respuesta de error o los argumentos para crear la transacción"""
     print("Iniciar pago ejecutándose...")  # Depuración en consola
-    carrito = request.session.get('carrito', {})
-    total = sum(Producto.objects.get(id=int(pid)).precio * cantidad for pid, cantidad in carrito.items())
-
-    buy_order = f"ORD-{request.session.session_key}"[:26]  
+    carrito = obtener_carrito(request)
+    total = carrito['total']
+    if not carrito['items']:
+        messages.error(request, "Tu carrito está vacío.")
+        return redirect('ver_carrito')
+
+    if not request.session.session_key:
+        request.session.save()
+    # Un nuevo intento de pago reemplaza al anterior que quedó sin terminar
+    orden_previa = request.session.get('orden_de_compra')
+    if orden_previa:
+        liberar_reserva(orden_previa)
+        actualizar_pedido(orden_previa, Pedido.CANCELADO)
+    buy_order = nueva_orden_de_compra()
+    request.session['orden_de_compra'] = buy_order
     session_id = request.session.session_key or "SESSION1234"
     return_url = request.build_absolute_uri(reverse('webpay_confirmacion')) 
 
-    # credenciales de prueba
-    options = WebpayOptions(
-    api_key=os.getenv("WEBPAY_API_KEY"),
-    commerce_code=os.getenv("WEBPAY_COMMERCE_CODE"),
-    integration_type=IntegrationType.TEST
-)
-
+    # Apartar el stock y registrar el pedido antes de enviar al comprador a Webpay
+    try:
+        reservar_stock(buy_order, {item['producto_id']: item['cantidad'] for item in carrito['items']})
+    except StockInsuficiente:
+        messages.error(request, "❌ No hay stock suficiente para uno de los productos de tu carrito.")
+        return redirect('ver_carrito')
+    crear_pedido(request, buy_order, carrito)
+    return buy_order, session_id, total, return_url
 
-    transaction = Transaction(options)
 
-    
-    try:
-        response = transaction.create(buy_order, session_id, total, return_url)
+def _resultado_pago(request, buy_order, response=None, error=None):
+    if error is None:
         print(f"Respuesta completa de Webpay: {response}")  # Depuración en consola
 
         if 'url' in response and 'token' in response:
             return redirect(f"{response['url']}?token_ws={response['token']}")
         else:
+            liberar_reserva(buy_order)
+            actualizar_pedido(buy_order, Pedido.RECHAZADO, response)
             messages.error(request, "❌ Error en Webpay: No se recibió una URL de pago válida.")
             return redirect('pago_fallido')  # Redirigir a la pantalla de fallo en lugar del carrito
 
+    liberar_reserva(buy_order)
+    actualizar_pedido(buy_order, Pedido.RECHAZADO)
+    print(f"⚠ Error en Webpay capturado: {error}")
+    messages.error(request, f"Error técnico en Webpay: {error}")
+    return redirect('pago_fallido')  # Mostrar detalles del error en la pantalla de fallo
+
+
+def iniciar_pago(request):
+    preparado = _preparar_pago(request)
+    if isinstance(preparado, HttpResponse):
+        return preparado
+    try:
+        response = obtener_pasarela().crear(*preparado)
     except Exception as e:
-        print(f"⚠ Error en Webpay capturado: {e}")
-        messages.error(request, f"Error técnico en Webpay: {e}")
-        return redirect('pago_fallido')  # Mostrar detalles del error en la pantalla de fallo
+        return _resultado_pago(request, preparado[0], error=e)
+    return _resultado_pago(request, preparado[0], response)
 
 
-def confirmar_pago(request):
+async def iniciar_pago_async(request):
+    preparado = await sync_to_async(_preparar_pago)(request)
+    if isinstance(preparado, HttpResponse):
+        return preparado
+    try:
+        response = await obtener_pasarela().crear_async(*preparado)
+    except Exception as e:
+        return await sync_to_async(_resultado_pago)(request, preparado[0], error=e)
+    return await sync_to_async(_resultado_pago)(request, preparado[0], response)
+
+
+def _preparar_confirmacion(request):
+    """Devuelve una respuesta si no hay nada que confirmar; si no, el token"""
     token_ws = request.GET.get("token_ws")
     tbk_token = request.GET.get("TBK_TOKEN")  # 🔍 Detectamos TBK_TOKEN cuando la compra es anulada
 
@@ -244,6 +420,10 @@ def confirmar_pago(request):
     print(f"🔍 TBK_TOKEN recibido: {tbk_token}")  # Depuración
 
     if tbk_token:  # 🚨 Si Webpay devuelve TBK_TOKEN, significa que el usuario anuló la compra
+        orden = request.GET.get("TBK_ORDEN_COMPRA") or request.session.get('orden_de_compra')
+        if orden:
+            liberar_reserva(orden)
+            actualizar_pedido(orden, Pedido.CANCELADO)
         messages.info(request, "❌ Has cancelado la compra. No se ha realizado ningún cargo.")
         return redirect('pago_cancelado')
 
@@ -251,46 +431,80 @@ def confirmar_pago(request):
         messages.error(request, "❌ Error en la transacción: Token no recibido.")
         return redirect('pago_fallido')
 
-    # 🔒 Usar credenciales desde variables de entorno
-    options = WebpayOptions(
-        api_key=os.getenv("WEBPAY_API_KEY"),
-        commerce_code=os.getenv("WEBPAY_COMMERCE_CODE"),
-        integration_type=IntegrationType.TEST
-    )
-    transaction = Transaction(options)
+    return token_ws
 
-    try:
-        response = transaction.commit(token_ws)
-        print("✅ Respuesta de Webpay:", response)  # Depuración
 
-        if response.get('status') == 'AUTHORIZED':
+def _resultado_confirmacion(request, response=None, error=None):
+    if error is not None:
+        # No se libera el stock: el resultado del commit es incierto y la reserva vence sola
+        print(f"⚠ Error en Webpay al confirmar pago: {error}")
+        messages.error(request, f"Error en Webpay: {error}")
+        return render(request, 'tienda/pago_fallido.html', {
+            'error_message': str(error)
+        })
+
+    print("✅ Respuesta de Webpay:", response)  # Depuración
+
+    if response.get('status') == 'AUTHORIZED':
+        try:
+            confirmar_reserva(response.get('buy_order'))
+            estado = Pedido.PAGADO
+        except StockInsuficiente:
+            estado = Pedido.REVISION  # Ya se cobró: el equipo repone el stock o devuelve el dinero
+        # También un pedido cancelado al vencer su reserva o al iniciar otro pago: el cobro manda
+        actualizar_pedido(response.get('buy_order'), estado, response, desde=(Pedido.PENDIENTE, Pedido.CANCELADO))
+        if estado == Pedido.PAGADO:
             messages.success(request, "✅ Pago realizado exitosamente.")
+        else:
+            messages.warning(
+                request, "⚠ Pago recibido, pero parte de tu pedido se agotó. Te contactaremos para resolverlo."
+            )
 
-            # 🔥 Vaciar la sesión completamente para eliminar el carrito
-            request.session.flush()
+        # 🔥 Vaciar el carrito y la sesión completa
+        try:
+            carrito_actual(request).vaciar()
+        except CarritoOcupado:
+            pass  # El pago ya está registrado; el carrito se podrá vaciar a mano
+        request.session.flush()
+
+        # 🚀 Pasar más detalles del pago a la plantilla
+        return render(request, 'tienda/pago_exitoso.html', {
+            'buy_order': response.get('buy_order'),
+            'amount': response.get('amount'),
+            'authorization_code': response.get('authorization_code'),
+            'transaction_date': response.get('transaction_date'),
+            'detalle_pago': response
+        })
 
-            # 🚀 Pasar más detalles del pago a la plantilla
-            return render(request, 'tienda/pago_exitoso.html', {
-                'buy_order': response.get('buy_order'),
-                'amount': response.get('amount'),
-                'authorization_code': response.get('authorization_code'),
-                'transaction_date': response.get('transaction_date'),
-                'detalle_pago': response
-            })
+    liberar_reserva(response.get('buy_order'))
+    actualizar_pedido(response.get('buy_order'), Pedido.RECHAZADO, response)
+    messages.error(request, "❌ El pago fue rechazado o no pudo completarse.")
+    return render(request, 'tienda/pago_fallido.html', {
+        'detalle_pago': response,
+        'error_message': response.get('response_code', 'Error desconocido')
+    })
 
-        else:
-            messages.error(request, "❌ El pago fue rechazado o no pudo completarse.")
-            return render(request, 'tienda/pago_fallido.html', {
-                'detalle_pago': response,
-                'error_message': response.get('response_code', 'Error desconocido')
-            })
 
+def confirmar_pago(request):
+    token = _preparar_confirmacion(request)
+    if isinstance(token, HttpResponse):
+        return token
+    try:
+        response = confirmar_idempotente(token, obtener_pasarela().confirmar)
     except Exception as e:
-        print(f"⚠ Error en Webpay al confirmar pago: {e}")
-        messages.error(request, f"Error en Webpay: {e}")
-        return render(request, 'tienda/pago_fallido.html', {
-            'error_message': str(e)
-        })
+        return _resultado_confirmacion(request, error=e)
+    return _resultado_confirmacion(request, response)
+
+
+async def confirmar_pago_async(request):
+    token = await sync_to_async(_preparar_confirmacion)(request)
+    if isinstance(token, HttpResponse):
+        return token
+    try:
+        response = await confirmar_idempotente_async(token, obtener_pasarela().confirmar_async)
+    except Exception as e:
+        return await sync_to_async(_resultado_confirmacion)(request, error=e)
+    return await sync_to_async(_resultado_confirmacion)(request, response)
 
 # ✅ Rutas para pantallas de éxito y fallo
 def pago_exitoso(request):
@@ -307,17 +521,36 @@ def pago_cancelado(request):
 
 
 
-# API Banco Central (optimizada)
+# Conversión a pesos con el tipo de cambio del Banco Central (cacheado, ver divisas.py)
 def convertir_moneda(request):
-    monto = float(request.GET.get('monto', 1))  # Monto base
-    tasa = 890.75  # Simulación de tasa CLP/USD
-    return JsonResponse({'monto_convertido': monto * tasa, 'tasa': tasa, 'status': 'success'})
-
-# API REST
+    moneda = request.GET.get('moneda', 'USD').upper()
+    try:
+        monto = Decimal(request.GET.get('monto', '1'))  # Monto en la moneda extranjera
+        if not monto.is_finite():
+            raise InvalidOperation
+    except InvalidOperation:
+        return JsonResponse({'status': 'error', 'message': 'Monto inválido'}, status=400)
+    try:
+        servicio = obtener_servicio()
+        tasa = servicio.tasa(moneda)
+        convertido = servicio.a_clp(monto, moneda)
+    except TasaNoDisponible as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=503)
+    # Números en el JSON, como siempre respondió este endpoint (el cálculo se hace con Decimal)
+    return JsonResponse({'monto_convertido': float(convertido), 'tasa': float(tasa), 'moneda': moneda, 'status': 'success'})
+
+# API REST (con GET condicional: responde 304 sin serializar si nada cambió)
+@condicional_productos
 class ProductoListAPIView(generics.ListAPIView):
     queryset = Producto.objects.all()
     serializer_class = ProductoSerializer
 
+@condicional_producto
+class ProductoDetailAPIView(generics.RetrieveAPIView):
+    queryset = Producto.objects.all()
+    serializer_class = ProductoSerializer
+
+@condicional_categorias
 class CategoriaListAPIView(generics.ListAPIView):
     queryset = Categoria.objects.all()
     serializer_class = CategoriaSerializer
\ No newline at end of file